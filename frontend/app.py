@@ -1,7 +1,9 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import os
+import time
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -15,6 +17,16 @@ if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
 
 
+@st.cache_resource
+def get_session():
+    """One keep-alive session for every call to the backend, shared across reruns"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=10)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
 def make_api_request(
     endpoint, method="POST", json_data=None, files=None, data=None, headers=None
 ):
@@ -22,11 +34,11 @@ def make_api_request(
     try:
         if method == "POST":
             if data:  # For file upload
-                response = requests.post(
+                response = get_session().post(
                     f"http://localhost:7071/api/{endpoint}", data=data, headers=headers
                 )
             else:  # For JSON requests
-                response = requests.post(
+                response = get_session().post(
                     f"http://localhost:7071/api/{endpoint}", json=json_data
                 )
 
@@ -39,11 +51,132 @@ def make_api_request(
                 st.sidebar.write(f"Raw Response: {response.text}")
 
             return response
+        elif method == "GET":
+            return get_session().get(
+                f"http://localhost:7071/api/{endpoint}", params=json_data
+            )
     except requests.exceptions.RequestException as e:
         st.error(f"API Error: {str(e)}")
         return None
 
 
+def wait_for_ingestion(job_id, filename, poll_interval=1.0):
+    """Poll the ingestion job and show its progress until it finishes"""
+    progress = st.progress(0.0, text=f"Queued {filename}...")
+    while True:
+        response = make_api_request(
+            "ingest_status", method="GET", json_data={"job_id": job_id}
+        )
+        if response is None or response.status_code != 200:
+            st.error("Lost track of the upload job. Please try again.")
+            return
+
+        job = response.json()["job"]
+        pages = job["pages_parsed"]
+        embedded = job["chunks_embedded"]
+        indexed = job["chunks_indexed"]
+        fraction = indexed / embedded if embedded else 0.0
+        progress.progress(
+            min(fraction, 1.0),
+            text=(
+                f"{job['status']}: {pages} pages parsed, "
+                f"{embedded} chunks embedded, {indexed} chunks indexed"
+            ),
+        )
+
+        if job["status"] == "succeeded":
+            st.success(
+                f"Document uploaded and processed successfully! "
+                f"{indexed} chunks indexed from {filename}"
+            )
+            return
+        if job["status"] == "failed":
+            st.error(f"Error processing document: {job.get('error')}")
+            return
+        time.sleep(poll_interval)
+
+
+def iter_stream_events(response):
+    """Yield the JSON events of a server-sent events response"""
+    for line in response.iter_lines(decode_unicode=True):
+        if line and line.startswith("data: "):
+            yield json.loads(line[len("data: ") :])
+
+
+def stream_answer(question):
+    """Render the answer incrementally as tokens arrive from the backend"""
+    started = time.perf_counter()
+    try:
+        response = get_session().post(
+            "http://localhost:7071/api/ask_rag_stream",
+            json={"query": question},
+            stream=True,
+        )
+    except requests.exceptions.RequestException as e:
+        st.error(f"API Error: {str(e)}")
+        return
+
+    if response.status_code != 200:
+        st.error(
+            f"Error getting response from the server (status {response.status_code})."
+        )
+        st.write("Raw response:", response.text)
+        return
+
+    st.subheader("Answer:")
+    answer_placeholder = st.empty()
+    answer = ""
+    sources = []
+    ttft_ms = None
+    server_ttft_ms = None
+    rerank_ms = None
+
+    try:
+        for event in iter_stream_events(response):
+            if event["type"] == "token":
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - started) * 1000
+                answer += event["content"]
+                answer_placeholder.markdown(answer + "▌")
+            elif event["type"] == "sources":
+                sources = event["sources"]
+            elif event["type"] == "done":
+                server_ttft_ms = event.get("ttft_ms")
+                rerank_ms = event.get("rerank_ms")
+            elif event["type"] == "error":
+                st.error(f"Error while generating the answer: {event['error']}")
+    except json.JSONDecodeError as e:
+        st.error(f"Error parsing response: {str(e)}")
+    finally:
+        response.close()
+
+    total_ms = (time.perf_counter() - started) * 1000
+    answer = answer or "No answer received"
+    answer_placeholder.markdown(answer)
+
+    # Display sources if available
+    if sources:
+        st.subheader("Sources:")
+        for source in sources:
+            st.write(
+                f"- {source.get('source', 'Unknown')} (Page {source.get('page', 'N/A')})"
+            )
+
+    if ttft_ms is not None:
+        timing = f"Time to first token: {ttft_ms:.0f} ms"
+        if server_ttft_ms is not None:
+            timing += f" (server {server_ttft_ms:.0f} ms)"
+        timing += f" · total {total_ms:.0f} ms"
+        if rerank_ms is not None:
+            timing += f" · rerank {rerank_ms:.0f} ms"
+        st.caption(timing)
+
+    # Add to chat history
+    st.session_state.chat_history.append(
+        {"question": question, "answer": answer, "sources": sources}
+    )
+
+
 def main():
     st.title("📚 Document Q&A System")
 
@@ -59,29 +192,27 @@ def main():
         if uploaded_file is not None:
             if st.button("Upload Document"):
                 with st.spinner("Uploading and processing document..."):
-                    # Get file content and name
-                    file_content = uploaded_file.getvalue()
                     filename = uploaded_file.name
+                    uploaded_file.seek(0)
 
                     # Set up headers for binary content
                     headers = {
-                        "Content-Type": "application/octet-stream",
-                        "Content-Length": str(len(file_content)),
+                        "Content-Type": uploaded_file.type
+                        or "application/octet-stream",
+                        "Content-Length": str(uploaded_file.size),
                     }
 
-                    # Make the request
+                    # Stream the file object instead of copying its bytes
                     response = make_api_request(
                         f"upload_file?filename={requests.utils.quote(filename)}",  # URL encode the filename
                         method="POST",
-                        data=file_content,
+                        data=uploaded_file,
                         headers=headers,
                     )
 
-                    if response and response.status_code == 200:
-                        result = response.json()
-                        st.success(
-                            f"Document uploaded and processed successfully! {result.get('message', '')}"
-                        )
+                    if response is not None and response.status_code == 202:
+                        job_id = response.json().get("job_id")
+                        wait_for_ingestion(job_id, filename)
                     else:
                         st.error(
                             "Error uploading document. Please check the debug information in the sidebar."
@@ -95,47 +226,7 @@ def main():
 
     if st.button("Ask"):
         if user_question:
-            with st.spinner("Getting answer..."):
-                # Call Azure Function for Q&A
-                response = make_api_request(
-                    "ask_rag", json_data={"query": user_question}
-                )
-
-                if response and response.status_code == 200:
-                    try:
-                        answer_data = response.json()
-
-                        # Display the answer
-                        st.subheader("Answer:")
-                        st.write(answer_data.get("answer", "No answer received"))
-
-                        # Display sources if available
-                        sources = answer_data.get("sources", [])
-                        if sources:
-                            st.subheader("Sources:")
-                            for source in sources:
-                                st.write(
-                                    f"- {source.get('source', 'Unknown')} (Page {source.get('page', 'N/A')})"
-                                )
-
-                        # Add to chat history
-                        st.session_state.chat_history.append(
-                            {
-                                "question": user_question,
-                                "answer": answer_data.get(
-                                    "answer", "No answer received"
-                                ),
-                                "sources": sources,
-                            }
-                        )
-
-                    except json.JSONDecodeError as e:
-                        st.error(f"Error parsing response: {str(e)}")
-                        st.write("Raw response:", response.text)
-                else:
-                    st.error(
-                        "Error getting response from the server. Check debug information in sidebar."
-                    )
+            stream_answer(user_question)
 
     # Display chat history
     if st.session_state.chat_history:
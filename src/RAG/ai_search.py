@@ -7,11 +7,18 @@ from azure.search.documents import SearchClient
 from azure.search.documents.models import VectorizedQuery
 from pathlib import Path
 from dotenv import load_dotenv
-from openai import AzureOpenAI
 import nbformat
 from nbformat.v4 import new_notebook, new_code_cell
 from datetime import datetime
 
+from RAG.clients import get_openai_client
+from RAG.context_packer import Passage, get_default_packer
+from RAG.embedding_cache import get_default_cache
+from RAG.local_vector_store import get_default_store
+from RAG.rerank import get_default_reranker
+from RAG.tokens import count_tokens
+from RAG.tracing import get_tracer
+
 
 load_dotenv()
 
@@ -23,30 +30,65 @@ index_name = os.getenv("SEARCH_AI_INDEX_NAME")
 api_key = os.getenv("SEARCH_AI_KEY")
 embedding_model_name = os.getenv("EMBEDDING_MODEL_NAME")
 
-client = AzureOpenAI(
-    api_version="2024-12-01-preview",
-    azure_endpoint=os.getenv("OPEN_AI_ENDPOINT"),
-    api_key=os.getenv("API_OPEN_AI_KEY"),
-)
+SELECT_FIELDS = ["id", "content", "title", "url", "filepath", "meta_json_string"]
+
+# SEARCH_BACKEND=local serves retrieval from an on-disk LocalVectorStore
+# instead of Azure AI Search (development, CI and air-gapped deployments).
+# Its hybrid ranking is tuned with the HYBRID_* variables.
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "azure")
+
+if SEARCH_BACKEND == "local":
+    search_client = get_default_store()
+else:
+    search_client = SearchClient(
+        endpoint=endpoint,
+        index_name=index_name,
+        credential=AzureKeyCredential(api_key),
+    )
+
+embedding_cache = get_default_cache()
+reranker = get_default_reranker()
+context_packer = get_default_packer()
+tracer = get_tracer()
 
-search_client = SearchClient(
-    endpoint=endpoint, index_name=index_name, credential=AzureKeyCredential(api_key)
-)
+
+def _embed_batch(texts: List[str]) -> List[List[float]]:
+    response = get_openai_client().embeddings.create(
+        model=embedding_model_name, input=texts
+    )
+    return [item.embedding for item in response.data]
 
 
 def get_embeddings(text: str) -> List[float]:
     """
     Get embeddings for the given text using Azure OpenAI.
+    Repeated texts are served from the shared embedding cache.
     """
     if not isinstance(text, str):
         raise ValueError("Input to get_embeddings must be a string")
-    response = client.embeddings.create(model=embedding_model_name, input=text)
-    return response.data[0].embedding
+    return embedding_cache.embed(embedding_model_name, [text], _embed_batch)[0]
+
+
+def to_document(res: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert a search result into the document dict used across the module.
+    """
+    return {
+        "id": res.get("id", ""),
+        "content": res.get("content", ""),
+        "url": res.get("url", ""),
+        "filepath": res.get("filepath", ""),
+        "title": res.get("title", ""),
+        "meta_json_string": res.get("meta_json_string", ""),
+        "score": res.get("@search.score", 0),
+        "source": res.get("url", "Unknown"),
+    }
 
 
 def search_documents(query: str, top_k: int = 5) -> List[Dict[str, Any]]:
     """
     Search for documents based on the query using either semantic or vector search.
+    With a reranker configured, fetches more candidates and keeps its top_k.
     """
     # if semantic:
 
@@ -58,46 +100,65 @@ def search_documents(query: str, top_k: int = 5) -> List[Dict[str, Any]]:
     #         top=top_k
     #     )
 
+    fetch_k = max(top_k, reranker.fetch_k) if reranker else top_k
     embedding = get_embeddings(query)
-    vector = VectorizedQuery(vector=embedding, top=top_k, fields="contentVector")
-    results = search_client.search(
-        search_text=query,
-        vector_queries=[vector],
-        select=["id", "content", "title", "url", "filepath", "meta_json_string"],
-        top=top_k,
+    vector = VectorizedQuery(
+        vector=embedding, k_nearest_neighbors=fetch_k, fields="contentVector"
     )
-    documents = [
-        {
-            "id": res.get("id", ""),
-            "content": res.get("content", ""),
-            "url": res.get("url", ""),
-            "filepath": res.get("filepath", ""),
-            "title": res.get("title", ""),
-            "meta_json_string": res.get("meta_json_string", ""),
-            "score": res.get("@search.score", 0),
-            "source": res.get("url", "Unknown"),
-        }
-        for res in results
-    ]
+    with tracer.span("retrieve", top_k=fetch_k) as span:
+        results = search_client.search(
+            search_text=query,
+            vector_queries=[vector],
+            select=SELECT_FIELDS,
+            top=fetch_k,
+        )
+        documents = [to_document(res) for res in results]
+        span.set("documents", len(documents))
+    if reranker:
+        documents = rerank_documents(query, documents, top_k)
 
     for i, res in enumerate(documents):
         print(f"{i+1}. Document: {res['title']} (score =  {res['score']:.4f})")
     return documents
 
 
+def rerank_documents(
+    query: str, documents: List[Dict[str, Any]], top_k: int
+) -> List[Dict[str, Any]]:
+    """
+    Keep the reranker's top_k documents, adding their 'rerank_score'.
+    """
+    with tracer.span("rerank", candidates=len(documents)):
+        ranked = reranker.rerank(query, documents, lambda d: d["content"], top_k)
+    for doc, score in ranked:
+        doc["rerank_score"] = score
+    print(f"Reranking: {reranker.last_stats.summary()}")
+    return [doc for doc, _ in ranked]
+
+
 def build_prompt(documents: List[Dict[str, Any]], query: str) -> str:
     """
     Build a prompt for the AI model using the retrieved documents and the query.
+    Documents are packed into the CONTEXT_MAX_TOKENS budget in relevance order.
     """
+    with tracer.span("prompt_build") as span:
+        prompt = _build_prompt(documents, query)
+        if span.recording:
+            span.set("prompt_tokens", count_tokens(prompt))
+    return prompt
+
+
+def _build_prompt(documents: List[Dict[str, Any]], query: str) -> str:
+    packed = context_packer.pack(
+        [Passage.from_fields(doc["content"], doc) for doc in documents]
+    )
     prompt = f"Query: {query}\n\n"
     prompt += "Retrieved Documents:\n"
 
-    for doc in documents:
-        if doc.get("title"):
-            prompt += f"Title: {doc['title']}\n"
-        prompt += f"Content: {doc['content']}\n"
-        prompt += f"URL: {doc['url']}\n"
-        prompt += f"Score: {doc['score']:.4f}\n\n"
+    for i, passage in enumerate(packed.passages, 1):
+        title = passage.metadata.get("title")
+        prompt += f"Document {i}" + (f" ({title})" if title else "") + ":\n"
+        prompt += f"{passage.text}\n\n"
     prompt += (
         "You are an AI assistant that answers questions strictly based on the provided context documents. "
         "Guidelines:"
@@ -115,11 +176,16 @@ def ask_gpt4(prompt: str) -> str:
     """
     Send the prompt to GPT-4 and return the response.
     """
-    response = client.chat.completions.create(
-        model=DEPLOYMENT,
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.7,
-    )
+    with tracer.span("llm", model=DEPLOYMENT) as span:
+        response = get_openai_client().chat.completions.create(
+            model=DEPLOYMENT,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.7,
+        )
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            span.set("prompt_tokens", usage.prompt_tokens)
+            span.set("completion_tokens", usage.completion_tokens)
     return response.choices[0].message.content.strip()
 
 
@@ -156,6 +222,11 @@ def answer_question_with_sources(question: str, top_k: int = 5) -> None:
         question (str): The question to answer.
         top_k (int): Number of top documents to retrieve.
     """
+    with tracer.span("answer_question", root=True, top_k=top_k):
+        _answer_question_with_sources(question, top_k)
+
+
+def _answer_question_with_sources(question: str, top_k: int) -> None:
     print(f"Szukanie dokumentów dla zapytania: {question}")
     documents = search_documents(query=question, top_k=top_k)
 
@@ -171,8 +242,9 @@ def answer_question_with_sources(question: str, top_k: int = 5) -> None:
     print(answer)
 
     print("\nŹródła:")
-    for doc in documents:
-        print(f"- {doc.get('title') or doc.get('filepath') or doc.get('url')}")
+    with tracer.span("format_sources", sources=len(documents)):
+        for doc in documents:
+            print(f"- {doc.get('title') or doc.get('filepath') or doc.get('url')}")
     save_query_results_to_notebook(question, documents)
 
 
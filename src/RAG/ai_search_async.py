@@ -0,0 +1,366 @@
+import asyncio
+import logging
+import os
+import re
+import time
+import weakref
+
+from typing import Any, AsyncIterator, Dict, List, Optional
+from azure.core.credentials import AzureKeyCredential
+from azure.search.documents.aio import SearchClient
+from azure.search.documents.models import VectorizedQuery
+from dotenv import load_dotenv
+
+from RAG.ai_search import (
+    DEPLOYMENT,
+    SEARCH_BACKEND,
+    SELECT_FIELDS,
+    api_key,
+    build_prompt,
+    embedding_cache,
+    embedding_model_name,
+    endpoint,
+    index_name,
+    rerank_documents,
+    reranker,
+    search_client,
+    to_document,
+)
+from RAG.clients import get_async_openai_client
+from RAG.rate_limit import Priority, request_priority
+
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on concurrent calls to OpenAI and Search from this worker.
+MAX_IN_FLIGHT = int(os.getenv("ASYNC_MAX_IN_FLIGHT", "32"))
+RRF_K = 60
+# Questions of one batch answered at a time, so a large batch leaves
+# headroom under MAX_IN_FLIGHT for interactive requests.
+BATCH_CONCURRENCY = int(os.getenv("ASYNC_BATCH_CONCURRENCY", "8"))
+# Inputs per embeddings request (the API accepts at most 2048).
+EMBED_BATCH_SIZE = 1024
+
+# The semaphore and the aio Search client belong to the event loop that
+# first uses them, so each loop gets its own.
+_loop_state: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def _state() -> Dict[str, Any]:
+    loop = asyncio.get_running_loop()
+    state = _loop_state.get(loop)
+    if state is None:
+        state = {"in_flight": asyncio.Semaphore(MAX_IN_FLIGHT), "search": None}
+        _loop_state[loop] = state
+    return state
+
+
+def _in_flight() -> asyncio.Semaphore:
+    """The running loop's bound on concurrent OpenAI and Search calls."""
+    return _state()["in_flight"]
+
+
+def get_async_search_client() -> Optional[SearchClient]:
+    """
+    The running loop's aio Azure AI Search client, built on first use;
+    None with SEARCH_BACKEND=local.
+    """
+    if SEARCH_BACKEND == "local":
+        return None
+    state = _state()
+    if state["search"] is None:
+        state["search"] = SearchClient(
+            endpoint=endpoint,
+            index_name=index_name,
+            credential=AzureKeyCredential(api_key),
+        )
+    return state["search"]
+
+
+async def get_embeddings_async(texts: List[str]) -> List[List[float]]:
+    """
+    Get embeddings for several texts with a single Azure OpenAI request.
+    Texts already in the shared embedding cache are not sent.
+    """
+    # The cache is SQLite; keep its reads and writes off the event loop.
+    cached = await asyncio.to_thread(
+        embedding_cache.get_many, embedding_model_name, texts
+    )
+    missing = list(dict.fromkeys(t for t, v in zip(texts, cached) if v is None))
+    if missing:
+        vectors = []
+        for start in range(0, len(missing), EMBED_BATCH_SIZE):
+            async with _in_flight():
+                response = await get_async_openai_client().embeddings.create(
+                    model=embedding_model_name,
+                    input=missing[start : start + EMBED_BATCH_SIZE],
+                )
+            vectors.extend(item.embedding for item in response.data)
+        await asyncio.to_thread(
+            embedding_cache.put_many, embedding_model_name, missing, vectors
+        )
+        computed = dict(zip(missing, vectors))
+        cached = [
+            vector if vector is not None else computed[text]
+            for text, vector in zip(texts, cached)
+        ]
+    return cached
+
+
+async def search_with_embedding(
+    query: str, embedding: List[float], top_k: int = 5
+) -> List[Dict[str, Any]]:
+    """
+    Run a hybrid (text + vector) search for a query with a precomputed embedding.
+    """
+    vector = VectorizedQuery(
+        vector=embedding, k_nearest_neighbors=top_k, fields="contentVector"
+    )
+    async_search_client = get_async_search_client()
+    async with _in_flight():
+        if async_search_client is None:
+            # The local store is in-process NumPy; keep it off the event loop.
+            results = await asyncio.to_thread(
+                search_client.search,
+                search_text=query,
+                vector_queries=[vector],
+                select=SELECT_FIELDS,
+                top=top_k,
+            )
+            return [to_document(res) for res in results]
+        results = await async_search_client.search(
+            search_text=query,
+            vector_queries=[vector],
+            select=SELECT_FIELDS,
+            top=top_k,
+        )
+        return [to_document(res) async for res in results]
+
+
+def merge_hits(
+    result_lists: List[List[Dict[str, Any]]], top_k: int = 5
+) -> List[Dict[str, Any]]:
+    """
+    Merge the hits of several queries with reciprocal rank fusion.
+
+    Each document keeps its best original search score; documents found by
+    several reformulations rise to the top.
+    """
+    fused: Dict[str, float] = {}
+    documents: Dict[str, Dict[str, Any]] = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, 1):
+            key = doc["id"] or doc["content"]
+            fused[key] = fused.get(key, 0.0) + 1.0 / (RRF_K + rank)
+            if key not in documents or doc["score"] > documents[key]["score"]:
+                documents[key] = doc
+    ranked = sorted(fused, key=fused.get, reverse=True)[:top_k]
+    return [documents[key] for key in ranked]
+
+
+async def generate_reformulations(question: str, count: int) -> List[str]:
+    """
+    Ask the model for alternative phrasings of the question.
+    """
+    if count <= 0:
+        return []
+    async with _in_flight():
+        response = await get_async_openai_client().chat.completions.create(
+            model=DEPLOYMENT,
+            messages=[
+                {
+                    "role": "user",
+                    "content": (
+                        f"Rewrite the following question in {count} different ways "
+                        "to improve document search. Return one question per line, "
+                        f"without numbering or extra text.\n\nQuestion: {question}"
+                    ),
+                }
+            ],
+            temperature=0.7,
+            max_tokens=200,
+        )
+    lines = response.choices[0].message.content.splitlines()
+    cleaned = [re.sub(r"^\s*(\d+[.)]|[-*])\s*", "", line).strip() for line in lines]
+    return [line for line in cleaned if line][:count]
+
+
+async def search_documents_async(
+    query: str,
+    top_k: int = 5,
+    reformulations: int = 0,
+    embedding: Optional[List[float]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Search for documents with optional multi-query fan-out.
+
+    The original query is embedded and searched while reformulations are
+    still being generated; the reformulations are then embedded in one batch,
+    searched concurrently and all hits are merged. With a reranker
+    configured, each search over-fetches and the merged hits are reranked.
+    A precomputed embedding of the query skips its embedding request.
+    """
+    fetch_k = max(top_k, reranker.fetch_k) if reranker else top_k
+    reformulation_task = asyncio.create_task(
+        generate_reformulations(query, reformulations)
+    )
+    searches = []
+    try:
+        if embedding is None:
+            (embedding,) = await get_embeddings_async([query])
+        searches.append(
+            asyncio.create_task(search_with_embedding(query, embedding, fetch_k))
+        )
+
+        try:
+            queries = await reformulation_task
+        except Exception as e:
+            logger.warning(f"Nie udało się wygenerować przeformułowań: {e}")
+            queries = []
+        if queries:
+            embeddings = await get_embeddings_async(queries)
+            searches += [
+                asyncio.create_task(search_with_embedding(q, e, fetch_k))
+                for q, e in zip(queries, embeddings)
+            ]
+
+        result_lists = await asyncio.gather(*searches)
+    finally:
+        # A failed step must not leave the other requests running
+        reformulation_task.cancel()
+        for search in searches:
+            search.cancel()
+    documents = merge_hits(list(result_lists), fetch_k)
+    if reranker:
+        # Cross-encoder scoring is CPU bound; keep it off the event loop.
+        documents = await asyncio.to_thread(rerank_documents, query, documents, top_k)
+    return documents
+
+
+async def ask_gpt4_async(prompt: str) -> str:
+    """
+    Send the prompt to GPT-4 and return the response.
+    """
+    async with _in_flight():
+        response = await get_async_openai_client().chat.completions.create(
+            model=DEPLOYMENT,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.7,
+        )
+    return response.choices[0].message.content.strip()
+
+
+async def answer_question_async(
+    question: str,
+    top_k: int = 5,
+    reformulations: int = 0,
+    embedding: Optional[List[float]] = None,
+) -> Dict[str, Any]:
+    """
+    Answer a question using retrieved documents without blocking the event loop.
+
+    Args:
+        question (str): The question to answer.
+        top_k (int): Number of top documents to retrieve.
+        reformulations (int): Number of extra query phrasings to search with.
+        embedding (list, optional): Precomputed embedding of the question.
+
+    Returns:
+        dict: Contains 'answer' and 'sources' keys.
+    """
+    documents = await search_documents_async(question, top_k, reformulations, embedding)
+    if not documents:
+        return {"answer": "Nie znaleziono dokumentów.", "sources": []}
+
+    answer = await ask_gpt4_async(build_prompt(documents, question))
+    sources = [
+        doc.get("title") or doc.get("filepath") or doc.get("url") for doc in documents
+    ]
+    return {"answer": answer, "sources": sources}
+
+
+async def answer_questions_async(
+    questions: List[str],
+    top_k: int = 5,
+    reformulations: int = 0,
+    concurrency: int = BATCH_CONCURRENCY,
+    ordered: bool = False,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Answer a batch of questions, yielding one result per question.
+
+    All questions are embedded up front in batched embedding requests; the
+    searches and completions then run with at most `concurrency` questions
+    in flight. A failing question yields an error result and does not stop
+    the batch.
+
+    Args:
+        questions (list): The questions to answer.
+        top_k (int): Number of top documents to retrieve per question.
+        reformulations (int): Number of extra query phrasings to search with.
+        concurrency (int): Questions answered at the same time.
+        ordered (bool): Yield results in input order instead of as they finish.
+
+    Returns:
+        AsyncIterator[dict]: Results with 'index', 'query', 'status' and either
+        'answer' and 'sources' or 'error'.
+    """
+    valid = list(
+        dict.fromkeys(q for q in questions if isinstance(q, str) and q.strip())
+    )
+    try:
+        with request_priority(Priority.BATCH):
+            embeddings = dict(zip(valid, await get_embeddings_async(valid)))
+    except Exception as e:
+        # Each question falls back to embedding its own query.
+        logger.warning(f"Nie udało się osadzić pytań zbiorczo: {e}")
+        embeddings = {}
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def answer(index: int, question: Any) -> Dict[str, Any]:
+        result = {"index": index, "query": question}
+        if not isinstance(question, str) or not question.strip():
+            return {**result, "status": "error", "error": "Empty query"}
+        try:
+            # Each task has its own context: batch questions queue behind
+            # interactive ones for Azure OpenAI capacity
+            with request_priority(Priority.BATCH):
+                async with semaphore:
+                    started = time.perf_counter()
+                    answered = await answer_question_async(
+                        question, top_k, reformulations, embeddings.get(question)
+                    )
+                    latency_ms = (time.perf_counter() - started) * 1000
+        except Exception as e:
+            return {**result, "status": "error", "error": str(e)}
+        return {
+            **result,
+            "status": "success",
+            **answered,
+            "latency_ms": round(latency_ms, 1),
+        }
+
+    tasks = [asyncio.create_task(answer(i, q)) for i, q in enumerate(questions)]
+    try:
+        for next_result in tasks if ordered else asyncio.as_completed(tasks):
+            yield await next_result
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _main():
+    questions = [q.strip() for q in input("Zadaj pytania (oddziel ';'): ").split(";")]
+    results = await asyncio.gather(
+        *(answer_question_async(q, reformulations=2) for q in questions if q)
+    )
+    for question, result in zip(questions, results):
+        print(f"\nPytanie: {question}\nOdpowiedź: {result['answer']}")
+        print("Źródła:", ", ".join(result["sources"]))
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
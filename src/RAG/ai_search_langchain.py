@@ -1,14 +1,27 @@
 import os
 import logging
 import json
-from typing import List, Optional
+import threading
+import time
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
 from dotenv import load_dotenv
 
 from langchain.prompts import PromptTemplate
 from langchain.chains import RetrievalQA
-from langchain_community.document_loaders import TextLoader, PyPDFLoader, CSVLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain.schema import Document
+from langchain_core.callbacks import BaseCallbackHandler, CallbackManagerForRetrieverRun
+from langchain_core.outputs import LLMResult
+from langchain_core.retrievers import BaseRetriever
 from langchain_openai import AzureOpenAIEmbeddings, AzureChatOpenAI
 
 os.environ["AZURESEARCH_FIELDS_CONTENT_VECTOR"] = "contentVector"
@@ -17,6 +30,20 @@ os.environ["AZURESEARCH_FIELDS_TAG"] = "meta_json_string"
 
 from langchain_community.vectorstores.azuresearch import AzureSearch
 
+from RAG.answer_cache import SemanticAnswerCache
+from RAG.chunking import Chunk, TextChunker, get_default_chunker
+from RAG.clients import get_async_http_client, get_http_client
+from RAG.context_packer import ContextPacker, Passage, get_default_packer
+from RAG.embedding_cache import CachedEmbeddings, get_default_cache
+from RAG.embedding_pipeline import EmbeddingPipeline, IngestionReport
+from RAG.ingest_manifest import DEFAULT_MANIFEST_PATH, IngestManifest, IngestPlan
+from RAG.local_vector_store import DEFAULT_INDEX_PATH, get_default_store
+from RAG.rate_limit import Priority, request_priority
+from RAG.rerank import Reranker, get_default_reranker
+from RAG.streaming_loader import get_loader, supported_extensions
+from RAG.tokens import count_tokens
+from RAG.tracing import get_tracer
+
 
 # Configure logging with more specific settings
 logging.basicConfig(
@@ -32,6 +59,144 @@ logging.getLogger("azure.core.pipeline.policies.http_logging_policy").setLevel(
     logging.WARNING
 )
 
+tracer = get_tracer()
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Record every LLM call as an "llm" span with its token usage."""
+
+    def __init__(self):
+        self._spans: Dict[Any, Any] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs) -> None:
+        self._spans[run_id] = tracer.start_span("llm")
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs) -> None:
+        self._spans[run_id] = tracer.start_span("llm")
+
+    def on_llm_end(self, response: LLMResult, *, run_id, **kwargs) -> None:
+        span = self._spans.pop(run_id, None)
+        if span is None or not span.recording:
+            return
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if "prompt_tokens" in usage:
+            span.set("prompt_tokens", usage["prompt_tokens"])
+        # Streamed responses carry no usage: count the generated text instead
+        span.set(
+            "completion_tokens",
+            usage.get("completion_tokens")
+            or sum(count_tokens(g.text) for gs in response.generations for g in gs),
+        )
+        tracer.end_span(span)
+
+    def on_llm_error(self, error: BaseException, *, run_id, **kwargs) -> None:
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            tracer.end_span(span, error)
+
+
+class TracedPromptTemplate(PromptTemplate):
+    """PromptTemplate recording each format as a "prompt_build" span."""
+
+    def format(self, **kwargs: Any) -> str:
+        with tracer.span("prompt_build") as span:
+            prompt = super().format(**kwargs)
+            if span.recording:
+                span.set("prompt_tokens", count_tokens(prompt))
+            return prompt
+
+
+class TracedRetriever(BaseRetriever):
+    """Record the search of a base retriever as a "retrieve" span."""
+
+    base_retriever: BaseRetriever
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        with tracer.span("retrieve") as span:
+            documents = self.base_retriever.invoke(
+                query, config={"callbacks": run_manager.get_child()}
+            )
+            span.set("documents", len(documents))
+            return documents
+
+
+class LocalSearchRetriever(BaseRetriever):
+    """Hybrid retriever over a LocalVectorStore, with the same metadata fields."""
+
+    store: Any
+    embeddings: Any
+    k: int = 5
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        hits = self.store.hybrid_search(
+            query, [self.embeddings.embed_query(query)], self.k
+        )
+        return [
+            Document(
+                page_content=hit["content"],
+                metadata={
+                    k: v
+                    for k, v in hit.items()
+                    if k not in ("content", "@search.score")
+                },
+            )
+            for hit in hits
+        ]
+
+
+class RerankingRetriever(BaseRetriever):
+    """Over-fetch from a base retriever and keep the reranker's top results."""
+
+    base_retriever: BaseRetriever
+    reranker: Any
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        candidates = self.base_retriever.invoke(
+            query, config={"callbacks": run_manager.get_child()}
+        )
+        with tracer.span("rerank", candidates=len(candidates)):
+            ranked = self.reranker.rerank(query, candidates, lambda d: d.page_content)
+        documents = []
+        for doc, score in ranked:
+            doc.metadata["rerank_score"] = score
+            documents.append(doc)
+        return documents
+
+
+class ContextPackingRetriever(BaseRetriever):
+    """Merge adjacent chunks and fit the retrieved documents into a token budget."""
+
+    base_retriever: BaseRetriever
+    packer: Any
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        documents = self.base_retriever.invoke(
+            query, config={"callbacks": run_manager.get_child()}
+        )
+        with tracer.span("context_pack", passages=len(documents)) as span:
+            packed = self.packer.pack(
+                [Passage.from_fields(d.page_content, d.metadata) for d in documents]
+            )
+            span.set("context_tokens", packed.tokens)
+        return [
+            Document(
+                page_content=passage.text,
+                metadata={**passage.metadata, "chunks": passage.chunks},
+            )
+            for passage in packed.passages
+        ]
+
+
+NO_ANSWER_MESSAGE = "I apologize, but I couldn't process your question. Please make sure documents are loaded into the system first."
+
 
 class RAGSystem:
     def __init__(self):
@@ -46,6 +211,8 @@ class RAGSystem:
         self.azure_embedding_deployment = os.getenv("EMBEDDING_MODEL_NAME")
 
         # Azure Search Configuration
+        self.search_backend = os.getenv("SEARCH_BACKEND", "azure")
+        self.local_index_path = os.getenv("LOCAL_INDEX_PATH", DEFAULT_INDEX_PATH)
         self.azure_search_endpoint = os.getenv("SEARCH_AI_ENDPOINT")
         self.azure_search_api_key = os.getenv("SEARCH_AI_KEY")
         self.azure_search_index = os.getenv("SEARCH_AI_INDEX_NAME")
@@ -54,158 +221,482 @@ class RAGSystem:
         logger.info("RAG System initialized successfully")
 
     def _initialize_components(self):
-        """Initialize LangChain components."""
-        self.embeddings = AzureOpenAIEmbeddings(
-            openai_api_version=self.azure_openai_api_version,
-            azure_endpoint=self.azure_openai_endpoint,
-            azure_deployment=self.azure_embedding_deployment,
-            api_key=self.azure_openai_api_key,
+        """
+        Initialize LangChain components.
+
+        Clients are created lazily on first use so that importing the Function
+        app does not pay for them; the QA chain is compiled once and shared by
+        all requests.
+        """
+        self._init_lock = threading.RLock()
+        self._embeddings = None
+        self._llm = None
+        self._vector_store = None
+        self._search_client = None
+        self._retriever = None
+        self._embedding_pipeline = None
+        self._prompt_template = None
+        self._qa_chain = None
+
+        self.manifest = IngestManifest(
+            os.getenv("INGEST_MANIFEST_PATH", DEFAULT_MANIFEST_PATH)
         )
+        self.answer_cache = SemanticAnswerCache(
+            threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+            ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+            max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512")),
+            enabled=os.getenv("ANSWER_CACHE_ENABLED", "1") != "0",
+        )
+        self.reranker: Optional[Reranker] = get_default_reranker()
+        self.context_packer: ContextPacker = get_default_packer()
+        self.chunker: TextChunker = get_default_chunker()
+        logger.debug("Components initialized successfully")
 
-        self.llm = AzureChatOpenAI(
-            deployment_name=self.azure_openai_deployment,
-            openai_api_key=self.azure_openai_api_key,
-            azure_endpoint=self.azure_openai_endpoint,
-            openai_api_version=self.azure_openai_api_version,
-            temperature=0,
+    def _get_or_create(self, attr: str, factory: Callable[[], Any]) -> Any:
+        """Return self.<attr>, building it with factory exactly once."""
+        value = getattr(self, attr)
+        if value is None:
+            with self._init_lock:
+                value = getattr(self, attr)
+                if value is None:
+                    value = factory()
+                    setattr(self, attr, value)
+                    logger.debug(f"Created {attr.lstrip('_')}")
+        return value
+
+    @property
+    def embeddings(self) -> CachedEmbeddings:
+        return self._get_or_create(
+            "_embeddings",
+            lambda: CachedEmbeddings(
+                AzureOpenAIEmbeddings(
+                    openai_api_version=self.azure_openai_api_version,
+                    azure_endpoint=self.azure_openai_endpoint,
+                    azure_deployment=self.azure_embedding_deployment,
+                    api_key=self.azure_openai_api_key,
+                    http_client=get_http_client(),
+                    http_async_client=get_async_http_client(),
+                ),
+                model=self.azure_embedding_deployment,
+                cache=get_default_cache(),
+            ),
         )
 
-        self.vector_store = AzureSearch(
-            azure_search_endpoint=self.azure_search_endpoint,
-            azure_search_key=self.azure_search_api_key,
-            index_name=self.azure_search_index,
-            embedding_function=self.embeddings.embed_query,
+    @property
+    def llm(self) -> AzureChatOpenAI:
+        return self._get_or_create(
+            "_llm",
+            lambda: AzureChatOpenAI(
+                deployment_name=self.azure_openai_deployment,
+                openai_api_key=self.azure_openai_api_key,
+                azure_endpoint=self.azure_openai_endpoint,
+                openai_api_version=self.azure_openai_api_version,
+                temperature=0,
+                callbacks=[TracingCallbackHandler()],
+                http_client=get_http_client(),
+                http_async_client=get_async_http_client(),
+            ),
         )
 
-        self.retriever = self.vector_store.as_retriever(k=5)
-        logger.debug("Components initialized successfully")
+    @property
+    def vector_store(self) -> AzureSearch:
+        return self._get_or_create(
+            "_vector_store",
+            lambda: AzureSearch(
+                azure_search_endpoint=self.azure_search_endpoint,
+                azure_search_key=self.azure_search_api_key,
+                index_name=self.azure_search_index,
+                embedding_function=self.embeddings.embed_query,
+            ),
+        )
 
-    def load_documents_from_file(self, file_path: str) -> List[Document]:
+    @property
+    def search_client(self):
+        """Client used for uploads and deletes: Azure's or the local store."""
+        if self.search_backend == "local":
+            return self._get_or_create(
+                "_search_client",
+                lambda: get_default_store(self.local_index_path),
+            )
+        return self.vector_store.client
+
+    @property
+    def retriever(self):
+        return self._get_or_create("_retriever", self._create_retriever)
+
+    def _create_retriever(self) -> BaseRetriever:
         """
-        Load documents from a file and upload them to Azure Search.
+        Search retriever, followed by the rerank stage when one is configured
+        and by context packing, so the "stuff" chain gets a bounded context.
         """
-        logger.info(f"Loading document: {file_path}")
+        k = self.reranker.fetch_k if self.reranker else 5
+        if self.search_backend == "local":
+            retriever = LocalSearchRetriever(
+                store=self.search_client, embeddings=self.embeddings, k=k
+            )
+        else:
+            # The Azure retriever passes k itself; k in search_kwargs collides
+            retriever = self.vector_store.as_retriever(k=k)
+        retriever = TracedRetriever(base_retriever=retriever)
+        if self.reranker is not None:
+            retriever = RerankingRetriever(
+                base_retriever=retriever, reranker=self.reranker
+            )
+        return ContextPackingRetriever(
+            base_retriever=retriever, packer=self.context_packer
+        )
 
-        ext = os.path.splitext(file_path)[1].lower()
+    def _rerank_ms(self) -> Optional[float]:
+        """Rerank latency of the question just answered on this thread."""
+        stats = self.reranker.last_stats if self.reranker else None
+        return stats.latency_ms if stats else None
+
+    @property
+    def embedding_pipeline(self) -> EmbeddingPipeline:
+        return self._get_or_create(
+            "_embedding_pipeline",
+            lambda: EmbeddingPipeline(
+                embed_batch=self.embeddings.embed_documents,
+                upload_documents=self.search_client.merge_or_upload_documents,
+            ),
+        )
 
-        if ext == ".txt":
-            loader = TextLoader(file_path, encoding="utf-8")
-        elif ext == ".pdf":
-            loader = PyPDFLoader(file_path)
-        elif ext == ".csv":
-            loader = CSVLoader(file_path, encoding="utf-8")
-        else:
-            raise ValueError("Only .txt and .pdf files are supported")
+    @property
+    def qa_chain(self) -> RetrievalQA:
+        return self._get_or_create("_qa_chain", self._create_qa_chain)
+
+    def _to_index_documents(
+        self, split_docs: Iterable[Chunk], file_path: str
+    ) -> Iterator[dict]:
+        """Format chunks as Azure Search index documents."""
+        title = os.path.basename(file_path)
+        for chunk in split_docs:
+            yield {
+                "content": chunk.page_content,
+                "url": "default",
+                "filepath": file_path,
+                "title": title,
+                "meta_json_string": json.dumps(
+                    {
+                        # LangChain reads document metadata from this field
+                        # alone, so the source must be in it too
+                        "filepath": file_path,
+                        "chunk": chunk.index,
+                        "page": "n/a" if chunk.page is None else chunk.page,
+                        "start": chunk.start,
+                        "end": chunk.end,
+                    }
+                ),
+            }
 
-        documents = loader.load()
+    def _delete_chunks(self, chunk_ids: List[str], page_size: int = 1000) -> List[str]:
+        """Delete chunks from Azure Search, returning the ids actually removed."""
+        deleted = []
+        for start in range(0, len(chunk_ids), page_size):
+            page = chunk_ids[start : start + page_size]
+            try:
+                results = self.search_client.delete_documents(
+                    [{"id": chunk_id} for chunk_id in page]
+                )
+            except Exception as e:
+                logger.error(f"Failed to delete stale chunks from Azure Search: {e}")
+                continue
+            deleted.extend(r.key for r in results if r.succeeded)
+        return deleted
+
+    def _index_files(
+        self,
+        files: Iterable[Tuple[str, Callable[[], Iterable[Chunk]]]],
+        on_progress: Optional[Callable[[IngestionReport], None]] = None,
+        failed_files: Optional[Dict[str, str]] = None,
+    ) -> IngestionReport:
+        """
+        Bring the index in line with the chunks of one or more files.
 
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000, chunk_overlap=100
-        )
-        split_docs = text_splitter.split_documents(documents)
+        All files feed a single embedding pipeline run, so embedding batches
+        and upload pages span file boundaries. Per file, only chunks whose
+        fingerprint (content and position) is not yet recorded are embedded
+        and upserted, and chunks that disappeared from the file are deleted.
+        Chunks are consumed lazily, so pages can still be parsing while
+        earlier chunks are being embedded.
 
-        # Format documents for Azure Search
-        formatted_docs = []
-        for i, doc in enumerate(split_docs):
-            formatted_doc = Document(
-                page_content=doc.page_content,
-                metadata={
-                    "url": "default",
-                    "filepath": file_path,
-                    "title": os.path.basename(file_path),
-                    "meta_json_string": json.dumps(
-                        {"chunk": i + 1, "page": doc.metadata.get("page", "n/a")}
-                    ),
+        Args:
+            files: (file_path, chunks) pairs, where chunks() starts parsing
+            on_progress: Optional callback receiving the running report
+            failed_files: When given, a file that fails to parse is recorded
+                here as {file_path: error} and skipped, leaving its manifest
+                untouched; otherwise the error propagates. Either way, the
+                chunks of the file already uploaded are deleted again.
+
+        Returns:
+            IngestionReport: Report of the embedding pipeline run
+        """
+        plans: List[IngestPlan] = []
+        failed_plans: List[IngestPlan] = []
+
+        def changed_documents() -> Iterator[dict]:
+            for file_path, chunks in files:
+                plan = self.manifest.plan(file_path)
+                try:
+                    yield from plan.filter_changed(
+                        self._to_index_documents(chunks(), file_path)
+                    )
+                except Exception as e:
+                    failed_plans.append(plan)
+                    if failed_files is None:
+                        raise
+                    logger.error(f"Failed to load {file_path}: {e}")
+                    failed_files[file_path] = str(e)
+                    continue
+                plans.append(plan)
+
+        try:
+            # Ingestion yields Azure OpenAI capacity to interactive questions
+            with request_priority(Priority.BULK):
+                report = self.embedding_pipeline.run(
+                    changed_documents(), on_progress=on_progress
+                )
+        finally:
+            # Chunks of a file that failed midway may already be uploaded,
+            # but the manifest never records them; remove them again
+            for plan in failed_plans:
+                self._delete_chunks(
+                    [id_ for id_ in plan.fingerprints if id_ not in plan.recorded]
+                )
+        failed_ids = {i for b in report.failed_batches for i in b.chunk_ids}
+        removed = 0
+        for plan in plans:
+            deleted = self._delete_chunks(plan.delete)
+            removed += len(deleted)
+            self.manifest.apply(
+                plan.filepath,
+                added={
+                    chunk_id: fingerprint
+                    for chunk_id, fingerprint in plan.changed.items()
+                    if chunk_id not in failed_ids
                 },
+                removed=deleted,
+            )
+            logger.info(
+                f"{plan.filepath}: {len(plan.fingerprints) - plan.unchanged} new or "
+                f"changed chunks, {plan.unchanged} unchanged, {len(deleted)} removed"
             )
-            formatted_docs.append(formatted_doc)
+        if report.chunks_indexed or removed:
+            self.answer_cache.invalidate()
 
-        try:
-            self.vector_store.add_documents(formatted_docs)
-            logger.info(f"Uploaded {len(formatted_docs)} documents to Azure Search")
-        except Exception as e:
-            logger.error(f"Failed to upload documents to Azure Search: {e}")
-            raise
+        if report.failed_batches:
+            failed = ", ".join(
+                f"{b.stage} #{b.batch_index}" for b in report.failed_batches
+            )
+            logger.error(f"Failed to upload documents to Azure Search: {failed}")
+        else:
+            logger.info(
+                f"Uploaded {report.chunks_indexed} documents to Azure Search "
+                f"({report.chunks_per_second:.1f} chunks/s)"
+            )
+        return report
 
-        return split_docs
+    @staticmethod
+    def _raise_for_failures(report: IngestionReport) -> None:
+        if report.failed_batches:
+            failed = ", ".join(
+                f"{b.stage} #{b.batch_index}" for b in report.failed_batches
+            )
+            raise RuntimeError(
+                f"Indexed {report.chunks_indexed}/{report.chunks_total} chunks, "
+                f"failed batches: {failed}"
+            )
 
-    def load_documents_from_memory(self, file_obj) -> List[Document]:
+    def ingest(
+        self,
+        stream: BinaryIO,
+        file_name: str,
+        mime_type: Optional[str] = None,
+        on_progress: Optional[Callable[[Dict[str, int]], None]] = None,
+    ) -> int:
         """
-        Load documents from a file-like object in memory.
+        Ingest one file from a binary stream without materialising it.
+
+        Pages are parsed by the loader registered for the file's extension
+        (or MIME type), chunked, embedded and uploaded as a pipeline, so only
+        the chunks currently in flight are held in memory.
 
         Args:
-            file_obj: A file-like object (e.g., BytesIO) containing the document data
+            stream: Binary file-like object with the file contents
+            file_name: Original file name, used for loader dispatch and metadata
+            mime_type: Optional MIME type, used when file_name has no known
+                extension
+            on_progress: Optional callback receiving pages_parsed,
+                chunks_embedded and chunks_indexed counters as they change
 
         Returns:
-            List[Document]: List of processed document chunks
+            int: Number of document chunks produced from the file
         """
-        logger.info(f"Loading document from memory: {file_obj.name}")
-
-        ext = os.path.splitext(file_obj.name)[1].lower()
-
-        if ext == ".txt":
-            text = file_obj.read().decode("utf-8")
-            documents = [
-                Document(page_content=text, metadata={"source": file_obj.name})
-            ]
-        elif ext == ".pdf":
-            from langchain_community.document_loaders import PyPDFLoader
-            import tempfile
-
-            # PyPDFLoader requires a file path, so we need to save temporarily
-            with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as temp_file:
-                temp_file.write(file_obj.read())
-                temp_file.flush()
-                loader = PyPDFLoader(temp_file.name)
-                documents = loader.load()
-                os.unlink(temp_file.name)  # Clean up temp file
-        elif ext == ".csv":
-            import pandas as pd
-
-            df = pd.read_csv(file_obj)
-            documents = [
-                Document(
-                    page_content=row.to_string(),
-                    metadata={"source": file_obj.name, "row": i},
-                )
-                for i, row in df.iterrows()
-            ]
-        else:
-            raise ValueError("Only .txt, .pdf, and .csv files are supported")
+        return self._ingest(stream, file_name, mime_type, on_progress)
+
+    def _ingest(
+        self,
+        stream: BinaryIO,
+        file_name: str,
+        mime_type: Optional[str] = None,
+        on_progress: Optional[Callable[[Dict[str, int]], None]] = None,
+        on_chunk: Optional[Callable[[Chunk], None]] = None,
+    ) -> int:
+        """ingest(), also passing every chunk produced to on_chunk."""
+        logger.info(f"Ingesting document: {file_name}")
+        loader = get_loader(file_name, mime_type)
+
+        chunk_count = 0
+        progress = {"pages_parsed": 0, "chunks_embedded": 0, "chunks_indexed": 0}
+
+        def notify() -> None:
+            if on_progress:
+                on_progress(dict(progress))
+
+        def parsed_pages() -> Iterator[Document]:
+            for page in loader(stream, file_name):
+                progress["pages_parsed"] += 1
+                notify()
+                yield page
+
+        def chunks() -> Iterator[Chunk]:
+            nonlocal chunk_count
+            for chunk in self.chunker.split_documents(parsed_pages()):
+                chunk_count += 1
+                if on_chunk:
+                    on_chunk(chunk)
+                yield chunk
+
+        def pipeline_progress(report: IngestionReport) -> None:
+            progress["chunks_embedded"] = report.chunks_embedded
+            progress["chunks_indexed"] = report.chunks_indexed
+            notify()
+
+        report = self._index_files([(file_name, chunks)], pipeline_progress)
+        pipeline_progress(report)
+        self._raise_for_failures(report)
+        return chunk_count
+
+    def ingest_many(
+        self,
+        paths: Iterable[str],
+        recursive: bool = True,
+        on_progress: Optional[Callable[[IngestionReport], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Ingest many files, or every supported file under directories, in one
+        embedding pipeline run.
 
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000, chunk_overlap=100
-        )
-        split_docs = text_splitter.split_documents(documents)
+        Files are parsed one after another while earlier chunks are being
+        embedded; embedding batches and upload pages are shared across files.
+        A file that cannot be read or parsed is reported and skipped.
 
-        # Format documents for Azure Search
-        formatted_docs = []
-        for i, doc in enumerate(split_docs):
-            formatted_doc = Document(
-                page_content=doc.page_content,
-                metadata={
-                    "url": "default",
-                    "filepath": file_obj.name,
-                    "title": os.path.basename(file_obj.name),
-                    "meta_json_string": json.dumps(
-                        {"chunk": i + 1, "page": doc.metadata.get("page", "n/a")}
-                    ),
-                },
+        Args:
+            paths: File and directory paths
+            recursive: Whether to descend into subdirectories
+            on_progress: Optional callback receiving the running report
+
+        Returns:
+            Dict[str, Any]: Files indexed, failed files with their errors,
+            chunk counts and timing
+        """
+        if isinstance(paths, str):
+            paths = [paths]
+        failed: Dict[str, str] = {}
+        file_paths: List[str] = []
+        for path in paths:
+            if os.path.isdir(path):
+                file_paths.extend(self._supported_files(path, recursive))
+            else:
+                file_paths.append(path)
+
+        def chunks_of(file_path: str) -> Callable[[], Iterator[Chunk]]:
+            def chunks() -> Iterator[Chunk]:
+                loader = get_loader(file_path)
+                with open(file_path, "rb") as f:
+                    yield from self.chunker.split_documents(loader(f, file_path))
+
+            return chunks
+
+        logger.info(f"Ingesting {len(file_paths)} files")
+        report = self._index_files(
+            ((file_path, chunks_of(file_path)) for file_path in file_paths),
+            on_progress=on_progress,
+            failed_files=failed,
+        )
+        failed_ids = {i for b in report.failed_batches for i in b.chunk_ids}
+        return {
+            "files_indexed": [p for p in file_paths if p not in failed],
+            "files_failed": failed,
+            "chunks_total": report.chunks_total,
+            "chunks_indexed": report.chunks_indexed,
+            "chunks_failed": len(failed_ids),
+            "elapsed_seconds": report.elapsed_seconds,
+        }
+
+    @staticmethod
+    def _supported_files(directory: str, recursive: bool) -> List[str]:
+        """Files under directory with a registered loader, in a stable order."""
+        extensions = set(supported_extensions())
+        found = []
+        for root, dirs, names in os.walk(directory):
+            dirs.sort()
+            found.extend(
+                os.path.join(root, name)
+                for name in sorted(names)
+                if os.path.splitext(name)[1].lower() in extensions
             )
-            formatted_docs.append(formatted_doc)
+            if not recursive:
+                break
+        return found
 
-        try:
-            self.vector_store.add_documents(formatted_docs)
-            logger.info(f"Uploaded {len(formatted_docs)} documents to Azure Search")
-        except Exception as e:
-            logger.error(f"Failed to upload documents to Azure Search: {e}")
-            raise
+    def load_documents_from_file(self, file_path: str) -> List[Document]:
+        """
+        Load documents from a file and upload them to Azure Search.
 
-        return split_docs
+        Every chunk of the file is kept in memory to be returned; use ingest()
+        or ingest_many() when only the upload matters.
+
+        Returns:
+            List[Document]: List of processed document chunks
+        """
+        chunks: List[Chunk] = []
+        with open(file_path, "rb") as f:
+            self._ingest(f, file_path, on_chunk=chunks.append)
+        return [chunk.to_document() for chunk in chunks]
+
+    def load_documents_from_memory(self, file_obj) -> List[Document]:
+        """
+        Load documents from a file-like object in memory.
+
+        Args:
+            file_obj: A file-like object (e.g., BytesIO or a Streamlit upload)
+                with a name and, optionally, a MIME type
+
+        Returns:
+            List[Document]: List of processed document chunks
+        """
+        chunks: List[Chunk] = []
+        self._ingest(
+            file_obj,
+            file_obj.name,
+            getattr(file_obj, "type", None),
+            on_chunk=chunks.append,
+        )
+        return [chunk.to_document() for chunk in chunks]
+
+    def load_documents_from_stream(
+        self,
+        stream: BinaryIO,
+        file_name: str,
+        on_progress: Optional[Callable[[Dict[str, int]], None]] = None,
+    ) -> int:
+        """Ingest a file from a binary stream; see ingest()."""
+        return self.ingest(stream, file_name, on_progress=on_progress)
 
     def _build_prompt_template(self) -> PromptTemplate:
         """Build a prompt template for the RAG system."""
-        return PromptTemplate(
+        return TracedPromptTemplate(
             input_variables=["context", "question"],
             template="""
 You are an AI assistant that answers questions strictly based on the provided context documents.
@@ -222,85 +713,249 @@ Instructions:
 """,
         )
 
+    @property
+    def prompt_template(self) -> PromptTemplate:
+        return self._get_or_create("_prompt_template", self._build_prompt_template)
+
     def _create_qa_chain(self) -> RetrievalQA:
         """Create a RetrievalQA chain for question answering."""
         return RetrievalQA.from_chain_type(
             llm=self.llm,
             retriever=self.retriever,
             chain_type="stuff",
-            chain_type_kwargs={"prompt": self._build_prompt_template()},
+            chain_type_kwargs={"prompt": self.prompt_template},
             return_source_documents=True,
         )
 
-    def ask_question(self, query: str) -> dict:
+    def _lookup_cached_answer(
+        self, query: str, started: float
+    ) -> Tuple[Optional[List[float]], Optional[dict]]:
         """
-        Ask a question using the RAG system.
+        Embed the query and look it up in the semantic answer cache.
 
-        Args:
-            query (str): The question to ask
+        Near-duplicate questions are answered from the cache; the query
+        embedding is reused by the retriever through the embedding cache.
 
         Returns:
-            dict: Contains 'answer' and 'sources' keys with the response and source documents
+            Tuple: The query embedding (None if embedding failed) and the
+            cached response, if any
         """
-        logger.info(f"Processing question: {query}")
-
-        # Check if there are any documents in the vector store
+        if not self.answer_cache.enabled:
+            return None, None
         try:
-            qa_chain = self._create_qa_chain()
-            result = qa_chain.invoke({"query": query})
+            query_embedding = self.embeddings.embed_query(query)
         except Exception as e:
-            logger.error(f"Error during question processing: {str(e)}")
-            return {
-                "answer": "I apologize, but I couldn't process your question. Please make sure documents are loaded into the system first.",
-                "sources": [],
-            }
+            logger.warning(f"Could not embed query for the answer cache: {e}")
+            return None, None
+        cached = self.answer_cache.lookup(query_embedding)
+        if cached is not None:
+            self.answer_cache.record_hit_latency(time.perf_counter() - started)
+        return query_embedding, cached
+
+    def _format_sources(self, sources: List[Document]) -> List[dict]:
+        """Process source documents into source name and page entries."""
+        with tracer.span("format_sources", sources=len(sources)):
+            # Process sources with better fallback values and error handling
+            source_list = []
+            for i, doc in enumerate(sources, 1):
+                try:
+                    metadata = doc.metadata
+
+                    # Get source name with fallbacks
+                    source_candidates = [
+                        metadata.get("source"),
+                        metadata.get("title"),
+                        metadata.get("filepath"),
+                        metadata.get("file_path"),
+                        metadata.get("document_name"),
+                        f"Document {i}",
+                    ]
+                    source_name = next(
+                        (s for s in source_candidates if s), "Unknown Source"
+                    )
 
-        answer = result["result"]
-        sources = result.get("source_documents", [])
+                    # Get page number with fallback
+                    page = metadata.get("page", metadata.get("chunk", i))
 
-        # Process sources with better fallback values and error handling
-        source_list = []
-        for i, doc in enumerate(sources, 1):
-            try:
-                metadata = doc.metadata
-
-                # Get source name with fallbacks
-                source_candidates = [
-                    metadata.get("source"),
-                    metadata.get("title"),
-                    metadata.get("filepath"),
-                    metadata.get("file_path"),
-                    metadata.get("document_name"),
-                    f"Document {i}",
-                ]
-                source_name = next(
-                    (s for s in source_candidates if s), "Unknown Source"
-                )
+                    # Try to parse meta_json_string if it exists
+                    try:
+                        if "meta_json_string" in metadata:
+                            meta_data = json.loads(metadata["meta_json_string"])
+                            if isinstance(meta_data, dict):
+                                if "page" in meta_data:
+                                    page = meta_data["page"]
+                                if "chunk" in meta_data:
+                                    page = meta_data["chunk"]
+                    except json.JSONDecodeError:
+                        logger.warning(
+                            f"Could not parse meta_json_string for source {i}"
+                        )
+
+                    source_list.append({"source": str(source_name), "page": str(page)})
+                    logger.debug(f"Processed source {i}: {source_name} (page: {page})")
+
+                except Exception as e:
+                    logger.warning(f"Error processing source {i}: {str(e)}")
+                    source_list.append({"source": f"Document {i}", "page": str(i)})
 
-                # Get page number with fallback
-                page = metadata.get("page", metadata.get("chunk", i))
+        logger.info(f"Processed {len(source_list)} sources successfully")
+        return source_list
 
-                # Try to parse meta_json_string if it exists
-                try:
-                    if "meta_json_string" in metadata:
-                        meta_data = json.loads(metadata["meta_json_string"])
-                        if isinstance(meta_data, dict):
-                            if "page" in meta_data:
-                                page = meta_data["page"]
-                            if "chunk" in meta_data:
-                                page = meta_data["chunk"]
-                except json.JSONDecodeError:
-                    logger.warning(f"Could not parse meta_json_string for source {i}")
-
-                source_list.append({"source": str(source_name), "page": str(page)})
-                logger.debug(f"Processed source {i}: {source_name} (page: {page})")
+    def ask_question(self, query: str, include_contexts: bool = False) -> dict:
+        """
+        Ask a question using the RAG system.
 
+        Args:
+            query (str): The question to ask
+            include_contexts (bool): Also return the texts of the documents
+                the answer was generated from
+
+        Returns:
+            dict: Contains 'answer' and 'sources' keys with the response and source documents,
+            and 'rerank_ms' with the rerank latency when the question was not cached.
+            With include_contexts, 'contexts' holds the documents' texts (empty
+            for a cached answer)
+        """
+        logger.info(f"Processing question: {query}")
+        started = time.perf_counter()
+
+        with tracer.span("ask_question", root=True) as span:
+            # Read before retrieval, so an answer racing an ingestion is not cached
+            generation = self.answer_cache.generation
+            query_embedding, cached = self._lookup_cached_answer(query, started)
+            span.set("answer_cache_hit", cached is not None)
+            if cached is not None:
+                if include_contexts:
+                    cached["contexts"] = []
+                return cached
+
+            # Check if there are any documents in the vector store
+            try:
+                result = self.qa_chain.invoke({"query": query})
             except Exception as e:
-                logger.warning(f"Error processing source {i}: {str(e)}")
-                source_list.append({"source": f"Document {i}", "page": str(i)})
+                logger.error(f"Error during question processing: {str(e)}")
+                span.error = f"{type(e).__name__}: {e}"
+                response = {"answer": NO_ANSWER_MESSAGE, "sources": []}
+                if include_contexts:
+                    response["contexts"] = []
+                return response
+
+            answer = result["result"]
+            source_documents = result.get("source_documents", [])
+            source_list = self._format_sources(source_documents)
+
+        response = {"answer": answer, "sources": source_list}
+        if query_embedding is not None:
+            self.answer_cache.store(
+                query_embedding,
+                query,
+                response,
+                time.perf_counter() - started,
+                generation,
+            )
+        response["rerank_ms"] = self._rerank_ms()
+        if include_contexts:
+            response["contexts"] = [doc.page_content for doc in source_documents]
+        return response
 
-        logger.info(f"Processed {len(source_list)} sources successfully")
-        return {"answer": answer, "sources": source_list}
+    def stream_question(self, query: str) -> Iterator[dict]:
+        """
+        Ask a question and stream the answer as it is generated.
+
+        Args:
+            query (str): The question to ask
+
+        Yields:
+            dict: {'type': 'token', 'content': ...} events while the answer is
+            generated, then {'type': 'sources', 'sources': [...]} and finally
+            {'type': 'done', 'ttft_ms': ..., 'total_ms': ..., 'rerank_ms': ...}
+            with the time to first token, the total and the rerank latency
+        """
+        logger.info(f"Streaming question: {query}")
+        # The generator may be resumed in different contexts (e.g. a thread
+        # pool per event), so the span is only made current while our own
+        # code runs, never across a yield.
+        span = tracer.start_span("stream_question", root=True)
+        error = None
+        try:
+            yield from self._stream_answer(query, span)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            tracer.end_span(span, error)
+
+    def _stream_answer(self, query: str, span) -> Iterator[dict]:
+        started = time.perf_counter()
+
+        generation = self.answer_cache.generation
+        with tracer.activate(span):
+            query_embedding, cached = self._lookup_cached_answer(query, started)
+        span.set("answer_cache_hit", cached is not None)
+        if cached is not None:
+            ttft_ms = (time.perf_counter() - started) * 1000
+            yield {"type": "token", "content": cached["answer"]}
+            yield {"type": "sources", "sources": cached["sources"]}
+            yield {"type": "done", "ttft_ms": ttft_ms, "total_ms": ttft_ms}
+            return
+
+        try:
+            with tracer.activate(span):
+                documents = self.retriever.invoke(query)
+            rerank_ms = self._rerank_ms()
+        except Exception as e:
+            logger.error(f"Error during question processing: {str(e)}")
+            span.error = f"{type(e).__name__}: {e}"
+            yield {"type": "token", "content": NO_ANSWER_MESSAGE}
+            yield {"type": "sources", "sources": []}
+            yield {"type": "done", "ttft_ms": None, "total_ms": None}
+            return
+
+        # Same document formatting as the "stuff" chain used by ask_question
+        with tracer.activate(span):
+            prompt = self.prompt_template.format(
+                context="\n\n".join(doc.page_content for doc in documents),
+                question=query,
+            )
+
+        answer_parts = []
+        ttft_ms = None
+        chunks = iter(self.llm.stream(prompt))
+        while True:
+            with tracer.activate(span):
+                chunk = next(chunks, None)
+            if chunk is None:
+                break
+            if not chunk.content:
+                continue
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - started) * 1000
+                logger.info(f"Time to first token: {ttft_ms:.0f} ms")
+                span.set("ttft_ms", round(ttft_ms, 1))
+            answer_parts.append(chunk.content)
+            yield {"type": "token", "content": chunk.content}
+
+        with tracer.activate(span):
+            source_list = self._format_sources(documents)
+        yield {"type": "sources", "sources": source_list}
+
+        total_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"Streamed answer in {total_ms:.0f} ms")
+        yield {
+            "type": "done",
+            "ttft_ms": ttft_ms,
+            "total_ms": total_ms,
+            "rerank_ms": rerank_ms,
+        }
+
+        if query_embedding is not None:
+            self.answer_cache.store(
+                query_embedding,
+                query,
+                {"answer": "".join(answer_parts), "sources": source_list},
+                total_ms / 1000,
+                generation,
+            )
 
     def interactive_mode(self):
         """Run the RAG system in interactive mode."""
@@ -327,19 +982,27 @@ Instructions:
                     print("⚠️ Question cannot be empty.")
             elif choice == "2":
                 logger.info("Loading files...")
-                file_path = input("Enter the file path (.txt or .pdf): ").strip()
-                if file_path and os.path.isfile(file_path):
+                path = input(
+                    "Enter a file or directory path (.txt, .pdf or .csv): "
+                ).strip()
+                if path and os.path.isdir(path):
+                    result = self.ingest_many(path)
+                    print(
+                        f"📄 Loaded {len(result['files_indexed'])} files "
+                        f"({result['chunks_indexed']} chunks indexed)."
+                    )
+                    for failed_path, error in result["files_failed"].items():
+                        print(f"⚠️ {failed_path}: {error}")
+                elif path and os.path.isfile(path):
                     try:
-                        self.load_documents_from_file(file_path)
+                        self.load_documents_from_file(path)
                         print("📄 Documents loaded successfully.")
                     except Exception as e:
                         logger.error(f"Error loading documents: {str(e)}")
                         print(f"⚠️ Error loading documents: {str(e)}")
                 else:
                     logger.warning("Invalid file path provided")
-                    print(
-                        "⚠️ Invalid file path. Please provide a valid .txt or .pdf file."
-                    )
+                    print("⚠️ Invalid path. Please provide a valid file or directory.")
             elif choice == "3":
                 logger.info("Exiting interactive mode")
                 print("👋 Program terminated.")
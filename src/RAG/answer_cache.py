@@ -0,0 +1,170 @@
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedAnswer:
+    vector: np.ndarray
+    query: str
+    result: Dict[str, Any]
+    created_at: float
+    latency: float
+
+
+class SemanticAnswerCache:
+    """
+    Cache of answers keyed by query embedding.
+
+    A lookup hits when a cached query lies within the cosine similarity
+    threshold of the new query. Entries expire after ttl_seconds, the least
+    recently used entry is dropped beyond max_entries, and invalidate() clears
+    everything whenever the index changes. A disabled cache never hits and
+    stores nothing.
+
+    Each invalidation starts a new generation. Callers read generation
+    before answering and pass it to store(), so an answer computed against
+    the index as it was before an invalidation is not cached after it.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        ttl_seconds: float = 3600,
+        max_entries: int = 512,
+        enabled: bool = True,
+    ):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_ids: List[int] = []
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.latency_saved = 0.0
+        self._miss_latency_total = 0.0
+        self._miss_latency_count = 0
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        expired = [k for k, e in self._entries.items() if e.created_at < cutoff]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def lookup(self, embedding: List[float]) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached result for a similar query, if any."""
+        if not self.enabled:
+            return None
+        query = self._normalize(embedding)
+        with self._lock:
+            self._expire()
+            if not self._entries:
+                self.misses += 1
+                return None
+            if self._matrix is None:
+                self._matrix_ids = list(self._entries)
+                self._matrix = np.stack([e.vector for e in self._entries.values()])
+
+            scores = self._matrix @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            key = self._matrix_ids[best]
+            entry = self._entries[key]
+            self._entries.move_to_end(key)
+            self.hits += 1
+            logger.info(
+                f"Answer cache hit (similarity {scores[best]:.4f}) "
+                f"for cached query: {entry.query}"
+            )
+            return copy.deepcopy(entry.result)
+
+    def store(
+        self,
+        embedding: List[float],
+        query: str,
+        result: Dict[str, Any],
+        latency: float,
+        generation: Optional[int] = None,
+    ) -> None:
+        """
+        Cache the result of an answered query and record its latency.
+
+        Args:
+            generation: The generation read before the query was answered;
+                the result is not cached if the cache was invalidated since
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                logger.debug(f"Not caching the answer to {query!r}: index changed")
+                return
+            self._entries[self._next_id] = CachedAnswer(
+                vector=self._normalize(embedding),
+                query=query,
+                result=copy.deepcopy(result),
+                created_at=time.time(),
+                latency=latency,
+            )
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+            self._miss_latency_total += latency
+            self._miss_latency_count += 1
+
+    def record_hit_latency(self, latency: float) -> None:
+        """Credit the latency saved by a hit against the average miss latency."""
+        with self._lock:
+            if self._miss_latency_count:
+                average_miss = self._miss_latency_total / self._miss_latency_count
+                self.latency_saved += max(0.0, average_miss - latency)
+
+    def invalidate(self) -> None:
+        """Drop every cached answer, e.g. after documents were added."""
+        with self._lock:
+            if self._entries:
+                logger.info(f"Invalidating {len(self._entries)} cached answers")
+            self._entries.clear()
+            self._matrix = None
+            self.invalidations += 1
+            self.generation += 1
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "latency_saved_seconds": self.latency_saved,
+        }
@@ -0,0 +1,192 @@
+import os
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from langchain.schema import Document
+
+from RAG.tokens import CHARS_PER_TOKEN, token_offsets
+
+# Preferred break points, best first; matches RecursiveCharacterTextSplitter
+# apart from also preferring sentence ends over plain spaces.
+DEFAULT_SEPARATORS = ("\n\n", "\n", ". ", " ")
+
+
+class Chunk:
+    """
+    A slice of a page's text, stored as offsets into the page string.
+
+    The chunk text is only materialised when page_content is read. Chunks
+    expose page_content and metadata like a LangChain Document, so they can
+    be passed wherever split documents were used.
+    """
+
+    __slots__ = ("buffer", "start", "end", "source", "page", "index")
+
+    def __init__(
+        self,
+        buffer: str,
+        start: int,
+        end: int,
+        source: Optional[str] = None,
+        page: Any = None,
+        index: int = 0,
+    ):
+        self.buffer = buffer
+        self.start = start
+        self.end = end
+        self.source = source
+        self.page = page
+        self.index = index
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def __repr__(self) -> str:
+        return (
+            f"Chunk(source={self.source!r}, page={self.page!r}, index={self.index}, "
+            f"start={self.start}, end={self.end})"
+        )
+
+    @property
+    def page_content(self) -> str:
+        return self.buffer[self.start : self.end]
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        metadata = {"source": self.source, "chunk": self.index}
+        if self.page is not None:
+            metadata["page"] = self.page
+        metadata["start"] = self.start
+        metadata["end"] = self.end
+        return metadata
+
+    def to_document(self) -> Document:
+        return Document(page_content=self.page_content, metadata=self.metadata)
+
+
+class TextChunker:
+    """
+    Single-pass splitter producing Chunk offsets lazily.
+
+    Each chunk ends at the best separator in the second half of the size
+    window (falling back to a hard cut), and the next chunk starts
+    chunk_overlap units earlier, moved forward to a word boundary. Sizes are
+    counted in characters or, with unit="tokens", in tokenizer tokens using
+    one tokenization pass per page.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 100,
+        unit: str = "chars",
+        separators: Sequence[str] = DEFAULT_SEPARATORS,
+    ):
+        if unit not in ("chars", "tokens"):
+            raise ValueError(f"Unknown chunk unit: {unit}")
+        if not 0 <= chunk_overlap < chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.unit = unit
+        self.separators = tuple(separators)
+
+    @staticmethod
+    def _skip_space(text: str, pos: int, end: int) -> int:
+        while pos < end and text[pos].isspace():
+            pos += 1
+        return pos
+
+    def _window_end(self, text: str, pos: int, offsets: Optional[List[int]]) -> int:
+        if offsets is None:
+            scale = CHARS_PER_TOKEN if self.unit == "tokens" else 1
+            return min(len(text), pos + self.chunk_size * scale)
+        token = max(bisect_right(offsets, pos) - 1, 0)
+        end_token = token + self.chunk_size
+        return offsets[end_token] if end_token < len(offsets) else len(text)
+
+    def _overlap_start(
+        self, text: str, start: int, end: int, offsets: Optional[List[int]]
+    ) -> int:
+        if not self.chunk_overlap:
+            return end
+        if offsets is None:
+            scale = CHARS_PER_TOKEN if self.unit == "tokens" else 1
+            overlap_start = end - self.chunk_overlap * scale
+        else:
+            token = bisect_left(offsets, end)
+            overlap_start = offsets[max(token - self.chunk_overlap, 0)]
+        overlap_start = max(overlap_start, start + 1)
+        # Do not start the next chunk in the middle of a word
+        boundary = text.find(" ", overlap_start, end)
+        return boundary + 1 if boundary != -1 else end
+
+    def _break(self, text: str, start: int, window_end: int) -> int:
+        lower = start + (window_end - start) // 2
+        for separator in self.separators:
+            found = text.rfind(separator, lower, window_end)
+            if found != -1:
+                return found + len(separator)
+        return window_end
+
+    def iter_chunks(
+        self,
+        text: str,
+        source: Optional[str] = None,
+        page: Any = None,
+        first_index: int = 1,
+    ) -> Iterator[Chunk]:
+        """
+        Yield the chunks of one page of text.
+
+        Args:
+            text: Page text; chunks reference it rather than copying it
+            source: Source name stored on each chunk
+            page: Page number stored on each chunk
+            first_index: Number of the first chunk
+
+        Returns:
+            Iterator[Chunk]: Chunks in text order, without surrounding whitespace
+        """
+        length = len(text)
+        offsets = token_offsets(text) if self.unit == "tokens" else None
+        index = first_index
+        start = self._skip_space(text, 0, length)
+        while start < length:
+            window_end = self._window_end(text, start, offsets)
+            end = (
+                length if window_end >= length else self._break(text, start, window_end)
+            )
+            trimmed = end
+            while trimmed > start and text[trimmed - 1].isspace():
+                trimmed -= 1
+            if trimmed > start:
+                yield Chunk(text, start, trimmed, source, page, index)
+                index += 1
+            if end >= length:
+                break
+            start = self._skip_space(
+                text, self._overlap_start(text, start, end, offsets), length
+            )
+
+    def split_documents(self, documents: Iterable[Document]) -> Iterator[Chunk]:
+        """Chunk pages lazily, numbering chunks across the whole file."""
+        index = 1
+        for document in documents:
+            for chunk in self.iter_chunks(
+                document.page_content,
+                source=document.metadata.get("source"),
+                page=document.metadata.get("page"),
+                first_index=index,
+            ):
+                index = chunk.index + 1
+                yield chunk
+
+
+def get_default_chunker() -> TextChunker:
+    """Build the chunker configured by the CHUNK_* environment variables."""
+    return TextChunker(
+        chunk_size=int(os.getenv("CHUNK_SIZE", "1000")),
+        chunk_overlap=int(os.getenv("CHUNK_OVERLAP", "100")),
+        unit=os.getenv("CHUNK_UNIT", "chars"),
+    )
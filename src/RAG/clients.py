@@ -0,0 +1,343 @@
+import atexit
+import logging
+import os
+import re
+import ssl
+import threading
+from typing import Dict, Optional, Union
+
+import httpx
+from dotenv import load_dotenv
+from openai import AsyncAzureOpenAI, AzureOpenAI
+
+from RAG.rate_limit import AdaptiveLimiter, estimate_request_tokens
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+DEFAULT_API_VERSION = "2024-12-01-preview"
+# Azure OpenAI request paths name the deployment they are sent to.
+_DEPLOYMENT_PATH = re.compile(r"/openai/deployments/([^/]+)/")
+
+
+def http2_available() -> bool:
+    """HTTP/2 needs the optional h2 package (pip install httpx[http2])."""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def parse_deployment_limits(spec: str) -> Dict[str, int]:
+    """Parse "gpt-4o=8,text-embedding-3-small=32" into per-deployment limits."""
+    limits = {}
+    for item in spec.split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip():
+            limits[name.strip()] = int(value)
+    return limits
+
+
+class DeploymentLimits:
+    """
+    Concurrency and token quotas per Azure OpenAI deployment, and the
+    AdaptiveLimiter enforcing them for each deployment.
+
+    Deployments without an explicit value get the default; 0 means no
+    concurrency bound (until the deployment returns 429) or no token bucket.
+    One instance is shared by the synchronous and asynchronous pools, so
+    both draw from the same quota.
+    """
+
+    def __init__(
+        self,
+        default: int = 0,
+        limits: Optional[Dict[str, int]] = None,
+        default_tokens_per_minute: int = 0,
+        tokens_per_minute: Optional[Dict[str, int]] = None,
+        bulk_share: float = 0.75,
+    ):
+        self.default = default
+        self.limits = limits or {}
+        self.default_tokens_per_minute = default_tokens_per_minute
+        self.tokens_per_minute = tokens_per_minute or {}
+        self.bulk_share = bulk_share
+        self._limiters: Dict[str, AdaptiveLimiter] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "DeploymentLimits":
+        return cls(
+            default=int(os.getenv("OPENAI_DEPLOYMENT_CONCURRENCY", "0")),
+            limits=parse_deployment_limits(os.getenv("OPENAI_DEPLOYMENT_LIMITS", "")),
+            default_tokens_per_minute=int(os.getenv("OPENAI_TPM", "0")),
+            tokens_per_minute=parse_deployment_limits(
+                os.getenv("OPENAI_DEPLOYMENT_TPM", "")
+            ),
+            bulk_share=float(os.getenv("OPENAI_BULK_SHARE", "0.75")),
+        )
+
+    def limiter_for(self, url: httpx.URL) -> Optional[AdaptiveLimiter]:
+        """The limiter of the deployment a request URL targets, if any."""
+        match = _DEPLOYMENT_PATH.search(url.path)
+        if match is None:
+            return None
+        deployment = match.group(1)
+        limiter = self._limiters.get(deployment)
+        if limiter is None:
+            with self._lock:
+                limiter = self._limiters.get(deployment)
+                if limiter is None:
+                    limiter = AdaptiveLimiter(
+                        deployment,
+                        max_concurrency=self.limits.get(deployment, self.default),
+                        tokens_per_minute=self.tokens_per_minute.get(
+                            deployment, self.default_tokens_per_minute
+                        ),
+                        bulk_share=self.bulk_share,
+                    )
+                    self._limiters[deployment] = limiter
+        return limiter
+
+    @property
+    def stats(self) -> Dict[str, Dict]:
+        return {name: limiter.stats for name, limiter in self._limiters.items()}
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Response body that releases its deployment slot once closed."""
+
+    def __init__(self, stream: httpx.SyncByteStream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            if self._release is not None:
+                self._release()
+                self._release = None
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._release is not None:
+                self._release()
+                self._release = None
+
+
+def _request_tokens(limiter: AdaptiveLimiter, request: httpx.Request) -> int:
+    if not limiter.tokens_per_minute:
+        return 0
+    return estimate_request_tokens(request.content)
+
+
+class DeploymentLimitedTransport(httpx.BaseTransport):
+    """
+    Transport admitting requests through their deployment's AdaptiveLimiter,
+    in the priority of the calling context (see request_priority). A slot is
+    held from sending a request until its response is closed, so streamed
+    completions count for their whole duration.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport, limits: DeploymentLimits):
+        self._transport = transport
+        self._limits = limits
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        limiter = self._limits.limiter_for(request.url)
+        if limiter is None:
+            return self._transport.handle_request(request)
+        limiter.acquire(_request_tokens(limiter, request))
+        try:
+            response = self._transport.handle_request(request)
+        except BaseException:
+            limiter.release()
+            raise
+        limiter.on_response(response.status_code, response.headers)
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, limiter.release),
+            extensions=response.extensions,
+        )
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class AsyncDeploymentLimitedTransport(httpx.AsyncBaseTransport):
+    """
+    Asynchronous DeploymentLimitedTransport. Requests wait for admission in
+    the event loop, so a cancelled request never takes a slot.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, limits: DeploymentLimits):
+        self._transport = transport
+        self._limits = limits
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        limiter = self._limits.limiter_for(request.url)
+        if limiter is None:
+            return await self._transport.handle_async_request(request)
+        await limiter.acquire_async(_request_tokens(limiter, request))
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            limiter.release()
+            raise
+        limiter.on_response(response.status_code, response.headers)
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_AsyncReleasingStream(response.stream, limiter.release),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def _pool_settings(verify) -> dict:
+    http2 = os.getenv("OPENAI_HTTP2", "auto").lower()
+    if isinstance(verify, str):
+        verify = ssl.create_default_context(cafile=verify)
+    return {
+        "verify": verify,
+        "limits": httpx.Limits(
+            max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("OPENAI_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "60")),
+        ),
+        "http2": http2_available() if http2 == "auto" else http2 == "true",
+    }
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        float(os.getenv("OPENAI_TIMEOUT", "60")),
+        connect=float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5")),
+    )
+
+
+def create_http_client(
+    limits: Optional[DeploymentLimits] = None, verify: Union[bool, str] = True
+) -> httpx.Client:
+    """
+    Build an httpx client with a tuned keep-alive pool, HTTP/2 when h2 is
+    installed, and per-deployment rate limiting.
+
+    Args:
+        limits: Deployment quotas, by default the process-wide ones
+        verify: TLS verification, or the path of a CA bundle
+
+    Returns:
+        httpx.Client: A client to pass as http_client to OpenAI clients
+    """
+    transport = DeploymentLimitedTransport(
+        httpx.HTTPTransport(**_pool_settings(verify)),
+        limits or get_deployment_limits(),
+    )
+    return httpx.Client(transport=transport, timeout=_timeout())
+
+
+def create_async_http_client(
+    limits: Optional[DeploymentLimits] = None, verify: Union[bool, str] = True
+) -> httpx.AsyncClient:
+    transport = AsyncDeploymentLimitedTransport(
+        httpx.AsyncHTTPTransport(**_pool_settings(verify)),
+        limits or get_deployment_limits(),
+    )
+    return httpx.AsyncClient(transport=transport, timeout=_timeout())
+
+
+_clients: Dict[str, object] = {}
+_clients_lock = threading.RLock()
+
+
+def _shared(name: str, factory):
+    """Return the process-wide client called name, building it on first use."""
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = factory()
+                _clients[name] = client
+                logger.debug(f"Created shared {name} client")
+    return client
+
+
+def get_deployment_limits() -> DeploymentLimits:
+    """The deployment quotas shared by every pool, from the environment."""
+    return _shared("limits", DeploymentLimits.from_env)
+
+
+def get_http_client() -> httpx.Client:
+    """The connection pool shared by every synchronous Azure OpenAI client."""
+    return _shared("http", create_http_client)
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """The connection pool shared by every asynchronous Azure OpenAI client."""
+    return _shared("async_http", create_async_http_client)
+
+
+def get_openai_client() -> AzureOpenAI:
+    """
+    Return the process-wide AzureOpenAI client, configured from
+    OPEN_AI_ENDPOINT, API_OPEN_AI_KEY and OPENAI_API_VERSION.
+    """
+    return _shared(
+        "openai",
+        lambda: AzureOpenAI(
+            api_version=os.getenv("OPENAI_API_VERSION", DEFAULT_API_VERSION),
+            azure_endpoint=os.getenv("OPEN_AI_ENDPOINT"),
+            api_key=os.getenv("API_OPEN_AI_KEY"),
+            http_client=get_http_client(),
+        ),
+    )
+
+
+def get_async_openai_client() -> AsyncAzureOpenAI:
+    return _shared(
+        "async_openai",
+        lambda: AsyncAzureOpenAI(
+            api_version=os.getenv("OPENAI_API_VERSION", DEFAULT_API_VERSION),
+            azure_endpoint=os.getenv("OPEN_AI_ENDPOINT"),
+            api_key=os.getenv("API_OPEN_AI_KEY"),
+            http_client=get_async_http_client(),
+        ),
+    )
+
+
+def close_clients() -> None:
+    """
+    Close the shared synchronous pool. The asynchronous pool is left to its
+    event loop, which may no longer be running at exit.
+    """
+    with _clients_lock:
+        http_client = _clients.pop("http", None)
+        _clients.pop("openai", None)
+    if http_client is not None:
+        http_client.close()
+
+
+atexit.register(close_clients)
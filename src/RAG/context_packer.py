@@ -0,0 +1,266 @@
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+from RAG.tokens import count_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+# Matches the default chunk_overlap of the ingestion chunker.
+DEFAULT_CHUNK_OVERLAP = 100
+# Shortest shared prefix accepted as a real overlap between adjacent chunks.
+MIN_OVERLAP = 16
+
+
+@dataclass
+class Passage:
+    """One retrieved chunk, in relevance order, with its position in the source."""
+
+    text: str
+    source: str = ""
+    page: Any = None
+    chunk: Optional[int] = None
+    start: Optional[int] = None
+    end: Optional[int] = None
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_fields(cls, text: str, metadata: Dict[str, Any]) -> "Passage":
+        """
+        Build a passage from a search result or LangChain document metadata,
+        reading source file, page, chunk number and page offsets from
+        meta_json_string when present.
+        """
+        page = metadata.get("page")
+        chunk = metadata.get("chunk")
+        start = metadata.get("start")
+        end = metadata.get("end")
+        try:
+            meta = json.loads(metadata.get("meta_json_string") or "{}")
+        except (TypeError, json.JSONDecodeError):
+            meta = {}
+        if not isinstance(meta, dict):
+            meta = {}
+        page = meta.get("page", page)
+        chunk = meta.get("chunk", chunk)
+        start = meta.get("start", start)
+        end = meta.get("end", end)
+        # Titles are file names and may repeat across folders, so they do
+        # not identify the source.
+        source = (
+            metadata.get("filepath")
+            or metadata.get("source")
+            or meta.get("filepath")
+            or ""
+        )
+        return cls(
+            text=text,
+            source=source,
+            page=page,
+            chunk=chunk if isinstance(chunk, int) else None,
+            start=start if isinstance(start, int) else None,
+            end=end if isinstance(end, int) else None,
+            metadata=metadata,
+        )
+
+
+@dataclass
+class PackedPassage:
+    text: str
+    source: str
+    page: Any
+    chunks: List[Optional[int]]
+    tokens: int
+    metadata: Dict[str, Any]
+
+
+@dataclass
+class PackedContext:
+    passages: List[PackedPassage]
+    tokens: int
+    tokens_before: int
+    merged: int
+    dropped: int
+    truncated: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.tokens_before - self.tokens)
+
+    def summary(self) -> str:
+        return (
+            f"Packed context into {self.tokens} tokens "
+            f"({self.tokens_saved} saved of {self.tokens_before}): "
+            f"{len(self.passages)} passages, {self.merged} chunks merged, "
+            f"{self.dropped} dropped, {self.truncated} truncated"
+        )
+
+
+def trim_overlap(previous: str, following: str, max_overlap: int) -> str:
+    """
+    Remove from `following` the text it repeats from the end of `previous`.
+    """
+    window = previous[-(max_overlap + MIN_OVERLAP) :]
+    for length in range(min(len(window), len(following)), MIN_OVERLAP - 1, -1):
+        if window.endswith(following[:length]):
+            return following[length:].lstrip()
+    return following
+
+
+def continuation(previous: Passage, following: Passage, max_overlap: int) -> str:
+    """
+    Text of `following` not already contained in the preceding chunk.
+
+    Uses the chunks' page offsets when both are known, otherwise matches
+    the repeated text.
+    """
+    if (
+        previous.end is not None
+        and following.start is not None
+        and following.end is not None
+        and following.start <= previous.end <= following.end
+    ):
+        return following.text[previous.end - following.start :].lstrip()
+    return trim_overlap(previous.text, following.text, max_overlap)
+
+
+class ContextPacker:
+    """
+    Fit retrieved chunks into a token budget for the prompt.
+
+    Chunks are taken greedily in relevance order while they fit. A chunk that
+    follows an already selected chunk of the same page only costs the tokens
+    left after removing the splitter overlap, and consecutive selected chunks
+    are merged into one passage. The first chunk that does not fit is
+    truncated if at least min_partial_tokens remain; smaller chunks further
+    down may still fill the rest. Chunks whose source file is unknown are
+    neither merged nor deduplicated.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 3000,
+        chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+        min_partial_tokens: int = 100,
+        separator: str = "\n\n",
+    ):
+        self.max_tokens = max_tokens
+        self.chunk_overlap = chunk_overlap
+        self.min_partial_tokens = min_partial_tokens
+        self.separator = separator
+
+    @staticmethod
+    def _key(passage: Passage, offset: int = 0) -> Optional[tuple]:
+        """Position of the chunk in its source; None when that is unknown."""
+        if passage.chunk is None or not passage.source:
+            return None
+        return (passage.source, passage.page, passage.chunk + offset)
+
+    def _merge(
+        self, selected: List[Passage], truncated: Dict[int, str]
+    ) -> List[PackedPassage]:
+        """Join runs of consecutive chunks, ordered by their best member."""
+        position = {
+            self._key(p): i for i, p in enumerate(selected) if self._key(p) is not None
+        }
+        runs: Dict[int, List[int]] = {}
+        for i, passage in enumerate(selected):
+            start = i
+            if i not in truncated:
+                # Walk back to the first chunk of the run; truncated chunks
+                # are never merged because their tail is missing.
+                while True:
+                    before = position.get(self._key(selected[start], -1))
+                    if before is None or before in truncated:
+                        break
+                    start = before
+            runs.setdefault(start, []).append(i)
+
+        merged = []
+        for members in sorted(runs.values(), key=min):
+            ordered = sorted(members, key=lambda i: selected[i].chunk or 0)
+            text = truncated.get(ordered[0], selected[ordered[0]].text)
+            for prev, current in zip(ordered, ordered[1:]):
+                text += " " + continuation(
+                    selected[prev], selected[current], self.chunk_overlap
+                )
+            best = selected[min(members)]
+            merged.append(
+                PackedPassage(
+                    text=text,
+                    source=best.source,
+                    page=best.page,
+                    chunks=[selected[i].chunk for i in ordered],
+                    tokens=count_tokens(text),
+                    metadata=best.metadata,
+                )
+            )
+        return merged
+
+    def pack(self, passages: Sequence[Passage]) -> PackedContext:
+        """
+        Pack passages given in relevance order.
+
+        Returns:
+            PackedContext: Passages to put in the prompt, in relevance order,
+            with token accounting against the unpacked concatenation
+        """
+        separator_tokens = count_tokens(self.separator)
+        tokens_before = sum(count_tokens(p.text) for p in passages) + (
+            separator_tokens * max(0, len(passages) - 1)
+        )
+
+        selected: List[Passage] = []
+        selected_keys: Dict[tuple, Passage] = {}
+        truncated: Dict[int, str] = {}
+        used = 0
+        dropped = 0
+        for passage in passages:
+            key = self._key(passage)
+            if key is not None and key in selected_keys:
+                dropped += 1
+                continue
+            previous = selected_keys.get(self._key(passage, -1))
+            if previous is not None:
+                text = continuation(previous, passage, self.chunk_overlap)
+                cost = count_tokens(text)
+            else:
+                cost = count_tokens(passage.text)
+                cost += separator_tokens if selected else 0
+
+            if used + cost <= self.max_tokens:
+                used += cost
+            else:
+                remaining = self.max_tokens - used
+                remaining -= separator_tokens if selected else 0
+                if truncated or remaining < self.min_partial_tokens:
+                    dropped += 1
+                    continue
+                truncated[len(selected)] = truncate_to_tokens(passage.text, remaining)
+                used = self.max_tokens
+            if key is not None and len(selected) not in truncated:
+                selected_keys[key] = passage
+            selected.append(passage)
+
+        packed_passages = self._merge(selected, truncated)
+        packed = PackedContext(
+            passages=packed_passages,
+            tokens=sum(p.tokens for p in packed_passages)
+            + separator_tokens * max(0, len(packed_passages) - 1),
+            tokens_before=tokens_before,
+            merged=len(selected) - len(packed_passages),
+            dropped=dropped,
+            truncated=len(truncated),
+        )
+        logger.info(packed.summary())
+        return packed
+
+
+def get_default_packer() -> ContextPacker:
+    """Build the packer configured by the CONTEXT_* environment variables."""
+    return ContextPacker(
+        max_tokens=int(os.getenv("CONTEXT_MAX_TOKENS", "3000")),
+        chunk_overlap=int(os.getenv("CONTEXT_CHUNK_OVERLAP", DEFAULT_CHUNK_OVERLAP)),
+    )
@@ -0,0 +1,265 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence
+
+from RAG.tracing import get_tracer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = ".cache/embeddings.sqlite"
+
+EmbedFn = Callable[[List[str]], List[List[float]]]
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different inputs share a cache entry."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(model: str, text: str) -> str:
+    """Content address of an embedding: hash of the model and normalized text."""
+    payload = f"{model}\x00{normalize_text(text)}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache keyed by (model, hash of normalized text).
+
+    Lookups go through an in-memory LRU tier first and a SQLite store second.
+    The SQLite store is evicted least-recently-used first once it grows past
+    max_disk_bytes.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        max_memory_items: int = 10000,
+        max_disk_bytes: int = 512 * 1024 * 1024,
+    ):
+        self.path = path
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                nbytes INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_access "
+            "ON embeddings(last_access)"
+        )
+        self._conn.commit()
+        row = self._conn.execute(
+            "SELECT COALESCE(SUM(nbytes), 0) FROM embeddings"
+        ).fetchone()
+        self._disk_bytes = row[0]
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Return cached embeddings for texts, with None for every miss."""
+        keys = [cache_key(model, text) for text in texts]
+        found: Dict[str, List[float]] = {}
+        from_disk = set()
+        now = time.time()
+        with self._lock:
+            disk_keys = []
+            for key in keys:
+                if key in found:
+                    continue
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                else:
+                    disk_keys.append(key)
+
+            for start in range(0, len(disk_keys), 500):
+                page = disk_keys[start : start + 500]
+                rows = self._conn.execute(
+                    "SELECT key, vector FROM embeddings WHERE key IN (%s)"
+                    % ",".join("?" * len(page)),
+                    page,
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+                    from_disk.add(key)
+                    self._remember(key, found[key])
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                        [(now, key) for key, _ in rows],
+                    )
+            if disk_keys:
+                self._conn.commit()
+
+            results = []
+            for key in keys:
+                if key not in found:
+                    self.misses += 1
+                elif key in from_disk:
+                    self.disk_hits += 1
+                else:
+                    self.memory_hits += 1
+                results.append(found.get(key))
+        return results
+
+    def put_many(
+        self, model: str, texts: Sequence[str], vectors: Sequence[List[float]]
+    ) -> None:
+        """Store embeddings for texts in both tiers."""
+        if not texts:
+            return
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = cache_key(model, text)
+                blob = array("f", vector).tobytes()
+                self._remember(key, list(vector))
+                rows.append((key, model, blob, len(blob), now))
+            existing = self._conn.execute(
+                "SELECT COALESCE(SUM(nbytes), 0) FROM embeddings WHERE key IN (%s)"
+                % ",".join("?" * len(rows)),
+                [row[0] for row in rows],
+            ).fetchone()[0]
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self._disk_bytes += sum(row[3] for row in rows) - existing
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Drop least recently used rows until the store is at 90% of its limit."""
+        target = int(self.max_disk_bytes * 0.9)
+        evicted = 0
+        while self._disk_bytes > target:
+            rows = self._conn.execute(
+                "SELECT key, nbytes FROM embeddings ORDER BY last_access LIMIT 500"
+            ).fetchall()
+            if not rows:
+                break
+            for key, nbytes in rows:
+                if self._disk_bytes <= target:
+                    break
+                self._conn.execute("DELETE FROM embeddings WHERE key = ?", (key,))
+                self._memory.pop(key, None)
+                self._disk_bytes -= nbytes
+                evicted += 1
+        logger.info(f"Evicted {evicted} embeddings from {self.path}")
+
+    def embed(
+        self, model: str, texts: Sequence[str], embed_fn: EmbedFn
+    ) -> List[List[float]]:
+        """
+        Return embeddings for texts, calling embed_fn only for cache misses.
+
+        Duplicate texts within one call are embedded once.
+        """
+        with get_tracer().span("embed", texts=len(texts)) as span:
+            cached = self.get_many(model, texts)
+            missing: Dict[str, str] = {}
+            for text, vector in zip(texts, cached):
+                if vector is None:
+                    missing.setdefault(cache_key(model, text), text)
+            span.set("cache_hits", sum(vector is not None for vector in cached))
+            span.set("cache_misses", len(missing))
+
+            if missing:
+                missing_texts = list(missing.values())
+                vectors = embed_fn(missing_texts)
+                self.put_many(model, missing_texts, vectors)
+                computed = dict(zip(missing.keys(), vectors))
+                cached = [
+                    vector if vector is not None else computed[cache_key(model, text)]
+                    for text, vector in zip(texts, cached)
+                ]
+            return cached
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_items": len(self._memory),
+            "disk_bytes": self._disk_bytes,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings:
+    """
+    Wrap a LangChain embeddings object so that embed_query and embed_documents
+    are served from an EmbeddingCache.
+    """
+
+    def __init__(self, embeddings, model: str, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.model = model
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.cache.embed(self.model, texts, self.embeddings.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.cache.embed(
+            self.model, [text], lambda texts: [self.embeddings.embed_query(texts[0])]
+        )[0]
+
+
+_default_cache: Optional[EmbeddingCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> EmbeddingCache:
+    """Return the process-wide cache shared by ai_search and RAGSystem."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = EmbeddingCache(
+                path=os.getenv("EMBEDDING_CACHE_PATH", DEFAULT_CACHE_PATH),
+                max_disk_bytes=int(
+                    os.getenv("EMBEDDING_CACHE_MAX_BYTES", 512 * 1024 * 1024)
+                ),
+            )
+        return _default_cache
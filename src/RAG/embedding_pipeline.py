@@ -0,0 +1,298 @@
+import contextvars
+import logging
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from RAG.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+EmbedBatchFn = Callable[[List[str]], List[List[float]]]
+UploadFn = Callable[[List[Dict[str, Any]]], Any]
+
+
+@dataclass
+class FailedBatch:
+    """A batch of chunks that could not be embedded or uploaded."""
+
+    stage: str
+    batch_index: int
+    chunk_ids: List[str]
+    error: str
+
+
+@dataclass
+class IngestionReport:
+    """Summary of a single ingestion run."""
+
+    chunks_total: int = 0
+    chunks_embedded: int = 0
+    chunks_indexed: int = 0
+    batches_total: int = 0
+    failed_batches: List[FailedBatch] = field(default_factory=list)
+    elapsed_seconds: float = 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        if self.elapsed_seconds <= 0:
+            return 0.0
+        return self.chunks_indexed / self.elapsed_seconds
+
+    def summary(self) -> str:
+        return (
+            f"{self.chunks_indexed}/{self.chunks_total} chunks indexed in "
+            f"{self.elapsed_seconds:.2f}s ({self.chunks_per_second:.1f} chunks/s), "
+            f"{self.batches_total} embedding batches, "
+            f"{len(self.failed_batches)} failed"
+        )
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    """Extract an HTTP status code from OpenAI, Azure or httpx exceptions."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Read the Retry-After header from the error response, if present."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for name in ("retry-after-ms", "Retry-After-Ms"):
+        if name in headers:
+            try:
+                return float(headers[name]) / 1000
+            except (TypeError, ValueError):
+                pass
+    for name in ("retry-after", "Retry-After"):
+        if name in headers:
+            try:
+                return float(headers[name])
+            except (TypeError, ValueError):
+                pass
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Return True for throttling (429) and transient server errors."""
+    status = _status_code(error)
+    if status is None:
+        return False
+    return status == 429 or status >= 500
+
+
+def batch_by_tokens(
+    chunks: Iterable[Dict[str, Any]],
+    max_batch_tokens: int,
+    max_batch_size: int,
+    text_field: str = "content",
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Group chunks into batches bounded by both token count and number of inputs.
+
+    A single chunk larger than max_batch_tokens is emitted as its own batch.
+    """
+    batch: List[Dict[str, Any]] = []
+    batch_tokens = 0
+    for chunk in chunks:
+        tokens = count_tokens(chunk[text_field])
+        if batch and (
+            batch_tokens + tokens > max_batch_tokens or len(batch) >= max_batch_size
+        ):
+            yield batch
+            batch = []
+            batch_tokens = 0
+        batch.append(chunk)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+class EmbeddingPipeline:
+    """
+    Embed chunks in token-bounded batches on a bounded worker pool and
+    bulk-upload the resulting vectors to the search index in pages.
+    """
+
+    def __init__(
+        self,
+        embed_batch: EmbedBatchFn,
+        upload_documents: UploadFn,
+        vector_field: str = "contentVector",
+        text_field: str = "content",
+        max_batch_tokens: int = 8000,
+        max_batch_size: int = 64,
+        max_workers: int = 4,
+        upload_page_size: int = 250,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+    ):
+        self.embed_batch = embed_batch
+        self.upload_documents = upload_documents
+        self.vector_field = vector_field
+        self.text_field = text_field
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_workers = max_workers
+        self.upload_page_size = upload_page_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def _call_with_retry(self, fn: Callable, *args):
+        """Call fn, retrying with exponential backoff on 429 and 5xx errors."""
+        attempt = 0
+        while True:
+            try:
+                return fn(*args)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = min(self.backoff_max, self.backoff_base * 2**attempt)
+                    delay += random.uniform(0, delay / 2)
+                attempt += 1
+                logger.warning(
+                    f"Retryable error ({_status_code(e)}), attempt {attempt}/"
+                    f"{self.max_retries}, sleeping {delay:.2f}s"
+                )
+                time.sleep(delay)
+
+    def _embed(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        vectors = self._call_with_retry(
+            self.embed_batch, [chunk[self.text_field] for chunk in batch]
+        )
+        if len(vectors) != len(batch):
+            raise ValueError(
+                f"Expected {len(batch)} embeddings, received {len(vectors)}"
+            )
+        return [
+            {**chunk, self.vector_field: list(vector)}
+            for chunk, vector in zip(batch, vectors)
+        ]
+
+    def _upload(
+        self, page: List[Dict[str, Any]], page_index: int, report: IngestionReport
+    ) -> None:
+        try:
+            results = self._call_with_retry(self.upload_documents, page)
+        except Exception as e:
+            logger.error(f"Failed to upload page {page_index}: {e}")
+            report.failed_batches.append(
+                FailedBatch("upload", page_index, [doc["id"] for doc in page], str(e))
+            )
+            return
+
+        failed_ids = [
+            getattr(result, "key", None)
+            for result in results or []
+            if not getattr(result, "succeeded", True)
+        ]
+        report.chunks_indexed += len(page) - len(failed_ids)
+        if failed_ids:
+            report.failed_batches.append(
+                FailedBatch(
+                    "upload",
+                    page_index,
+                    failed_ids,
+                    f"{len(failed_ids)} documents rejected by the index",
+                )
+            )
+
+    def run(
+        self,
+        chunks: Iterable[Dict[str, Any]],
+        on_progress: Optional[Callable[[IngestionReport], None]] = None,
+    ) -> IngestionReport:
+        """
+        Embed and upload the given chunks.
+
+        Args:
+            chunks: Index documents, each with an 'id' and a text field.
+                The iterable is consumed lazily, so generators are fine.
+            on_progress: Optional callback invoked with the running report
+                after every embedded batch and uploaded page.
+
+        Returns:
+            IngestionReport: Throughput and failed batches for this run.
+        """
+        report = IngestionReport()
+        started = time.perf_counter()
+        pending_upload: List[Dict[str, Any]] = []
+        page_index = 0
+        max_in_flight = self.max_workers * 2
+
+        def collect(done) -> None:
+            nonlocal page_index
+            for future in done:
+                batch_index, batch = in_flight.pop(future)
+                try:
+                    embedded = future.result()
+                except Exception as e:
+                    logger.error(f"Failed to embed batch {batch_index}: {e}")
+                    report.failed_batches.append(
+                        FailedBatch(
+                            "embed",
+                            batch_index,
+                            [chunk["id"] for chunk in batch],
+                            str(e),
+                        )
+                    )
+                    continue
+                report.chunks_embedded += len(embedded)
+                pending_upload.extend(embedded)
+                while len(pending_upload) >= self.upload_page_size:
+                    page = pending_upload[: self.upload_page_size]
+                    del pending_upload[: self.upload_page_size]
+                    self._upload(page, page_index, report)
+                    page_index += 1
+                if on_progress:
+                    on_progress(report)
+
+        def counted(items: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+            for item in items:
+                report.chunks_total += 1
+                yield item
+
+        in_flight: Dict[Any, Any] = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            batches = batch_by_tokens(
+                counted(chunks),
+                self.max_batch_tokens,
+                self.max_batch_size,
+                self.text_field,
+            )
+            for batch_index, batch in enumerate(batches):
+                report.batches_total += 1
+                # Workers run in the caller's context, e.g. its request priority
+                future = executor.submit(
+                    contextvars.copy_context().run, self._embed, batch
+                )
+                in_flight[future] = (batch_index, batch)
+                if len(in_flight) >= max_in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+
+        if pending_upload:
+            self._upload(pending_upload, page_index, report)
+            if on_progress:
+                on_progress(report)
+
+        report.elapsed_seconds = time.perf_counter() - started
+        logger.info(f"Ingestion finished: {report.summary()}")
+        for failed in report.failed_batches:
+            logger.warning(
+                f"Failed {failed.stage} batch {failed.batch_index} "
+                f"({len(failed.chunk_ids)} chunks): {failed.error}"
+            )
+        return report
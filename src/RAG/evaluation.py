@@ -0,0 +1,314 @@
+import csv
+import json
+import logging
+import math
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from RAG.clients import get_openai_client
+from RAG.lexical_index import tokenize
+from RAG.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATASET_PATH = "data/travel_evaluation_data.csv"
+# USD per 1k tokens; defaults are gpt-4o list prices.
+PROMPT_PRICE_PER_1K = float(os.getenv("EVAL_PROMPT_PRICE_PER_1K", "0.0025"))
+COMPLETION_PRICE_PER_1K = float(os.getenv("EVAL_COMPLETION_PRICE_PER_1K", "0.01"))
+
+# Summary metrics compared against a baseline, and whether higher is better.
+GATED_METRICS = {
+    "token_f1": True,
+    "similarity": True,
+    "retrieval_recall": True,
+    "latency_p50_ms": False,
+    "latency_p95_ms": False,
+    "cost_per_question": False,
+}
+
+
+@dataclass
+class EvalCase:
+    question: str
+    expected: str
+
+
+@dataclass
+class TargetResult:
+    """What a target returns for one question."""
+
+    answer: str
+    contexts: List[str]
+    prompt_tokens: int
+    completion_tokens: int
+
+
+@dataclass
+class CaseResult:
+    question: str
+    answer: str = ""
+    token_f1: float = 0.0
+    similarity: float = 0.0
+    retrieval_recall: float = 0.0
+    latency_ms: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost: float = 0.0
+    error: Optional[str] = None
+
+
+@dataclass
+class EvalReport:
+    target: str
+    dataset: str
+    cases: List[CaseResult]
+    config: Dict[str, Any] = field(default_factory=dict)
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+
+    @property
+    def summary(self) -> Dict[str, float]:
+        scored = [c for c in self.cases if c.error is None]
+        latencies = [c.latency_ms for c in scored]
+
+        def mean(values: Sequence[float]) -> float:
+            return float(np.mean(values)) if values else 0.0
+
+        return {
+            "questions": len(self.cases),
+            "errors": len(self.cases) - len(scored),
+            "token_f1": mean([c.token_f1 for c in scored]),
+            "similarity": mean([c.similarity for c in scored]),
+            "retrieval_recall": mean([c.retrieval_recall for c in scored]),
+            "latency_p50_ms": float(np.percentile(latencies, 50)) if latencies else 0.0,
+            "latency_p95_ms": float(np.percentile(latencies, 95)) if latencies else 0.0,
+            "prompt_tokens": mean([c.prompt_tokens for c in scored]),
+            "completion_tokens": mean([c.completion_tokens for c in scored]),
+            "cost_per_question": mean([c.cost for c in scored]),
+            "total_cost": sum(c.cost for c in scored),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "created_at": self.created_at,
+            "target": self.target,
+            "dataset": self.dataset,
+            "config": self.config,
+            "summary": self.summary,
+            "cases": [asdict(c) for c in self.cases],
+        }
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+
+
+def load_dataset(path: str = DEFAULT_DATASET_PATH) -> List[EvalCase]:
+    """Read (Question, ExpectedResponse) rows from the evaluation CSV."""
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        return [
+            EvalCase(row["Question"].strip(), row["ExpectedResponse"].strip())
+            for row in csv.DictReader(f)
+            if row.get("Question", "").strip()
+        ]
+
+
+def token_f1(prediction: str, reference: str) -> float:
+    """F1 over stemmed, stopword-free terms, as in SQuAD-style scoring."""
+    predicted, expected = Counter(tokenize(prediction)), Counter(tokenize(reference))
+    common = sum((predicted & expected).values())
+    if not common:
+        return 0.0
+    precision = common / sum(predicted.values())
+    recall = common / sum(expected.values())
+    return 2 * precision * recall / (precision + recall)
+
+
+def cosine_similarity(a: Sequence[float], b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def retrieval_recall(expected: str, contexts: Sequence[str]) -> float:
+    """
+    Share of the expected answer's distinct terms present in the retrieved
+    context. The dataset has no gold passages, so term coverage stands in
+    for passage recall.
+    """
+    expected_terms = set(tokenize(expected))
+    if not expected_terms:
+        return 0.0
+    retrieved = set()
+    for context in contexts:
+        retrieved.update(tokenize(context))
+    return len(expected_terms & retrieved) / len(expected_terms)
+
+
+def estimate_cost(prompt_tokens: int, completion_tokens: int) -> float:
+    return (
+        prompt_tokens * PROMPT_PRICE_PER_1K
+        + completion_tokens * COMPLETION_PRICE_PER_1K
+    ) / 1000
+
+
+def langchain_target(rag_system) -> Callable[[str], TargetResult]:
+    """
+    Target answering through RAGSystem.ask_question. The contexts for recall
+    are the source documents the chain answered from, and tokens are counted
+    on the "stuff" prompt built from them.
+
+    Build rag_system with ANSWER_CACHE_ENABLED=0: cached answers would skip
+    retrieval and generation and distort every metric.
+    """
+    if rag_system.answer_cache.enabled:
+        logger.warning(
+            "The answer cache is enabled; repeated questions will be answered "
+            "from it"
+        )
+
+    def answer(question: str) -> TargetResult:
+        result = rag_system.ask_question(question, include_contexts=True)
+        contexts = result["contexts"]
+        prompt = rag_system.prompt_template.format(
+            context="\n\n".join(contexts), question=question
+        )
+        return TargetResult(
+            answer=result["answer"],
+            contexts=contexts,
+            prompt_tokens=count_tokens(prompt),
+            completion_tokens=count_tokens(result["answer"]),
+        )
+
+    return answer
+
+
+def direct_target(top_k: int = 5) -> Callable[[str], TargetResult]:
+    """
+    Target running the ai_search pipeline of answer_question_with_sources
+    (search, rerank, packed prompt, completion) without its printing and
+    notebook logging, taking token usage from the completion response.
+    """
+    from RAG import ai_search
+
+    def answer(question: str) -> TargetResult:
+        documents = ai_search.search_documents(query=question, top_k=top_k)
+        prompt = ai_search.build_prompt(documents, question)
+        response = get_openai_client().chat.completions.create(
+            model=ai_search.DEPLOYMENT,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.7,
+        )
+        text = response.choices[0].message.content.strip()
+        usage = getattr(response, "usage", None)
+        return TargetResult(
+            answer=text,
+            contexts=[doc["content"] for doc in documents],
+            prompt_tokens=getattr(usage, "prompt_tokens", None) or count_tokens(prompt),
+            completion_tokens=getattr(usage, "completion_tokens", None)
+            or count_tokens(text),
+        )
+
+    return answer
+
+
+def _evaluate_case(
+    case: EvalCase,
+    target: Callable[[str], TargetResult],
+    embed: Callable[[List[str]], List[List[float]]],
+) -> CaseResult:
+    started = time.perf_counter()
+    try:
+        result = target(case.question)
+    except Exception as e:
+        logger.error(f"Evaluation of {case.question!r} failed: {e}")
+        return CaseResult(question=case.question, error=str(e))
+    latency_ms = (time.perf_counter() - started) * 1000
+
+    try:
+        answer_vector, expected_vector = embed([result.answer, case.expected])
+        similarity = cosine_similarity(answer_vector, expected_vector)
+    except Exception as e:
+        logger.warning(f"Could not embed answers for similarity: {e}")
+        similarity = 0.0
+    return CaseResult(
+        question=case.question,
+        answer=result.answer,
+        token_f1=token_f1(result.answer, case.expected),
+        similarity=similarity,
+        retrieval_recall=retrieval_recall(case.expected, result.contexts),
+        latency_ms=latency_ms,
+        prompt_tokens=result.prompt_tokens,
+        completion_tokens=result.completion_tokens,
+        cost=estimate_cost(result.prompt_tokens, result.completion_tokens),
+    )
+
+
+def run_evaluation(
+    cases: Sequence[EvalCase],
+    target: Callable[[str], TargetResult],
+    embed: Callable[[List[str]], List[List[float]]],
+    target_name: str,
+    dataset: str = DEFAULT_DATASET_PATH,
+    concurrency: int = 4,
+    config: Optional[Dict[str, Any]] = None,
+) -> EvalReport:
+    """
+    Answer every case with the target in parallel and score the answers.
+
+    Args:
+        cases: Questions with expected answers
+        target: Answers one question, e.g. langchain_target(rag_system)
+        embed: Embeds texts for the answer similarity metric
+        target_name: Name of the target recorded in the report
+        dataset: Dataset path recorded in the report
+        concurrency: Questions evaluated at the same time
+        config: Settings recorded in the report, for comparing runs
+
+    Returns:
+        EvalReport: Per-question results and their summary
+    """
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        results = list(
+            executor.map(lambda case: _evaluate_case(case, target, embed), cases)
+        )
+    report = EvalReport(
+        target=target_name, dataset=dataset, cases=results, config=config or {}
+    )
+    logger.info(f"Evaluation summary: {json.dumps(report.summary)}")
+    return report
+
+
+def compare_reports(
+    current: Dict[str, Any],
+    baseline: Dict[str, Any],
+    max_quality_drop: float = 0.02,
+    max_slowdown: float = 0.2,
+) -> List[str]:
+    """
+    List regressions of a report against a baseline report (both as dicts).
+
+    Quality metrics may drop by at most max_quality_drop (absolute); latency
+    and cost may grow by at most max_slowdown (relative).
+    """
+    regressions = []
+    for metric, higher_is_better in GATED_METRICS.items():
+        now = current["summary"].get(metric, 0.0)
+        before = baseline["summary"].get(metric, 0.0)
+        if higher_is_better and now < before - max_quality_drop:
+            regressions.append(f"{metric} dropped from {before:.4f} to {now:.4f}")
+        elif not higher_is_better and before and now > before * (1 + max_slowdown):
+            regressions.append(f"{metric} grew from {before:.4f} to {now:.4f}")
+    if current["summary"].get("errors", 0) > baseline["summary"].get("errors", 0):
+        regressions.append(
+            f"errors grew from {baseline['summary'].get('errors', 0)} "
+            f"to {current['summary']['errors']}"
+        )
+    return regressions
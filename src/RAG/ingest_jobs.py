@@ -0,0 +1,239 @@
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterable, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOBS_PATH = ".cache/ingest_jobs.sqlite"
+
+ProgressFn = Callable[[Dict[str, int]], None]
+RunJobFn = Callable[[str, str, ProgressFn], Any]
+
+PROGRESS_FIELDS = ("pages_parsed", "chunks_embedded", "chunks_indexed")
+# Bytes read from a file-like upload per write to the spool file.
+SPOOL_BLOCK_SIZE = 1024 * 1024
+
+
+class UploadTooLargeError(ValueError):
+    """The upload exceeded the size limit while it was being spooled."""
+
+
+class IngestJobQueue:
+    """
+    Local, SQLite-backed queue of document ingestion jobs.
+
+    Uploaded files are spooled to a uniquely named file and processed by a
+    fixed number of worker threads, which bounds how many files are embedded
+    at once and so how much embedding quota ingestion can use. Job state and
+    progress survive restarts; unfinished jobs are picked up again on start.
+    """
+
+    def __init__(
+        self,
+        run_job: RunJobFn,
+        spool_dir: str,
+        db_path: str = DEFAULT_JOBS_PATH,
+        max_concurrent_jobs: int = 1,
+        spool_ttl_seconds: float = 24 * 3600,
+        progress_interval: float = 0.5,
+    ):
+        self.run_job = run_job
+        self.spool_dir = Path(spool_dir)
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self.spool_ttl_seconds = spool_ttl_seconds
+        self.progress_interval = progress_interval
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                path TEXT NOT NULL,
+                status TEXT NOT NULL,
+                pages_parsed INTEGER NOT NULL DEFAULT 0,
+                chunks_embedded INTEGER NOT NULL DEFAULT 0,
+                chunks_indexed INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        for row in self._execute(
+            "SELECT id FROM jobs WHERE status IN ('queued', 'running') "
+            "ORDER BY created_at"
+        ):
+            self._update(row["id"], status="queued")
+            self._queue.put(row["id"])
+        self.sweep()
+
+        for i in range(max_concurrent_jobs):
+            threading.Thread(
+                target=self._worker, name=f"ingest-worker-{i}", daemon=True
+            ).start()
+
+    def _execute(self, sql: str, params=()) -> List[sqlite3.Row]:
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+            self._conn.commit()
+            return rows
+
+    def _update(self, job_id: str, **fields) -> None:
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self._execute(
+            f"UPDATE jobs SET {assignments} WHERE id = ?",
+            (*fields.values(), job_id),
+        )
+
+    def submit(
+        self,
+        data: Union[BinaryIO, Iterable[bytes]],
+        filename: str,
+        max_bytes: Optional[int] = None,
+    ) -> str:
+        """
+        Spool an uploaded file block by block and enqueue it for ingestion.
+
+        Only one block of the upload is held in memory at a time. A partly
+        written spool file is removed when the upload fails.
+
+        Args:
+            data: Binary file-like object, or an iterable of byte blocks
+            filename: Original file name
+            max_bytes: Largest accepted upload, or None for no limit
+
+        Raises:
+            UploadTooLargeError: The upload exceeded max_bytes
+            ValueError: The upload was empty
+
+        Returns:
+            str: Job id to poll with status()
+        """
+        if hasattr(data, "read"):
+            blocks = iter(lambda: data.read(SPOOL_BLOCK_SIZE), b"")
+        else:
+            blocks = iter(data)
+        job_id = uuid.uuid4().hex
+        path = self.spool_dir / f"{job_id}{Path(filename).suffix.lower()}"
+        size = 0
+        try:
+            with open(path, "wb") as f:
+                for block in blocks:
+                    size += len(block)
+                    if max_bytes is not None and size > max_bytes:
+                        raise UploadTooLargeError(
+                            f"Upload exceeds the limit of {max_bytes} bytes"
+                        )
+                    f.write(block)
+            if not size:
+                raise ValueError("Empty upload")
+        except BaseException:
+            path.unlink(missing_ok=True)
+            raise
+
+        now = time.time()
+        self._execute(
+            "INSERT INTO jobs (id, filename, path, status, created_at, updated_at) "
+            "VALUES (?, ?, ?, 'queued', ?, ?)",
+            (job_id, filename, str(path), now, now),
+        )
+        self._queue.put(job_id)
+        logger.info(f"Queued ingestion job {job_id} for {filename}")
+        return job_id
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return the job's state and progress, or None for unknown ids."""
+        rows = self._execute(
+            "SELECT id, filename, status, pages_parsed, chunks_embedded, "
+            "chunks_indexed, error, created_at, updated_at FROM jobs WHERE id = ?",
+            (job_id,),
+        )
+        if not rows:
+            return None
+        job = dict(rows[0])
+        job["queue_position"] = (
+            self._execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created_at < ?",
+                (job["created_at"],),
+            )[0][0]
+            if job["status"] == "queued"
+            else 0
+        )
+        return job
+
+    def _worker(self) -> None:
+        while True:
+            job_id = self._queue.get()
+            try:
+                self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job_id: str) -> None:
+        rows = self._execute("SELECT filename, path FROM jobs WHERE id = ?", (job_id,))
+        if not rows:
+            return
+        row = rows[0]
+        self._update(job_id, status="running")
+        last_write = 0.0
+        final: Dict[str, int] = {}
+
+        def progress(counters: Dict[str, int]) -> None:
+            nonlocal last_write
+            final.update(counters)
+            now = time.monotonic()
+            if now - last_write >= self.progress_interval:
+                last_write = now
+                self._update(
+                    job_id, **{k: final[k] for k in PROGRESS_FIELDS if k in final}
+                )
+
+        try:
+            self.run_job(row["path"], row["filename"], progress)
+            self._update(job_id, status="succeeded", **final)
+            logger.info(f"Ingestion job {job_id} ({row['filename']}) succeeded")
+        except Exception as e:
+            logger.error(f"Ingestion job {job_id} ({row['filename']}) failed: {e}")
+            self._update(job_id, status="failed", error=str(e), **final)
+        finally:
+            Path(row["path"]).unlink(missing_ok=True)
+            self.sweep()
+
+    def sweep(self) -> int:
+        """
+        Delete spooled files older than the TTL that no active job references.
+
+        Returns:
+            int: Number of files removed
+        """
+        active = {
+            row["path"]
+            for row in self._execute(
+                "SELECT path FROM jobs WHERE status IN ('queued', 'running')"
+            )
+        }
+        cutoff = time.time() - self.spool_ttl_seconds
+        removed = 0
+        for path in self.spool_dir.iterdir():
+            if str(path) in active or not path.is_file():
+                continue
+            if path.stat().st_mtime < cutoff:
+                path.unlink(missing_ok=True)
+                removed += 1
+        if removed:
+            logger.info(f"Removed {removed} stale files from {self.spool_dir}")
+        return removed
@@ -0,0 +1,137 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, Iterator, List
+
+from RAG.embedding_cache import normalize_text
+
+DEFAULT_MANIFEST_PATH = ".cache/manifest.sqlite"
+
+
+def chunk_fingerprint(text: str) -> str:
+    """Fingerprint of a chunk's normalized content."""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def record_fingerprint(fingerprint: str, metadata: str) -> str:
+    """Fingerprint of a chunk's content together with its position metadata."""
+    return hashlib.sha256(f"{fingerprint}\x00{metadata}".encode("utf-8")).hexdigest()
+
+
+def chunk_id(filepath: str, fingerprint: str, occurrence: int = 0) -> str:
+    """
+    Deterministic, index-safe document id for a chunk.
+
+    The occurrence counter keeps ids unique when a file repeats the same chunk.
+    """
+    payload = f"{filepath}\x00{fingerprint}\x00{occurrence}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+class IngestPlan:
+    """
+    Streaming diff between a file's fresh chunks and the manifest.
+
+    Iterate filter_changed() over the chunked index documents to assign ids
+    and pass through only new or changed chunks; once it is exhausted,
+    delete lists the chunks that disappeared from the file.
+
+    Ids depend on the chunk content alone, but the manifest records the
+    content together with the position metadata (chunk number, page and
+    offsets). A chunk that kept its text but moved, because an earlier part
+    of the file changed, is therefore passed through too and re-uploaded
+    with its new position.
+    """
+
+    def __init__(self, filepath: str, recorded: Dict[str, str]):
+        self.filepath = filepath
+        self.recorded = recorded
+        self.fingerprints: Dict[str, str] = {}
+        self.unchanged = 0
+        self._occurrences: Dict[str, int] = {}
+
+    def filter_changed(
+        self, index_docs: Iterable[Dict[str, Any]]
+    ) -> Iterator[Dict[str, Any]]:
+        for doc in index_docs:
+            fingerprint = chunk_fingerprint(doc["content"])
+            occurrence = self._occurrences.get(fingerprint, 0)
+            self._occurrences[fingerprint] = occurrence + 1
+            doc["id"] = chunk_id(self.filepath, fingerprint, occurrence)
+            recorded = record_fingerprint(
+                fingerprint, doc.get("meta_json_string") or ""
+            )
+            self.fingerprints[doc["id"]] = recorded
+            if self.recorded.get(doc["id"]) == recorded:
+                self.unchanged += 1
+            else:
+                yield doc
+
+    @property
+    def changed(self) -> Dict[str, str]:
+        """{chunk_id: fingerprint} of the chunks filter_changed passed through."""
+        return {
+            id_: fingerprint
+            for id_, fingerprint in self.fingerprints.items()
+            if self.recorded.get(id_) != fingerprint
+        }
+
+    @property
+    def delete(self) -> List[str]:
+        return [id_ for id_ in self.recorded if id_ not in self.fingerprints]
+
+
+class IngestManifest:
+    """
+    Per-filepath record of the chunk ids currently held in the search index.
+    """
+
+    def __init__(self, path: str = DEFAULT_MANIFEST_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                filepath TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                PRIMARY KEY (filepath, chunk_id)
+            )
+            """
+        )
+        self._conn.commit()
+
+    def chunk_ids(self, filepath: str) -> Dict[str, str]:
+        """Return {chunk_id: fingerprint} recorded for filepath."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_id, fingerprint FROM chunks WHERE filepath = ?",
+                (filepath,),
+            ).fetchall()
+        return dict(rows)
+
+    def plan(self, filepath: str) -> IngestPlan:
+        """Start a streaming diff of filepath against its recorded chunks."""
+        return IngestPlan(filepath, self.chunk_ids(filepath))
+
+    def apply(
+        self,
+        filepath: str,
+        added: Dict[str, str],
+        removed: Iterable[str],
+    ) -> None:
+        """Record added {chunk_id: fingerprint} and forget removed chunk ids."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks VALUES (?, ?, ?)",
+                [(filepath, id_, fp) for id_, fp in added.items()],
+            )
+            self._conn.executemany(
+                "DELETE FROM chunks WHERE filepath = ? AND chunk_id = ?",
+                [(filepath, id_) for id_ in removed],
+            )
+            self._conn.commit()
@@ -0,0 +1,268 @@
+import logging
+import math
+import re
+import threading
+from array import array
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FIELD_WEIGHTS = {"title": 2.0, "content": 1.0}
+
+TOKEN_PATTERN = re.compile(r"\w+")
+_FOLD = str.maketrans("ąćęłńóśźż", "acelnoszz")
+
+# Stored in folded form, i.e. without Polish diacritics.
+STOPWORDS = frozenset(
+    """
+    a an and are as at be by for from has have in is it its of on or that the
+    this to was were will with what which who how when where why do does not
+    i w z ze na do nie sie jest sa jak co czy od po za o u przez dla
+    ale lub oraz tez ten ta te tego tej jego jej ich byl byla bylo jako
+    """.split()
+)
+
+# Light suffix stripping shared by Polish and English; the stem keeps at
+# least MIN_STEM characters, so short words are left alone. The lazy stem
+# group makes the regex strip the longest matching suffix.
+MIN_STEM = 4
+_SUFFIX_PATTERN = re.compile(
+    r"^(\w{%d,}?)(owania|owanie|ami|ach|ego|emu|owi|ych|ich|ymi|imi|ow|om|ie|ia"
+    r"|ej|ym|im|ing|ed|es|ly|a|e|i|o|u|y|s)$" % MIN_STEM
+)
+
+
+@lru_cache(maxsize=262144)
+def stem(token: str) -> str:
+    if token.isdigit():
+        return token
+    match = _SUFFIX_PATTERN.match(token)
+    return match.group(1) if match else token
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into index terms.
+
+    Text is lowercased, Polish diacritics are folded (so "zrodla" matches
+    "źródła"), stopwords are dropped and common suffixes stripped.
+    """
+    text = text.lower()
+    if not text.isascii():
+        text = text.translate(_FOLD)
+    words = TOKEN_PATTERN.findall(text)
+    return [stem(word) for word in words if word not in STOPWORDS]
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[str]],
+    weights: Optional[Sequence[float]] = None,
+    k: int = 60,
+) -> List[Tuple[str, float]]:
+    """
+    Fuse ranked lists of keys with weighted reciprocal rank fusion.
+
+    Args:
+        rankings: Lists of keys, best first
+        weights: Weight of each list (default 1.0 each)
+        k: RRF constant; larger values flatten the contribution of top ranks
+
+    Returns:
+        List[Tuple[str, float]]: (key, fused score), best first
+    """
+    weights = weights or [1.0] * len(rankings)
+    fused: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, key in enumerate(ranking, 1):
+            fused[key] = fused.get(key, 0.0) + weight / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+class LexicalIndex:
+    """
+    In-memory inverted index with BM25F scoring over weighted fields.
+
+    Each term has a single posting list of document numbers, in insertion
+    order, with one term frequency per field. Field frequencies are length
+    normalised, weighted and summed before BM25 saturation, so a match in the
+    title counts more than one in the body without being scored twice.
+
+    Removed documents are masked out at query time; their postings stay (and
+    still count towards document frequencies) until the index is rebuilt.
+    """
+
+    def __init__(
+        self,
+        field_weights: Optional[Dict[str, float]] = None,
+        k1: float = 1.2,
+        b: float = 0.75,
+    ):
+        self.field_weights = dict(field_weights or DEFAULT_FIELD_WEIGHTS)
+        self.fields = list(self.field_weights)
+        self.k1 = k1
+        self.b = b
+
+        self._lock = threading.RLock()
+        self._keys: List[Optional[str]] = []
+        self._docnos: Dict[str, int] = {}
+        self._alive = bytearray()
+        self._lengths = [array("f") for _ in self.fields]
+        self._length_totals = [0.0 for _ in self.fields]
+        self._postings: Dict[str, Tuple[array, array]] = {}
+
+        # Numpy views rebuilt lazily after writes. Term weight bounds depend
+        # on the length norms, so they are dropped whenever those change.
+        self._frozen: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._max_weights: Dict[str, float] = {}
+        self._norms: Optional[np.ndarray] = None
+        self._alive_mask: Optional[np.ndarray] = None
+        self._weights = np.asarray(list(self.field_weights.values()), np.float32)
+
+    def __len__(self) -> int:
+        return len(self._docnos)
+
+    def add(self, key: str, fields: Dict[str, str]) -> None:
+        """Index a document, replacing any earlier version with the same key."""
+        counts = [Counter(tokenize(fields.get(name) or "")) for name in self.fields]
+        with self._lock:
+            self.remove(key)
+            docno = len(self._keys)
+            self._keys.append(key)
+            self._docnos[key] = docno
+            self._alive.append(1)
+            for i, field_counts in enumerate(counts):
+                length = sum(field_counts.values())
+                self._lengths[i].append(length)
+                self._length_totals[i] += length
+
+            for term in set().union(*counts):
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = (array("i"), array("i"))
+                postings[0].append(docno)
+                postings[1].extend([field_counts[term] for field_counts in counts])
+                self._frozen.pop(term, None)
+            self._norms = None
+
+    def add_many(self, documents: Iterable[Tuple[str, Dict[str, str]]]) -> None:
+        for key, fields in documents:
+            self.add(key, fields)
+
+    def remove(self, key: str) -> bool:
+        with self._lock:
+            docno = self._docnos.pop(key, None)
+            if docno is None:
+                return False
+            self._keys[docno] = None
+            self._alive[docno] = 0
+            for i, lengths in enumerate(self._lengths):
+                self._length_totals[i] -= lengths[docno]
+            self._norms = None
+            return True
+
+    def _prepare(self) -> None:
+        if self._norms is not None:
+            return
+        lengths = np.stack(
+            [
+                np.array(field_lengths, dtype=np.float32)
+                for field_lengths in self._lengths
+            ],
+            axis=1,
+        )
+        live = max(len(self._docnos), 1)
+        averages = np.asarray(self._length_totals, dtype=np.float32) / live
+        averages[averages <= 0] = 1.0
+        self._norms = 1.0 - self.b + self.b * lengths / averages
+        self._max_weights.clear()
+        self._alive_mask = np.frombuffer(bytes(self._alive), dtype=np.uint8) > 0
+
+    def _saturate(self, frequencies: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """BM25F term weight of each row, before idf."""
+        tf = (frequencies * self._weights / self._norms[rows]).sum(axis=1)
+        return tf * (self.k1 + 1.0) / (self.k1 + tf)
+
+    def _term_postings(
+        self, term: str
+    ) -> Optional[Tuple[np.ndarray, np.ndarray, float]]:
+        """
+        Return (rows, frequencies, max_weight) for a term.
+
+        rows are ascending document numbers; max_weight is the highest term
+        weight in the list under the current length norms.
+        """
+        frozen = self._frozen.get(term)
+        if frozen is None:
+            postings = self._postings.get(term)
+            if postings is None:
+                return None
+            rows = np.array(postings[0], dtype=np.int64)
+            frequencies = np.array(postings[1], dtype=np.float32).reshape(
+                -1, len(self.fields)
+            )
+            frozen = self._frozen[term] = (rows, frequencies)
+        rows, frequencies = frozen
+        max_weight = self._max_weights.get(term)
+        if max_weight is None:
+            max_weight = float(self._saturate(frequencies, rows).max())
+            self._max_weights[term] = max_weight
+        return rows, frequencies, max_weight
+
+    def search(self, text: str, k: int = 50) -> List[Tuple[str, float]]:
+        """
+        Return up to k (key, BM25 score) pairs for the query, best first.
+
+        Uses MaxScore pruning: terms are processed from rarest to most common
+        and, as soon as the remaining terms together cannot lift an unseen
+        document into the top k, their (long) posting lists are only probed
+        for the documents already found instead of being scanned.
+        """
+        terms = set(tokenize(text))
+        with self._lock:
+            if not terms or not self._docnos:
+                return []
+            self._prepare()
+            live = len(self._docnos)
+            postings = [p for p in map(self._term_postings, terms) if p is not None]
+            if not postings:
+                return []
+            postings.sort(key=lambda p: len(p[0]))
+            idfs = [
+                math.log(1.0 + (live - len(rows) + 0.5) / (len(rows) + 0.5))
+                for rows, _, _ in postings
+            ]
+            bounds = [idf * p[2] for idf, p in zip(idfs, postings)]
+            remaining = np.cumsum(bounds[::-1])[::-1]
+
+            candidates = np.zeros(0, dtype=np.int64)
+            scores = np.zeros(0)
+            for i, ((rows, frequencies, _), idf) in enumerate(zip(postings, idfs)):
+                if len(scores) >= k and remaining[i] <= np.partition(scores, -k)[-k]:
+                    positions = np.searchsorted(rows, candidates)
+                    positions[positions == len(rows)] = 0
+                    matched = rows[positions] == candidates
+                    scores[matched] += idf * self._saturate(
+                        frequencies[positions[matched]], candidates[matched]
+                    )
+                    continue
+                alive = self._alive_mask[rows]
+                rows, frequencies = rows[alive], frequencies[alive]
+                weights = idf * self._saturate(frequencies, rows)
+                if not len(candidates):
+                    candidates, scores = rows, weights
+                    continue
+                candidates, inverse = np.unique(
+                    np.concatenate([candidates, rows]), return_inverse=True
+                )
+                scores = np.bincount(inverse, weights=np.concatenate([scores, weights]))
+
+            top = min(k, len(candidates))
+            if not top:
+                return []
+            best = np.argpartition(-scores, top - 1)[:top]
+            best = best[np.argsort(-scores[best])]
+            return [(self._keys[candidates[i]], float(scores[i])) for i in best]
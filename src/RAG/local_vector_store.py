@@ -0,0 +1,528 @@
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from RAG.lexical_index import LexicalIndex, reciprocal_rank_fusion
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = ".cache/local_index"
+FIELDS = ["id", "content", "title", "url", "filepath", "meta_json_string"]
+
+
+@dataclass
+class IndexingResult:
+    """Mirror of azure.search.documents.models.IndexingResult."""
+
+    key: str
+    succeeded: bool = True
+    error_message: Optional[str] = None
+    status_code: int = 200
+
+
+class LocalVectorStore:
+    """
+    In-process vector index exposing the subset of SearchClient used by the
+    RAG code (upload, merge_or_upload, delete, search, get_document_count).
+
+    Vectors are L2-normalised float32 rows in a memory-mapped file, so search
+    scores are cosine similarities. Search is exact brute force over the matrix
+    in row blocks, or an IVF approximation once the store holds ivf_min_rows
+    documents: the first upload past that size builds the IVF index, and
+    build_ivf() rebuilds it.
+    Document fields are kept in an append-only JSON-lines log that is replayed
+    on load, so nothing has to be re-embedded after a restart.
+
+    Queries with search_text are hybrid: a BM25 ranking from an in-memory
+    LexicalIndex (built from the log on first use) is fused with the vector
+    ranking by weighted reciprocal rank fusion.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_INDEX_PATH,
+        vector_field: str = "contentVector",
+        block_rows: int = 65536,
+        nprobe: int = 8,
+        ivf_min_rows: int = 20000,
+        field_weights: Optional[Dict[str, float]] = None,
+        rrf_k: int = 60,
+        text_weight: float = 1.0,
+        vector_weight: float = 1.0,
+        candidates: int = 50,
+    ):
+        self.path = path
+        self.vector_field = vector_field
+        self.block_rows = block_rows
+        self.nprobe = nprobe
+        self.ivf_min_rows = ivf_min_rows
+        self.field_weights = field_weights
+        self.rrf_k = rrf_k
+        self.text_weight = text_weight
+        self.vector_weight = vector_weight
+        self.candidates = candidates
+        os.makedirs(path, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._log_path = os.path.join(path, "documents.jsonl")
+        self._meta_path = os.path.join(path, "meta.json")
+        self._ivf_path = os.path.join(path, "ivf.npz")
+
+        self.dimensions: Optional[int] = None
+        self._documents: List[Optional[Dict[str, Any]]] = []
+        self._rows: Dict[str, int] = {}
+        self._matrix: Optional[np.memmap] = None
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments: Optional[np.ndarray] = None
+        self._ivf_lists: Optional[List[np.ndarray]] = None
+        self._lexical: Optional[LexicalIndex] = None
+        self._load()
+        self._alive = np.array([d is not None for d in self._documents], dtype=bool)
+
+    @classmethod
+    def from_env(cls, path: Optional[str] = None) -> "LocalVectorStore":
+        """Create a store configured from LOCAL_INDEX_PATH and HYBRID_* variables."""
+        return cls(
+            path=path or os.getenv("LOCAL_INDEX_PATH", DEFAULT_INDEX_PATH),
+            field_weights={
+                "title": float(os.getenv("HYBRID_TITLE_WEIGHT", "2.0")),
+                "content": float(os.getenv("HYBRID_CONTENT_WEIGHT", "1.0")),
+            },
+            rrf_k=int(os.getenv("HYBRID_RRF_K", "60")),
+            text_weight=float(os.getenv("HYBRID_TEXT_WEIGHT", "1.0")),
+            vector_weight=float(os.getenv("HYBRID_VECTOR_WEIGHT", "1.0")),
+        )
+
+    # Persistence
+
+    def _load(self) -> None:
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, encoding="utf-8") as f:
+                self.dimensions = json.load(f)["dimensions"]
+        if os.path.exists(self._log_path):
+            with open(self._log_path, "rb") as f:
+                lines = f.readlines()
+            if lines and not lines[-1].endswith(b"\n"):
+                # A write interrupted mid-record; the upload never completed
+                logger.warning(f"Dropping a partial record from {self._log_path}")
+                lines.pop()
+                with open(self._log_path, "r+b") as f:
+                    f.truncate(sum(len(line) for line in lines))
+            for line in lines:
+                record = json.loads(line)
+                row = record["row"]
+                if record["op"] == "upsert":
+                    while len(self._documents) <= row:
+                        self._documents.append(None)
+                    self._documents[row] = record["doc"]
+                    self._rows[record["doc"]["id"]] = row
+                else:
+                    doc = self._documents[row]
+                    if doc is not None:
+                        self._rows.pop(doc["id"], None)
+                    self._documents[row] = None
+        self._trim_vectors()
+        self._open_matrix()
+        if os.path.exists(self._ivf_path):
+            ivf = np.load(self._ivf_path)
+            self._centroids = ivf["centroids"]
+            self._assignments = ivf["assignments"]
+            if len(self._assignments) < len(self._documents):
+                self._assign_new_rows(len(self._assignments))
+        logger.info(f"Loaded {len(self._rows)} documents from {self.path}")
+
+    def _reload(self) -> None:
+        """Drop the in-memory state and replay it from disk."""
+        self._documents = []
+        self._rows = {}
+        self._matrix = None
+        self._centroids = None
+        self._assignments = None
+        self._ivf_lists = None
+        self._lexical = None
+        self._load()
+        self._alive = np.array([d is not None for d in self._documents], dtype=bool)
+
+    def _trim_vectors(self) -> None:
+        """
+        Cut vectors.f32 back to one row per logged document.
+
+        Vectors are appended before their documents are logged, so an upload
+        interrupted in between leaves rows that no document owns; later
+        appends would then land at the wrong rows.
+        """
+        if self.dimensions is None or not os.path.exists(self._vectors_path):
+            return
+        expected = len(self._documents) * self.dimensions * 4
+        size = os.path.getsize(self._vectors_path)
+        if size > expected:
+            logger.warning(
+                f"Dropping {(size - expected) // (self.dimensions * 4)} vectors "
+                f"of an interrupted upload from {self._vectors_path}"
+            )
+            with open(self._vectors_path, "r+b") as f:
+                f.truncate(expected)
+        elif size < expected:
+            raise ValueError(
+                f"{self._vectors_path} holds {size // (self.dimensions * 4)} "
+                f"vectors for {len(self._documents)} logged documents"
+            )
+
+    def _open_matrix(self) -> None:
+        rows = len(self._documents)
+        if self.dimensions is None or rows == 0:
+            self._matrix = None
+            return
+        self._matrix = np.memmap(
+            self._vectors_path,
+            dtype=np.float32,
+            mode="r+",
+            shape=(rows, self.dimensions),
+        )
+
+    def _append_log(self, records: List[Dict[str, Any]]) -> None:
+        with open(self._log_path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    # Writes
+
+    def _normalize(self, vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).astype(np.float32)
+
+    def upload_documents(self, documents: List[Dict[str, Any]]) -> List[IndexingResult]:
+        """Insert or replace documents; each needs an id and a vector field."""
+        if not documents:
+            return []
+        with self._lock:
+            vectors = self._normalize(
+                np.asarray([d[self.vector_field] for d in documents], dtype=np.float32)
+            )
+            if self.dimensions is None:
+                self.dimensions = int(vectors.shape[1])
+                with open(self._meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"dimensions": self.dimensions}, f)
+            elif vectors.shape[1] != self.dimensions:
+                raise ValueError(
+                    f"Expected {self.dimensions}-dimensional vectors, "
+                    f"got {vectors.shape[1]}"
+                )
+
+            first_new_row = len(self._documents)
+            try:
+                records = []
+                appended = []
+                for doc, vector in zip(documents, vectors):
+                    fields = {k: doc.get(k, "") for k in FIELDS}
+                    row = self._rows.get(doc["id"])
+                    if row is None:
+                        row = len(self._documents)
+                        self._documents.append(fields)
+                        self._rows[doc["id"]] = row
+                        appended.append(vector)
+                    elif row >= first_new_row:
+                        self._documents[row] = fields
+                        appended[row - first_new_row] = vector
+                    else:
+                        self._documents[row] = fields
+                        self._matrix[row] = vector
+                    records.append({"op": "upsert", "row": row, "doc": fields})
+                    if self._lexical is not None:
+                        self._lexical.add(doc["id"], fields)
+
+                if appended:
+                    self._alive = np.concatenate(
+                        [self._alive, np.ones(len(appended), dtype=bool)]
+                    )
+                    with open(self._vectors_path, "ab") as f:
+                        f.write(np.asarray(appended, dtype=np.float32).tobytes())
+                if self._matrix is not None:
+                    self._matrix.flush()
+                self._open_matrix()
+                self._append_log(records)
+            except BaseException:
+                # Bring the in-memory state back to what reached the disk
+                self._reload()
+                raise
+            if self._centroids is not None and appended:
+                self._assign_new_rows(first_new_row)
+            elif self._centroids is None and len(self._rows) >= self.ivf_min_rows:
+                self.build_ivf()
+        return [IndexingResult(key=d["id"]) for d in documents]
+
+    def merge_or_upload_documents(
+        self, documents: List[Dict[str, Any]]
+    ) -> List[IndexingResult]:
+        return self.upload_documents(documents)
+
+    def delete_documents(self, documents: List[Dict[str, Any]]) -> List[IndexingResult]:
+        """Delete documents by id; unknown ids are reported as not found."""
+        results = []
+        records = []
+        with self._lock:
+            for doc in documents:
+                row = self._rows.pop(doc["id"], None)
+                if row is None:
+                    results.append(
+                        IndexingResult(doc["id"], False, "Document not found", 404)
+                    )
+                    continue
+                self._documents[row] = None
+                self._alive[row] = False
+                if self._lexical is not None:
+                    self._lexical.remove(doc["id"])
+                records.append({"op": "delete", "row": row})
+                results.append(IndexingResult(doc["id"]))
+            self._append_log(records)
+        return results
+
+    def get_document_count(self) -> int:
+        return len(self._rows)
+
+    # Approximate index
+
+    def _assign_new_rows(self, start: int) -> None:
+        rows = np.arange(start, len(self._documents))
+        if not len(rows):
+            return
+        assignments = np.argmax(self._matrix[rows] @ self._centroids.T, axis=1)
+        self._assignments = np.concatenate(
+            [self._assignments[:start], assignments.astype(np.int32)]
+        )
+        self._ivf_lists = None
+
+    def build_ivf(
+        self,
+        n_lists: Optional[int] = None,
+        iterations: int = 10,
+        sample_size: int = 50000,
+        seed: int = 0,
+    ) -> None:
+        """
+        Build an inverted-file index with spherical k-means.
+
+        Searches then score only the rows of the nprobe closest clusters
+        instead of the whole matrix.
+        """
+        with self._lock:
+            candidates = np.nonzero(self._alive)[0]
+            if not len(candidates):
+                return
+            n_lists = n_lists or max(1, int(np.sqrt(len(candidates))))
+            rng = np.random.default_rng(seed)
+            sample = rng.choice(
+                candidates, min(sample_size, len(candidates)), replace=False
+            )
+            data = np.asarray(self._matrix[np.sort(sample)])
+            centroids = data[rng.choice(len(data), min(n_lists, len(data)), False)]
+            for _ in range(iterations):
+                labels = np.argmax(data @ centroids.T, axis=1)
+                for c in range(len(centroids)):
+                    members = data[labels == c]
+                    if len(members):
+                        centroids[c] = members.sum(axis=0)
+                centroids = self._normalize(centroids)
+
+            self._centroids = centroids
+            self._assignments = np.zeros(0, dtype=np.int32)
+            self._assign_new_rows(0)
+            np.savez(
+                self._ivf_path,
+                centroids=self._centroids,
+                assignments=self._assignments,
+            )
+            logger.info(f"Built IVF index with {len(centroids)} lists")
+
+    def _ivf_candidates(self, query: np.ndarray) -> np.ndarray:
+        if self._ivf_lists is None:
+            order = np.argsort(self._assignments, kind="stable")
+            bounds = np.searchsorted(
+                self._assignments[order], np.arange(len(self._centroids) + 1)
+            )
+            self._ivf_lists = [
+                order[bounds[c] : bounds[c + 1]] for c in range(len(self._centroids))
+            ]
+        probes = np.argsort(self._centroids @ query)[-self.nprobe :]
+        return np.sort(np.concatenate([self._ivf_lists[c] for c in probes]))
+
+    # Search
+
+    def _top_rows(
+        self, query: np.ndarray, k: int, rows: Optional[np.ndarray] = None
+    ) -> List[tuple]:
+        """Return [(score, row)] of the k best live rows, best first."""
+        best: List[tuple] = []
+        total = len(self._documents) if rows is None else len(rows)
+        for start in range(0, total, self.block_rows):
+            if rows is None:
+                block_rows = np.arange(start, min(start + self.block_rows, total))
+                scores = self._matrix[start : start + len(block_rows)] @ query
+            else:
+                block_rows = rows[start : start + self.block_rows]
+                scores = self._matrix[block_rows] @ query
+            scores = np.where(self._alive[block_rows], scores, -np.inf)
+            top = min(k, len(scores))
+            idx = np.argpartition(-scores, top - 1)[:top]
+            best.extend(
+                (float(scores[i]), int(block_rows[i]))
+                for i in idx
+                if scores[i] != -np.inf
+            )
+            best = sorted(best, reverse=True)[:k]
+        return best
+
+    def vector_search(
+        self, vector: Sequence[float], k: int = 5, exact: Optional[bool] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Return the k nearest documents as search results with '@search.score'.
+
+        exact=None uses the IVF index when it exists and the store is larger
+        than ivf_min_rows.
+        """
+        with self._lock:
+            if self._matrix is None or not self._rows:
+                return []
+            query = self._normalize(np.asarray(vector, dtype=np.float32))
+            if exact is None:
+                exact = self._centroids is None or len(self._rows) < self.ivf_min_rows
+            rows = None if exact else self._ivf_candidates(query)
+            return [
+                {**self._documents[row], "@search.score": score}
+                for score, row in self._top_rows(query, k, rows)
+            ]
+
+    def _lexical_index(self) -> LexicalIndex:
+        if self._lexical is None:
+            lexical = LexicalIndex(self.field_weights)
+            lexical.add_many((doc["id"], doc) for doc in self._documents if doc)
+            self._lexical = lexical
+            logger.info(f"Built lexical index over {len(lexical)} documents")
+        return self._lexical
+
+    def text_search(self, text: str, k: int = 5) -> List[Dict[str, Any]]:
+        """Return the k best BM25 matches as search results with '@search.score'."""
+        with self._lock:
+            return [
+                {**self._documents[self._rows[key]], "@search.score": score}
+                for key, score in self._lexical_index().search(text, k)
+            ]
+
+    def hybrid_search(
+        self,
+        text: Optional[str],
+        vectors: Sequence[Sequence[float]],
+        k: int = 5,
+    ) -> List[Dict[str, Any]]:
+        """
+        Rank documents by text and any number of query vectors.
+
+        With a single ranking its native score (BM25 or cosine) is returned;
+        several rankings are fused by weighted reciprocal rank fusion over
+        their top `candidates` hits, and '@search.score' is the fused score.
+        """
+        candidates = max(k, self.candidates)
+        with self._lock:
+            rankings = [self.vector_search(vector, candidates) for vector in vectors]
+            weights = [self.vector_weight] * len(rankings)
+            if text and text.strip() and text.strip() != "*":
+                rankings.append(self.text_search(text, candidates))
+                weights.append(self.text_weight)
+            if len(rankings) <= 1:
+                return rankings[0][:k] if rankings else []
+
+            fused = reciprocal_rank_fusion(
+                [[hit["id"] for hit in ranking] for ranking in rankings],
+                weights,
+                self.rrf_k,
+            )
+            return [
+                {**self._documents[self._rows[key]], "@search.score": score}
+                for key, score in fused[:k]
+            ]
+
+    def search(
+        self,
+        search_text: Optional[str] = None,
+        vector_queries: Optional[list] = None,
+        select: Optional[List[str]] = None,
+        top: int = 50,
+        **kwargs,
+    ) -> List[Dict[str, Any]]:
+        """
+        SearchClient.search compatible entry point for text, vector and
+        hybrid queries; see hybrid_search for how results are ranked.
+        """
+        vectors = [query.vector for query in vector_queries or []]
+        if not vectors and not search_text:
+            raise ValueError("LocalVectorStore.search requires a text or vector query")
+        ranked = self.hybrid_search(search_text, vectors, top)
+        if select:
+            keep = set(select) | {"@search.score"}
+            ranked = [{k: v for k, v in hit.items() if k in keep} for hit in ranked]
+        return ranked
+
+    def compact(self) -> None:
+        """Rewrite the vector file and log without deleted rows."""
+        with self._lock:
+            live_rows = [r for r, d in enumerate(self._documents) if d is not None]
+            vectors = (
+                np.asarray(self._matrix[live_rows])
+                if self._matrix is not None and live_rows
+                else np.zeros((0, self.dimensions or 0), dtype=np.float32)
+            )
+            documents = [self._documents[r] for r in live_rows]
+            self._matrix = None
+
+            with open(self._vectors_path + ".tmp", "wb") as f:
+                f.write(vectors.tobytes())
+            with open(self._log_path + ".tmp", "w", encoding="utf-8") as f:
+                for row, doc in enumerate(documents):
+                    record = {"op": "upsert", "row": row, "doc": doc}
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            os.replace(self._vectors_path + ".tmp", self._vectors_path)
+            os.replace(self._log_path + ".tmp", self._log_path)
+
+            self._documents = documents
+            self._rows = {doc["id"]: row for row, doc in enumerate(documents)}
+            self._alive = np.ones(len(documents), dtype=bool)
+            self._lexical = None
+            self._open_matrix()
+            if self._centroids is not None:
+                self._assignments = np.zeros(0, dtype=np.int32)
+                self._assign_new_rows(0)
+                np.savez(
+                    self._ivf_path,
+                    centroids=self._centroids,
+                    assignments=self._assignments,
+                )
+
+    def close(self) -> None:
+        with self._lock:
+            if self._matrix is not None:
+                self._matrix.flush()
+
+
+_default_stores: Dict[str, LocalVectorStore] = {}
+_default_stores_lock = threading.Lock()
+
+
+def get_default_store(path: Optional[str] = None) -> LocalVectorStore:
+    """
+    Return the process-wide store at path (LOCAL_INDEX_PATH by default),
+    shared by ai_search and RAGSystem so each sees the other's uploads.
+    """
+    path = os.path.abspath(path or os.getenv("LOCAL_INDEX_PATH", DEFAULT_INDEX_PATH))
+    with _default_stores_lock:
+        store = _default_stores.get(path)
+        if store is None:
+            store = _default_stores[path] = LocalVectorStore.from_env(path)
+        return store
@@ -0,0 +1,336 @@
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, Dict, Iterator, Mapping, Optional
+
+from RAG.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Completion tokens assumed for chat requests without max_tokens.
+DEFAULT_COMPLETION_TOKENS = 512
+# Tokens of chat formatting added per message.
+MESSAGE_OVERHEAD_TOKENS = 4
+# Pause applied after a 429 response without Retry-After.
+DEFAULT_RETRY_AFTER = 1.0
+# Azure OpenAI enforces per-minute quotas over short windows, so only this
+# many seconds' worth of the quota can be sent in one burst.
+QUOTA_WINDOW_SECONDS = 10
+
+
+class Priority(IntEnum):
+    """Queueing priority of a request; lower values are admitted first."""
+
+    INTERACTIVE = 0
+    BATCH = 5
+    BULK = 10
+
+
+_priority: ContextVar[Priority] = ContextVar(
+    "request_priority", default=Priority.INTERACTIVE
+)
+
+
+def current_priority() -> Priority:
+    return _priority.get()
+
+
+@contextmanager
+def request_priority(priority: Priority) -> Iterator[None]:
+    """
+    Send the Azure OpenAI requests made in the block with the given priority.
+
+    The priority follows the context: asyncio tasks created in the block and
+    functions run with contextvars.copy_context().run inherit it.
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def retry_after_seconds(headers: Mapping[str, str]) -> Optional[float]:
+    """Read retry-after-ms or Retry-After (seconds) from response headers."""
+    for name, scale in (("retry-after-ms", 1000), ("retry-after", 1)):
+        value = headers.get(name)
+        if value is not None:
+            try:
+                return float(value) / scale
+            except (TypeError, ValueError):
+                pass
+    return None
+
+
+def estimate_request_tokens(body: bytes) -> int:
+    """Estimate the quota tokens of a JSON request body (estimate_payload_tokens)."""
+    try:
+        payload = json.loads(body) if body else {}
+    except (TypeError, ValueError):
+        return 0
+    return estimate_payload_tokens(payload)
+
+
+def estimate_payload_tokens(payload: Any) -> int:
+    """
+    Estimate the tokens an Azure OpenAI request counts against its quota:
+    the prompt (chat messages or embedding inputs) plus max_tokens, or
+    DEFAULT_COMPLETION_TOKENS for chat requests without it.
+    """
+    if not isinstance(payload, dict):
+        return 0
+
+    tokens = 0
+    messages = payload.get("messages")
+    if isinstance(messages, list):
+        for message in messages:
+            content = message.get("content") if isinstance(message, dict) else None
+            if isinstance(content, list):
+                content = " ".join(
+                    part.get("text", "") for part in content if isinstance(part, dict)
+                )
+            tokens += MESSAGE_OVERHEAD_TOKENS + count_tokens(content or "")
+        tokens += (
+            payload.get("max_tokens")
+            or payload.get("max_completion_tokens")
+            or DEFAULT_COMPLETION_TOKENS
+        )
+
+    inputs = payload.get("input")
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    if isinstance(inputs, list):
+        for item in inputs:
+            if isinstance(item, str):
+                tokens += count_tokens(item)
+            elif isinstance(item, list):
+                # Already tokenized input
+                tokens += len(item)
+    return tokens
+
+
+class AdaptiveLimiter:
+    """
+    Admission control for one Azure OpenAI deployment.
+
+    Combines a token bucket refilled at tokens_per_minute, charged with each
+    request's estimated tokens, with an AIMD concurrency limit: every
+    successful response raises the limit by 1/limit (about one per round of
+    requests), every 429 halves it and pauses admissions for Retry-After.
+    The x-ratelimit-remaining-tokens header keeps the bucket in step with
+    the service's own count.
+
+    Waiting requests are admitted in priority order, then arrival order.
+    Requests at Priority.BULK or lower may only use bulk_share of the
+    concurrency limit, leaving headroom for interactive ones.
+
+    Args:
+        name: Deployment name, for logging
+        max_concurrency: Upper bound of the limit; 0 for none, in which case
+            concurrency is unlimited until the first 429
+        tokens_per_minute: Token quota; 0 disables the token bucket
+        bulk_share: Share of the limit available to bulk requests
+    """
+
+    def __init__(
+        self,
+        name: str = "",
+        max_concurrency: int = 0,
+        tokens_per_minute: int = 0,
+        bulk_share: float = 0.75,
+        min_concurrency: int = 1,
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency or math.inf
+        self.min_concurrency = min_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.bulk_share = bulk_share
+        self.limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self.throttled = 0
+        self.admitted = 0
+        self.waited_seconds = 0.0
+
+        self.burst_tokens = tokens_per_minute * QUOTA_WINDOW_SECONDS / 60
+        self._tokens = self.burst_tokens
+        self._refilled = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._waiters: list = []
+        self._async_waiters: Dict[tuple, tuple] = {}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    def _refill(self, now: float) -> None:
+        if self.tokens_per_minute:
+            self._tokens = min(
+                self.burst_tokens,
+                self._tokens + (now - self._refilled) * self.tokens_per_minute / 60,
+            )
+        self._refilled = now
+
+    def _delay(self, tokens: int, priority: int, now: float) -> float:
+        """Seconds until a request can be admitted; inf until a release."""
+        if now < self._paused_until:
+            return self._paused_until - now
+        limit = self.limit
+        if priority >= Priority.BULK:
+            limit *= self.bulk_share
+        if self.in_flight + 1 > max(1, limit):
+            return math.inf
+        # A request above the burst size waits for a full bucket
+        needed = min(tokens, self.burst_tokens)
+        if self.tokens_per_minute and self._tokens < needed:
+            return (needed - self._tokens) * 60 / self.tokens_per_minute
+        return 0.0
+
+    def _admit(self, tokens: int) -> None:
+        self.in_flight += 1
+        self.admitted += 1
+        if self.tokens_per_minute:
+            self._tokens -= tokens
+
+    def acquire(self, tokens: int = 0, priority: Optional[int] = None) -> None:
+        """Block until the request is admitted; pair with release()."""
+        priority = current_priority() if priority is None else priority
+        started = time.monotonic()
+        with self._condition:
+            entry = (priority, next(self._sequence))
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    delay = math.inf
+                    if self._waiters[0] == entry:
+                        delay = self._delay(tokens, priority, now)
+                        if delay <= 0:
+                            break
+                    self._condition.wait(None if delay == math.inf else delay)
+            except BaseException:
+                self._abandon(entry)
+                raise
+            self._admit_waiter(tokens, started)
+
+    async def acquire_async(
+        self, tokens: int = 0, priority: Optional[int] = None
+    ) -> None:
+        """
+        Wait in the event loop until the request is admitted; pair with
+        release(). A task cancelled while waiting leaves the queue without
+        taking a slot.
+        """
+        priority = current_priority() if priority is None else priority
+        started = time.monotonic()
+        wake = asyncio.Event()
+        with self._condition:
+            entry = (priority, next(self._sequence))
+            heapq.heappush(self._waiters, entry)
+            self._async_waiters[entry] = (asyncio.get_running_loop(), wake)
+        try:
+            while True:
+                with self._condition:
+                    now = time.monotonic()
+                    self._refill(now)
+                    delay = math.inf
+                    if self._waiters[0] == entry:
+                        delay = self._delay(tokens, priority, now)
+                        if delay <= 0:
+                            del self._async_waiters[entry]
+                            self._admit_waiter(tokens, started)
+                            return
+                    # Wake-ups are scheduled on this loop, so none is lost
+                    # between clearing and waiting
+                    wake.clear()
+                try:
+                    await asyncio.wait_for(
+                        wake.wait(), None if delay == math.inf else delay
+                    )
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            with self._condition:
+                if self._async_waiters.pop(entry, None) is not None:
+                    self._abandon(entry)
+            raise
+
+    def _admit_waiter(self, tokens: int, started: float) -> None:
+        """Admit the waiter at the head of the queue; the lock is held."""
+        heapq.heappop(self._waiters)
+        self._admit(tokens)
+        self.waited_seconds += time.monotonic() - started
+        # The next waiter may be admissible too
+        self._notify()
+
+    def _abandon(self, entry: tuple) -> None:
+        self._waiters.remove(entry)
+        heapq.heapify(self._waiters)
+        self._notify()
+
+    def _notify(self) -> None:
+        """Wake every waiter, in threads and event loops; the lock is held."""
+        self._condition.notify_all()
+        for loop, wake in self._async_waiters.values():
+            try:
+                loop.call_soon_threadsafe(wake.set)
+            except RuntimeError:
+                # Loop closed; its waiter is gone with it
+                pass
+
+    def on_response(self, status_code: int, headers: Mapping[str, str]) -> None:
+        """Adapt the limit and the bucket to a response."""
+        with self._condition:
+            now = time.monotonic()
+            if status_code == 429:
+                self.throttled += 1
+                retry_after = retry_after_seconds(headers) or DEFAULT_RETRY_AFTER
+                self._paused_until = max(self._paused_until, now + retry_after)
+                if self.tokens_per_minute:
+                    self._tokens = min(self._tokens, 0.0)
+                # One decrease per throttling episode, not per rejected request
+                if now - self._last_decrease >= retry_after:
+                    self._last_decrease = now
+                    self.limit = max(
+                        self.min_concurrency,
+                        math.floor(min(self.limit, self.in_flight) / 2),
+                    )
+                    logger.warning(
+                        f"{self.name}: throttled, concurrency limit lowered to "
+                        f"{self.limit:.0f}, pausing {retry_after:.2f}s"
+                    )
+            elif status_code < 400:
+                if self.limit < self.max_concurrency:
+                    self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+                remaining = headers.get("x-ratelimit-remaining-tokens")
+                if remaining is not None and self.tokens_per_minute:
+                    try:
+                        self._tokens = min(self._tokens, float(remaining))
+                    except ValueError:
+                        pass
+            self._notify()
+
+    def release(self) -> None:
+        with self._condition:
+            self.in_flight -= 1
+            self._notify()
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                "limit": self.limit,
+                "in_flight": self.in_flight,
+                "waiting": len(self._waiters),
+                "admitted": self.admitted,
+                "throttled": self.throttled,
+                "waited_seconds": self.waited_seconds,
+                "tokens_available": self._tokens if self.tokens_per_minute else None,
+            }
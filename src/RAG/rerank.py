@@ -0,0 +1,244 @@
+import logging
+import math
+import os
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Sequence, Set, Tuple
+
+from RAG.lexical_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CROSS_ENCODER = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+Scorer = Callable[[str, Sequence[str]], List[float]]
+
+
+class LexicalOverlapScorer:
+    """
+    Score passages by BM25 overlap with the query, using document
+    frequencies from the candidate set itself.
+
+    Scores are normalised by the best achievable score for the query, so
+    they fall in [0, 1]. Deterministic and dependency free.
+    """
+
+    name = "lexical"
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+
+    def __call__(self, query: str, passages: Sequence[str]) -> List[float]:
+        query_terms = set(tokenize(query))
+        documents = [Counter(tokenize(passage)) for passage in passages]
+        if not query_terms or not documents:
+            return [0.0] * len(passages)
+
+        average_length = sum(sum(d.values()) for d in documents) / len(documents)
+        average_length = average_length or 1.0
+        idf = {}
+        for term in query_terms:
+            df = sum(1 for d in documents if term in d)
+            idf[term] = math.log(1.0 + (len(documents) - df + 0.5) / (df + 0.5))
+        best_possible = sum(idf.values()) * (self.k1 + 1.0)
+
+        scores = []
+        for document in documents:
+            norm = 1.0 - self.b + self.b * sum(document.values()) / average_length
+            score = 0.0
+            for term in query_terms:
+                tf = document.get(term, 0)
+                if tf:
+                    score += idf[term] * tf * (self.k1 + 1.0) / (tf + self.k1 * norm)
+            scores.append(score / best_possible)
+        return scores
+
+
+class CrossEncoderScorer:
+    """
+    Score (query, passage) pairs with a small sentence-transformers
+    cross-encoder on CPU.
+
+    The model is loaded on first use. If sentence-transformers or the model
+    is unavailable, scoring falls back to LexicalOverlapScorer.
+    """
+
+    name = "cross-encoder"
+
+    def __init__(self, model_name: str = DEFAULT_CROSS_ENCODER):
+        self.model_name = model_name
+        self.fallback = LexicalOverlapScorer()
+        self._model = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        with self._lock:
+            if not self._loaded:
+                self._loaded = True
+                try:
+                    from sentence_transformers import CrossEncoder
+
+                    self._model = CrossEncoder(self.model_name, device="cpu")
+                except Exception as e:
+                    logger.warning(
+                        f"Cross-encoder {self.model_name} unavailable, "
+                        f"using lexical reranking: {e}"
+                    )
+            return self._model
+
+    def __call__(self, query: str, passages: Sequence[str]) -> List[float]:
+        model = self._get_model()
+        if model is None:
+            return self.fallback(query, passages)
+        logits = model.predict([(query, passage) for passage in passages])
+        return [1.0 / (1.0 + math.exp(-float(logit))) for logit in logits]
+
+
+@dataclass
+class RerankStats:
+    scorer: str
+    candidates: int
+    duplicates: int
+    cut: int
+    kept: int
+    latency_ms: float
+
+    def summary(self) -> str:
+        return (
+            f"Reranked {self.candidates} candidates with {self.scorer} scorer "
+            f"in {self.latency_ms:.1f} ms: kept {self.kept}, dropped "
+            f"{self.duplicates} near-duplicates and {self.cut} below cutoff"
+        )
+
+
+def _shingles(text: str, size: int = 3) -> Set[Tuple[str, ...]]:
+    terms = tokenize(text)
+    if len(terms) < size:
+        return {tuple(terms)}
+    return {tuple(terms[i : i + size]) for i in range(len(terms) - size + 1)}
+
+
+class Reranker:
+    """
+    Second retrieval stage between search and the prompt.
+
+    The search stage over-fetches fetch_k candidates. The reranker scores
+    them, drops near-identical chunks (shingle Jaccard similarity at or
+    above dedupe_threshold), stops at the first candidate scoring below
+    cutoff times the best score and keeps at most top_k.
+
+    Scores blend the scorer's relevance with the search rank, weighted by
+    prior_weight, so that semantically relevant chunks without lexical
+    overlap (e.g. a Polish question over English documents) are not lost.
+    """
+
+    def __init__(
+        self,
+        scorer: Optional[Scorer] = None,
+        top_k: int = 5,
+        fetch_k: int = 20,
+        cutoff: float = 0.2,
+        dedupe_threshold: float = 0.85,
+        prior_weight: float = 0.3,
+    ):
+        self.scorer = scorer or LexicalOverlapScorer()
+        self.top_k = top_k
+        self.fetch_k = max(fetch_k, top_k)
+        self.cutoff = cutoff
+        self.dedupe_threshold = dedupe_threshold
+        self.prior_weight = prior_weight
+        self._local = threading.local()
+
+    @property
+    def last_stats(self) -> Optional[RerankStats]:
+        """Stats of the last rerank() call made by the current thread."""
+        return getattr(self._local, "stats", None)
+
+    def rerank(
+        self,
+        query: str,
+        candidates: Sequence[Any],
+        text_of: Callable[[Any], str],
+        top_k: Optional[int] = None,
+    ) -> List[Tuple[Any, float]]:
+        """
+        Rerank search results.
+
+        Args:
+            query: The user question
+            candidates: Search results in search-rank order
+            text_of: Returns the passage text of a candidate
+            top_k: Override of the number of results to keep
+
+        Returns:
+            List[Tuple[Any, float]]: (candidate, rerank score), best first
+        """
+        started = time.perf_counter()
+        top_k = top_k or self.top_k
+        texts = [text_of(candidate) for candidate in candidates]
+        relevance = self.scorer(query, texts) if texts else []
+        count = len(texts)
+        scored = sorted(
+            (
+                (
+                    (1.0 - self.prior_weight) * relevance[rank]
+                    + self.prior_weight * (1.0 - rank / count),
+                    rank,
+                )
+                for rank in range(count)
+            ),
+            reverse=True,
+        )
+
+        kept: List[Tuple[Any, float]] = []
+        kept_shingles: List[Set[Tuple[str, ...]]] = []
+        duplicates = 0
+        for score, rank in scored:
+            if len(kept) >= top_k or score < self.cutoff * scored[0][0]:
+                break
+            shingles = _shingles(texts[rank])
+            if any(
+                len(shingles & other) / len(shingles | other) >= self.dedupe_threshold
+                for other in kept_shingles
+            ):
+                duplicates += 1
+                continue
+            kept.append((candidates[rank], score))
+            kept_shingles.append(shingles)
+
+        stats = RerankStats(
+            scorer=getattr(self.scorer, "name", type(self.scorer).__name__),
+            candidates=count,
+            duplicates=duplicates,
+            cut=sum(1 for score, _ in scored if score < self.cutoff * scored[0][0]),
+            kept=len(kept),
+            latency_ms=(time.perf_counter() - started) * 1000,
+        )
+        self._local.stats = stats
+        logger.info(stats.summary())
+        return kept
+
+
+def get_default_reranker() -> Optional[Reranker]:
+    """
+    Build the reranker configured by RERANK_* environment variables, or
+    None when RERANK_SCORER=none.
+    """
+    scorer_name = os.getenv("RERANK_SCORER", "lexical")
+    if scorer_name == "none":
+        return None
+    if scorer_name == "cross-encoder":
+        scorer = CrossEncoderScorer(os.getenv("RERANK_MODEL", DEFAULT_CROSS_ENCODER))
+    else:
+        scorer = LexicalOverlapScorer()
+    return Reranker(
+        scorer=scorer,
+        top_k=int(os.getenv("RERANK_TOP_K", "5")),
+        fetch_k=int(os.getenv("RERANK_FETCH_K", "20")),
+        cutoff=float(os.getenv("RERANK_CUTOFF", "0.2")),
+        dedupe_threshold=float(os.getenv("RERANK_DEDUPE_THRESHOLD", "0.85")),
+    )
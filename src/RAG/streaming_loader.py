@@ -0,0 +1,260 @@
+import atexit
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain.schema import Document
+
+# Non-seekable uploads are spooled in memory up to this size and then rolled
+# over to an anonymous temporary file that is removed as soon as it is closed.
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+TEXT_BLOCK_SIZE = 64 * 1024
+CSV_ROWS_PER_READ = 1000
+# PDFs are parsed in page ranges across a process pool; smaller files are
+# parsed inline, where the pool's start-up and pickling cost would dominate.
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", os.cpu_count() or 1))
+
+Loader = Callable[[BinaryIO, str], Iterator[Document]]
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def ensure_seekable(stream: BinaryIO) -> BinaryIO:
+    """Return a seekable view of stream, spooling it only when necessary."""
+    if getattr(stream, "seekable", lambda: False)():
+        return stream
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    shutil.copyfileobj(stream, spooled, length=1024 * 1024)
+    spooled.seek(0)
+    return spooled
+
+
+def iter_pdf_pages(stream: BinaryIO, source: str) -> Iterator[Document]:
+    """Yield one Document per PDF page, extracting text lazily page by page."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(ensure_seekable(stream))
+    for i, page in enumerate(reader.pages):
+        yield Document(
+            page_content=page.extract_text() or "",
+            metadata={"source": source, "page": i},
+        )
+
+
+def _extract_page_range(path: str, start: int, stop: int) -> List[str]:
+    """Extract the text of pages [start, stop) of a PDF; runs in a worker."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def _get_pool(max_workers: int) -> ProcessPoolExecutor:
+    """Return the shared parsing pool, recreating it for a new worker count."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != max_workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # spawn rather than fork: the parent runs SDK and job queue threads.
+            _pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            _pool_workers = max_workers
+        return _pool
+
+
+@atexit.register
+def _shutdown_pool() -> None:
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_pdf_pages_parallel(
+    path: str,
+    source: str,
+    max_workers: Optional[int] = None,
+    pages_per_task: int = PDF_PAGES_PER_TASK,
+) -> Iterator[Document]:
+    """
+    Yield one Document per PDF page, parsing page ranges in a process pool.
+
+    Pages are yielded in order as soon as their range is parsed, with at most
+    two ranges per worker in flight, so memory stays bounded for large files.
+    """
+    from pypdf import PdfReader
+
+    max_workers = max_workers or PDF_PARSE_WORKERS
+    page_count = len(PdfReader(path).pages)
+    if max_workers <= 1 or page_count <= pages_per_task:
+        with open(path, "rb") as f:
+            yield from iter_pdf_pages(f, source)
+        return
+
+    pool = _get_pool(max_workers)
+    ranges: Iterator[Tuple[int, int]] = (
+        (start, min(start + pages_per_task, page_count))
+        for start in range(0, page_count, pages_per_task)
+    )
+    pending = deque()
+    for start, stop in ranges:
+        pending.append((start, pool.submit(_extract_page_range, path, start, stop)))
+        if len(pending) < max_workers * 2:
+            continue
+        start, future = pending.popleft()
+        yield from _page_documents(future.result(), start, source)
+    while pending:
+        start, future = pending.popleft()
+        yield from _page_documents(future.result(), start, source)
+
+
+def _page_documents(texts: List[str], start: int, source: str) -> Iterator[Document]:
+    for offset, text in enumerate(texts):
+        yield Document(
+            page_content=text, metadata={"source": source, "page": start + offset}
+        )
+
+
+def iter_text_blocks(stream: BinaryIO, source: str) -> Iterator[Document]:
+    """Yield a text file in blocks of roughly TEXT_BLOCK_SIZE, cut at line ends."""
+    reader = io.TextIOWrapper(stream, encoding="utf-8")
+    try:
+        block = []
+        size = 0
+        for line in reader:
+            block.append(line)
+            size += len(line)
+            if size >= TEXT_BLOCK_SIZE:
+                yield Document(page_content="".join(block), metadata={"source": source})
+                block = []
+                size = 0
+        if block:
+            yield Document(page_content="".join(block), metadata={"source": source})
+    finally:
+        reader.detach()
+
+
+def iter_csv_rows(stream: BinaryIO, source: str) -> Iterator[Document]:
+    """
+    Yield one Document per CSV row, reading the file in row batches.
+
+    Row texts are "column: value" lines, as produced by CSVLoader, built with
+    vectorised string operations over each batch.
+    """
+    import pandas as pd
+
+    for frame in pd.read_csv(
+        stream, chunksize=CSV_ROWS_PER_READ, dtype=str, encoding="utf-8-sig"
+    ):
+        columns = [
+            f"{str(name).strip()}: " + frame[name].fillna("").str.strip()
+            for name in frame.columns
+        ]
+        texts = columns[0].str.cat(columns[1:], sep="\n") if columns else []
+        for i, text in zip(frame.index, texts):
+            yield Document(page_content=text, metadata={"source": source, "row": i})
+
+
+def _file_path(stream: BinaryIO) -> Optional[str]:
+    """Path of the file behind stream, if it is a regular on-disk file."""
+    path = getattr(stream, "name", None)
+    if not isinstance(path, str) or not os.path.isfile(path):
+        return None
+    try:
+        stream.fileno()
+    except (AttributeError, OSError):
+        return None
+    return path
+
+
+def iter_pdf(stream: BinaryIO, source: str) -> Iterator[Document]:
+    """PDF pages, parsed across the process pool when stream is an on-disk file."""
+    path = _file_path(stream)
+    if path is not None:
+        return iter_pdf_pages_parallel(path, source)
+    return iter_pdf_pages(stream, source)
+
+
+_LOADERS: Dict[str, Loader] = {}
+_MIME_TYPES: Dict[str, str] = {}
+
+
+def register_loader(
+    extensions: Sequence[str], loader: Loader, mime_types: Sequence[str] = ()
+) -> None:
+    """
+    Register a format loader.
+
+    Args:
+        extensions: File extensions handled by the loader, e.g. [".md"]
+        loader: Called with (stream, source) and returning an iterator of
+            Documents (pages, blocks or rows) to be chunked
+        mime_types: MIME types mapped to the first extension, used when a
+            file name has no registered extension
+    """
+    extensions = [ext.lower() for ext in extensions]
+    for ext in extensions:
+        _LOADERS[ext] = loader
+    for mime_type in mime_types:
+        _MIME_TYPES[mime_type.lower()] = extensions[0]
+
+
+def supported_extensions() -> List[str]:
+    return sorted(_LOADERS)
+
+
+def resolve_filename(filename: str, mime_type: Optional[str] = None) -> str:
+    """
+    Return filename with a registered extension, appending the one registered
+    for mime_type when needed.
+
+    Raises:
+        ValueError: If neither the extension nor the MIME type is supported
+    """
+    if os.path.splitext(filename)[1].lower() in _LOADERS:
+        return filename
+    mime_type = (mime_type or "").split(";")[0].strip().lower()
+    if mime_type in _MIME_TYPES:
+        return filename + _MIME_TYPES[mime_type]
+    raise ValueError(
+        f"Unsupported file type: {filename}. "
+        f"Supported extensions: {', '.join(supported_extensions())}"
+    )
+
+
+def get_loader(filename: str, mime_type: Optional[str] = None) -> Loader:
+    """Loader for filename, falling back to its MIME type."""
+    filename = resolve_filename(filename, mime_type)
+    return _LOADERS[os.path.splitext(filename)[1].lower()]
+
+
+def iter_documents(
+    stream: BinaryIO, filename: str, mime_type: Optional[str] = None
+) -> Iterator[Document]:
+    """
+    Parse an uploaded file incrementally with its registered loader.
+
+    Args:
+        stream: Binary file-like object with the file contents.
+        filename: Original file name, used for loader dispatch and metadata.
+        mime_type: Optional MIME type, used when filename has no known extension.
+
+    Returns:
+        Iterator[Document]: Pages (PDF), text blocks (TXT) or rows (CSV).
+    """
+    return get_loader(filename, mime_type)(stream, filename)
+
+
+register_loader([".pdf"], iter_pdf, ["application/pdf"])
+register_loader([".txt"], iter_text_blocks, ["text/plain"])
+register_loader([".csv"], iter_csv_rows, ["text/csv", "application/csv"])
@@ -0,0 +1,497 @@
+import base64
+import hashlib
+import json
+import math
+import random
+import ssl
+import re
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+import numpy as np
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+
+from RAG.lexical_index import tokenize
+from RAG.local_vector_store import LocalVectorStore
+from RAG.rate_limit import QUOTA_WINDOW_SECONDS, estimate_payload_tokens
+from RAG.tokens import count_tokens
+
+# Offline stand-ins for Azure OpenAI and Azure AI Search, used by the
+# evaluation harness and benchmarks: in-process client stubs (search needs
+# none, LocalVectorStore serves the SearchClient calls), and fake HTTP
+# servers that the real SDK clients can be pointed at.
+
+STUB_EMBEDDING_DIMENSIONS = 256
+NO_ANSWER = "The answer cannot be determined from the context."
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+_QUESTION = re.compile(r"^(?:Question|Query):\s*(.+)$", re.MULTILINE)
+_CONTEXT_START = ("Context:", "Retrieved Documents:")
+_CONTEXT_END = ("Question:", "You are an AI assistant")
+
+
+def hash_embedding(
+    text: str, dimensions: int = STUB_EMBEDDING_DIMENSIONS
+) -> List[float]:
+    """
+    Deterministic bag-of-words embedding: each stemmed term is hashed to a
+    dimension and sign, so texts sharing terms have a high cosine similarity.
+    """
+    vector = [0.0] * dimensions
+    for term in tokenize(text):
+        digest = hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        vector[value % dimensions] += 1.0 if value >> 63 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector))
+    if not norm:
+        vector[0] = 1.0
+        return vector
+    return [v / norm for v in vector]
+
+
+def extractive_answer(prompt: str, max_sentences: int = 3) -> str:
+    """
+    Answer a RAG prompt with the context sentences sharing the most terms
+    with its question, in context order.
+    """
+    questions = _QUESTION.findall(prompt)
+    query_terms = set(tokenize(questions[-1])) if questions else set()
+
+    start = max(
+        (prompt.find(m) + len(m) for m in _CONTEXT_START if m in prompt), default=0
+    )
+    ends = [prompt.find(m, start) for m in _CONTEXT_END]
+    end = min((e for e in ends if e != -1), default=len(prompt))
+
+    sentences = [s.strip() for s in _SENTENCE_END.split(prompt[start:end])]
+    scored = []
+    for position, sentence in enumerate(sentences):
+        overlap = len(query_terms & set(tokenize(sentence)))
+        if overlap:
+            scored.append((overlap, -position, sentence))
+    best = sorted(scored, reverse=True)[:max_sentences]
+    if not best:
+        return NO_ANSWER
+    return " ".join(sentence for _, _, sentence in sorted(best, key=lambda s: -s[1]))
+
+
+class StubEmbeddings(Embeddings):
+    """LangChain embeddings returning hash_embedding vectors."""
+
+    def __init__(self, dimensions: int = STUB_EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [hash_embedding(text, self.dimensions) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return hash_embedding(text, self.dimensions)
+
+
+class StubLLM(LLM):
+    """LangChain LLM answering with extractive_answer, after an optional delay."""
+
+    latency_seconds: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        return extractive_answer(prompt)
+
+
+class _FakeRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without TCP_NODELAY a reused
+    # connection waits for the client's delayed ACK (~40 ms) on every response.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def setup(self) -> None:
+        super().setup()
+        fake: FakeServer = self.server.fake
+        with fake._lock:
+            fake.connections += 1
+
+    def _handle(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            body = json.loads(raw) if raw else {}
+        except json.JSONDecodeError:
+            body = {}
+        fake: FakeServer = self.server.fake
+        status, content_type, payload, headers = fake.dispatch(
+            self.command, unquote(urlsplit(self.path).path), body
+        )
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = _handle
+    do_POST = _handle
+
+
+class FakeServer(ABC):
+    """
+    Deterministic HTTP fake running on a local port in a background thread.
+
+    Every request waits latency_ms plus a seeded uniform jitter of up to
+    jitter_ms before it is answered. Recorded responses, when given, are
+    replayed round-robin instead of synthetic ones. With certfile and
+    keyfile the server speaks HTTPS, so connection reuse saves a real TLS
+    handshake.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        seed: int = 0,
+        recordings: Optional[Dict[str, List[Any]]] = None,
+        certfile: Optional[str] = None,
+        keyfile: Optional[str] = None,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.recordings = recordings or {}
+        self.certfile = certfile
+        self.keyfile = keyfile
+        self.requests: Counter = Counter()
+        self.connections = 0
+        self._random = random.Random(seed)
+        self._replayed: Counter = Counter()
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"{'https' if self.certfile else 'http'}://{host}:{port}"
+
+    def start(self) -> "FakeServer":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeRequestHandler)
+        self._server.daemon_threads = True
+        if self.certfile:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(self.certfile, self.keyfile)
+            # Handshake in the handler thread rather than in accept()
+            self._server.socket = context.wrap_socket(
+                self._server.socket, server_side=True, do_handshake_on_connect=False
+            )
+        self._server.fake = self
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name=type(self).__name__, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "FakeServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _delay(self) -> None:
+        with self._lock:
+            jitter = self._random.uniform(0, self.jitter_ms) if self.jitter_ms else 0
+        delay = (self.latency_ms + jitter) / 1000
+        if delay:
+            time.sleep(delay)
+
+    def _replay(self, kind: str) -> Optional[Any]:
+        recorded = self.recordings.get(kind)
+        if not recorded:
+            return None
+        with self._lock:
+            index = self._replayed[kind] % len(recorded)
+            self._replayed[kind] += 1
+        return recorded[index]
+
+    def dispatch(
+        self, method: str, path: str, body: Any
+    ) -> Tuple[int, str, bytes, Dict[str, str]]:
+        route, response = self.route(method, path, body)
+        with self._lock:
+            self.requests[route] += 1
+        if route != "throttled":
+            # Throttled requests are rejected before reaching the model
+            self._delay()
+        if isinstance(response, bytes):
+            return 200, "text/event-stream", response, {}
+        status, payload, *headers = response
+        return (
+            status,
+            "application/json",
+            json.dumps(payload).encode("utf-8"),
+            headers[0] if headers else {},
+        )
+
+    @abstractmethod
+    def route(self, method: str, path: str, body: Any) -> Tuple[str, Any]:
+        """
+        Answer a request as (kind, response): kind is the name it is
+        counted under in self.requests; response is (status, payload) or
+        (status, payload, headers), or bytes for an event stream.
+        """
+
+
+class FakeOpenAIServer(FakeServer):
+    """
+    Fake Azure OpenAI serving embeddings (hash_embedding vectors, also in
+    base64) and chat completions (extractive_answer, or the "completions"
+    recordings), including streamed completions.
+
+    With tokens_per_minute it enforces a token quota the way Azure OpenAI
+    does: requests are charged their estimated tokens against a bucket
+    holding QUOTA_WINDOW_SECONDS of the quota, and answered 429 with retry-after-ms when it
+    runs dry. Responses carry x-ratelimit-remaining-tokens.
+    """
+
+    def __init__(
+        self,
+        dimensions: int = STUB_EMBEDDING_DIMENSIONS,
+        tokens_per_minute: int = 0,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.dimensions = dimensions
+        self.tokens_per_minute = tokens_per_minute
+        self._burst = tokens_per_minute * QUOTA_WINDOW_SECONDS / 60
+        self._quota = self._burst
+        self._quota_refilled = time.monotonic()
+
+    def route(self, method: str, path: str, body: Any) -> Tuple[str, Any]:
+        if not path.endswith(("/embeddings", "/chat/completions")):
+            return "unknown", (404, {"error": {"message": f"No route for {path}"}})
+        headers = {}
+        if self.tokens_per_minute:
+            retry_after, remaining = self._charge(estimate_payload_tokens(body))
+            headers["x-ratelimit-remaining-tokens"] = str(int(remaining))
+            if retry_after:
+                headers["retry-after-ms"] = str(math.ceil(retry_after * 1000))
+                message = "Requests have exceeded the token rate limit."
+                return "throttled", (
+                    429,
+                    {"error": {"code": "429", "message": message}},
+                    headers,
+                )
+        if path.endswith("/embeddings"):
+            return "embeddings", (200, self._embeddings(body), headers)
+        response = self._chat(body)
+        if isinstance(response, tuple):
+            response = (*response, headers)
+        return "chat", response
+
+    def _charge(self, tokens: int) -> Tuple[float, float]:
+        """Charge tokens to the quota; return (retry after, remaining)."""
+        with self._lock:
+            now = time.monotonic()
+            self._quota = min(
+                self._burst,
+                self._quota
+                + (now - self._quota_refilled) * self.tokens_per_minute / 60,
+            )
+            self._quota_refilled = now
+            tokens = min(tokens, self._burst)
+            if self._quota < tokens:
+                return (tokens - self._quota) * 60 / self.tokens_per_minute, 0.0
+            self._quota -= tokens
+            return 0.0, self._quota
+
+    def _embeddings(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        inputs = body.get("input", [])
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        texts = [t if isinstance(t, str) else " ".join(map(str, t)) for t in inputs]
+        data = []
+        for i, text in enumerate(texts):
+            vector = hash_embedding(text, self.dimensions)
+            if body.get("encoding_format") == "base64":
+                vector = base64.b64encode(
+                    np.asarray(vector, dtype=np.float32).tobytes()
+                ).decode("ascii")
+            data.append({"object": "embedding", "index": i, "embedding": vector})
+        tokens = sum(count_tokens(text) for text in texts)
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "fake-embedding"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    def _chat(self, body: Dict[str, Any]) -> Any:
+        prompt = "\n".join(
+            m.get("content") or ""
+            for m in body.get("messages", [])
+            if isinstance(m.get("content"), str)
+        )
+        answer = self._replay("completions") or extractive_answer(prompt)
+        prompt_tokens, completion_tokens = count_tokens(prompt), count_tokens(answer)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        base = {
+            "id": "chatcmpl-fake",
+            "created": int(time.time()),
+            "model": body.get("model", "fake-chat"),
+        }
+        if not body.get("stream"):
+            return 200, {
+                **base,
+                "object": "chat.completion",
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": answer},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": usage,
+            }
+
+        events = []
+        for i, word in enumerate(answer.split(" ")):
+            delta = {"content": word if i == 0 else " " + word}
+            if i == 0:
+                delta["role"] = "assistant"
+            choice = {"index": 0, "delta": delta, "finish_reason": None}
+            events.append(
+                {**base, "object": "chat.completion.chunk", "choices": [choice]}
+            )
+        events.append(
+            {
+                **base,
+                "object": "chat.completion.chunk",
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            }
+        )
+        stream = "".join(f"data: {json.dumps(event)}\n\n" for event in events)
+        return (stream + "data: [DONE]\n\n").encode("utf-8")
+
+
+class FakeSearchServer(FakeServer):
+    """
+    Fake Azure AI Search index backed by a temporary LocalVectorStore.
+
+    Serves the index definition, document uploads and deletes, the document
+    count and hybrid searches (or the "search_results" recordings).
+    """
+
+    def __init__(
+        self,
+        index_name: str = "fake-index",
+        dimensions: int = STUB_EMBEDDING_DIMENSIONS,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.index_name = index_name
+        self.dimensions = dimensions
+        self._directory = tempfile.TemporaryDirectory()
+        self.store = LocalVectorStore(self._directory.name)
+
+    def stop(self) -> None:
+        super().stop()
+        self.store.close()
+        self._directory.cleanup()
+
+    def route(self, method: str, path: str, body: Any) -> Tuple[str, Any]:
+        prefix = f"/indexes('{self.index_name}')"
+        if not path.startswith(prefix):
+            return "unknown", (404, {"error": {"message": f"No index at {path}"}})
+        path = path[len(prefix) :]
+        if path in ("", "/") and method == "GET":
+            return "index", (200, self._index_definition())
+        if path == "/docs/search.post.search":
+            return "search", (200, {"value": self._search(body)})
+        if path == "/docs/search.index":
+            return "upload", (200, {"value": self._index(body.get("value", []))})
+        if path == "/docs/$count":
+            return "count", (200, self.store.get_document_count())
+        return "unknown", (404, {"error": {"message": f"No route for {path}"}})
+
+    def _index_definition(self) -> Dict[str, Any]:
+        string_fields = ["content", "title", "url", "filepath", "meta_json_string"]
+        return {
+            "name": self.index_name,
+            "fields": [
+                {"name": "id", "type": "Edm.String", "key": True},
+                *({"name": name, "type": "Edm.String"} for name in string_fields),
+                {
+                    "name": self.store.vector_field,
+                    "type": "Collection(Edm.Single)",
+                    "searchable": True,
+                    "dimensions": self.dimensions,
+                    "vectorSearchProfile": "myHnswProfile",
+                },
+            ],
+        }
+
+    def _search(self, body: Dict[str, Any]) -> List[Dict[str, Any]]:
+        recorded = self._replay("search_results")
+        if recorded is not None:
+            return recorded
+        top = int(body.get("top") or 50)
+        vectors = [q["vector"] for q in body.get("vectorQueries", []) if "vector" in q]
+        hits = self.store.hybrid_search(body.get("search"), vectors, top)
+        select = body.get("select")
+        keep = set(select.split(",")) | {"@search.score"} if select else None
+        return [
+            {k: v for k, v in hit.items() if keep is None or k in keep} for hit in hits
+        ]
+
+    def _index(self, actions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        upserts, deletes = [], []
+        for action in actions:
+            document = {k: v for k, v in action.items() if k != "@search.action"}
+            if action.get("@search.action") == "delete":
+                deletes.append(document)
+            else:
+                upserts.append(document)
+        results = []
+        if upserts:
+            results += self.store.merge_or_upload_documents(upserts)
+        if deletes:
+            results += self.store.delete_documents(deletes)
+        return [
+            {
+                "key": r.key,
+                "status": r.succeeded,
+                "errorMessage": r.error_message,
+                "statusCode": r.status_code,
+            }
+            for r in results
+        ]
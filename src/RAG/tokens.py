@@ -0,0 +1,82 @@
+import logging
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# gpt-4o and text-embedding-3 models both use the o200k/cl100k family; the
+# fallback keeps token counting available when tiktoken or its encoding files
+# cannot be loaded (e.g. in an air-gapped environment).
+ENCODING_NAME = "o200k_base"
+CHARS_PER_TOKEN = 4
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding() -> Optional[object]:
+    """Load the tiktoken encoding once, returning None if it is unavailable."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding(ENCODING_NAME)
+        except Exception as e:
+            logger.warning(f"tiktoken unavailable, estimating token counts: {e}")
+            _encoding = None
+    return _encoding
+
+
+def tokenizer_available() -> bool:
+    """Whether token counts are exact rather than estimated."""
+    return _get_encoding() is not None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count tokens in the given text.
+
+    Uses tiktoken when available and falls back to a characters-per-token
+    estimate otherwise.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cut text to at most max_tokens tokens, preferring a whitespace boundary.
+    """
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        truncated = encoding.decode(tokens[:max_tokens])
+    else:
+        if len(text) <= max_tokens * CHARS_PER_TOKEN:
+            return text
+        truncated = text[: max_tokens * CHARS_PER_TOKEN]
+    boundary = truncated.rfind(" ")
+    return truncated[:boundary] if boundary > len(truncated) // 2 else truncated
+
+
+def token_offsets(text: str) -> Optional[List[int]]:
+    """
+    Character offset at which each token of text starts, or None when
+    tiktoken is unavailable.
+    """
+    encoding = _get_encoding()
+    if encoding is None:
+        return None
+    _, offsets = encoding.decode_with_offsets(
+        encoding.encode(text, disallowed_special=())
+    )
+    return offsets
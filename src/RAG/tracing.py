@@ -0,0 +1,477 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import urllib.request
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the stage latency histogram buckets.
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+# Numeric span attributes summed into counters: token counts and cache results.
+COUNTER_SUFFIXES = ("_tokens", "_hit", "_hits", "_misses")
+DEFAULT_OTLP_ENDPOINT = "http://localhost:4318"
+
+
+@dataclass
+class Span:
+    """A timed pipeline stage with attributes such as token counts."""
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    start_time: float = field(default_factory=time.time)
+    end_time: Optional[float] = None
+    duration_ms: float = 0.0
+    error: Optional[str] = None
+    _started: float = field(default_factory=time.perf_counter, repr=False)
+
+    recording = True
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def add(self, key: str, amount: float = 1) -> None:
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Stand-in for a span outside of a trace, or when tracing is disabled."""
+
+    recording = False
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    def add(self, key: str, amount: float = 1) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Exporter(ABC):
+    """Receives the spans of every finished trace, root span last."""
+
+    @abstractmethod
+    def export(self, spans: List[Span]) -> None:
+        pass
+
+    def shutdown(self) -> None:
+        pass
+
+
+class LogExporter(Exporter):
+    """
+    Log one line per trace with the duration of each stage, and the full
+    spans at DEBUG level.
+    """
+
+    def export(self, spans: List[Span]) -> None:
+        root = spans[-1]
+        stages = ", ".join(
+            f"{span.name} {span.duration_ms:.1f} ms"
+            for span in sorted(spans[:-1], key=lambda s: s.start_time)
+        )
+        logger.info(
+            f"Trace {root.trace_id[:8]} {root.name}: {root.duration_ms:.1f} ms"
+            + (f" ({stages})" if stages else "")
+        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(json.dumps([span.to_dict() for span in spans], default=str))
+
+
+class PrometheusExporter(Exporter):
+    """
+    Aggregate spans into metrics rendered in the Prometheus text format:
+    a latency histogram per stage, error counts, and counters of token and
+    cache attributes (see COUNTER_SUFFIXES).
+    """
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, List[float]] = {}
+        self._counters: Dict[tuple, float] = {}
+        self._errors: Dict[str, int] = {}
+
+    def export(self, spans: List[Span]) -> None:
+        with self._lock:
+            for span in spans:
+                # Bucket counts, then sum and count
+                histogram = self._histograms.setdefault(
+                    span.name, [0] * (len(self.buckets) + 2)
+                )
+                for i, bound in enumerate(self.buckets):
+                    if span.duration_ms <= bound:
+                        histogram[i] += 1
+                histogram[-2] += span.duration_ms
+                histogram[-1] += 1
+                if span.error:
+                    self._errors[span.name] = self._errors.get(span.name, 0) + 1
+                for key, value in span.attributes.items():
+                    if key.endswith(COUNTER_SUFFIXES) and isinstance(
+                        value, (int, float)
+                    ):
+                        counter = (span.name, key)
+                        self._counters[counter] = self._counters.get(counter, 0) + value
+
+    def render(self) -> str:
+        lines = [
+            "# HELP rag_stage_duration_milliseconds Duration of RAG pipeline stages.",
+            "# TYPE rag_stage_duration_milliseconds histogram",
+        ]
+        with self._lock:
+            for name, histogram in sorted(self._histograms.items()):
+                for bound, count in zip(self.buckets, histogram):
+                    lines.append(
+                        f'rag_stage_duration_milliseconds_bucket{{stage="{name}",'
+                        f'le="{bound:g}"}} {count}'
+                    )
+                lines += [
+                    f'rag_stage_duration_milliseconds_bucket{{stage="{name}",'
+                    f'le="+Inf"}} {histogram[-1]}',
+                    f'rag_stage_duration_milliseconds_sum{{stage="{name}"}} '
+                    f"{histogram[-2]:.3f}",
+                    f'rag_stage_duration_milliseconds_count{{stage="{name}"}} '
+                    f"{histogram[-1]}",
+                ]
+            lines += [
+                "# HELP rag_stage_errors_total Failed RAG pipeline stages.",
+                "# TYPE rag_stage_errors_total counter",
+            ]
+            for name, count in sorted(self._errors.items()):
+                lines.append(f'rag_stage_errors_total{{stage="{name}"}} {count}')
+            lines += [
+                "# HELP rag_stage_attribute_total Token counts and cache results "
+                "of RAG pipeline stages.",
+                "# TYPE rag_stage_attribute_total counter",
+            ]
+            for (name, key), value in sorted(self._counters.items()):
+                lines.append(
+                    f'rag_stage_attribute_total{{stage="{name}",attribute="{key}"}} '
+                    f"{value:g}"
+                )
+        return "\n".join(lines) + "\n"
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OTLPExporter(Exporter):
+    """
+    Send spans to an OpenTelemetry collector over OTLP/HTTP with JSON
+    encoding. Spans are queued and posted in batches by a background thread,
+    so a slow or missing collector never delays a request; spans are dropped
+    when the queue is full.
+    """
+
+    def __init__(
+        self,
+        endpoint: str = DEFAULT_OTLP_ENDPOINT,
+        service_name: str = "rag",
+        max_queue_size: int = 2048,
+        max_batch_size: int = 512,
+        timeout: float = 5.0,
+    ):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.max_batch_size = max_batch_size
+        self.timeout = timeout
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(max_queue_size)
+        self._worker = threading.Thread(
+            target=self._run, name="otlp-exporter", daemon=True
+        )
+        self._worker.start()
+
+    @classmethod
+    def from_env(cls) -> "OTLPExporter":
+        return cls(
+            endpoint=os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", DEFAULT_OTLP_ENDPOINT),
+            service_name=os.getenv("OTEL_SERVICE_NAME", "rag"),
+        )
+
+    def export(self, spans: List[Span]) -> None:
+        for span in spans:
+            try:
+                self._queue.put_nowait(span)
+            except queue.Full:
+                self.dropped += 1
+
+    def _payload(self, spans: List[Span]) -> Dict[str, Any]:
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {
+                                "key": "service.name",
+                                "value": {"stringValue": self.service_name},
+                            }
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "RAG"},
+                            "spans": [
+                                {
+                                    "traceId": span.trace_id,
+                                    "spanId": span.span_id,
+                                    "parentSpanId": span.parent_id or "",
+                                    "name": span.name,
+                                    "kind": 1,
+                                    "startTimeUnixNano": str(
+                                        int(span.start_time * 1e9)
+                                    ),
+                                    "endTimeUnixNano": str(int(span.end_time * 1e9)),
+                                    "attributes": [
+                                        {"key": key, "value": _otlp_value(value)}
+                                        for key, value in span.attributes.items()
+                                    ],
+                                    "status": (
+                                        {"code": 2, "message": span.error}
+                                        if span.error
+                                        else {"code": 1}
+                                    ),
+                                }
+                                for span in spans
+                            ],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    def _post(self, spans: List[Span]) -> None:
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(self._payload(spans), default=str).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout):
+                pass
+        except Exception as e:
+            logger.warning(f"Could not export {len(spans)} spans to {self.url}: {e}")
+
+    def _run(self) -> None:
+        while True:
+            span = self._queue.get()
+            if span is None:
+                return
+            batch = [span]
+            while len(batch) < self.max_batch_size:
+                try:
+                    span = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if span is None:
+                    self._post(batch)
+                    return
+                batch.append(span)
+            self._post(batch)
+
+    def shutdown(self) -> None:
+        self._queue.put(None)
+        self._worker.join(timeout=self.timeout)
+
+
+class Tracer:
+    """
+    Create spans around pipeline stages and hand finished traces to the
+    exporters.
+
+    The current span is tracked in a context variable, so spans nest across
+    function calls, threads started with a copied context and asyncio tasks.
+    Stages only record spans inside a trace started with root=True; without
+    exporters every span is a no-op. A span ending after the root of its
+    trace is dropped, as the trace has already been exported.
+    """
+
+    def __init__(self, exporters: Sequence[Exporter] = ()):
+        self.exporters = list(exporters)
+        self._current: ContextVar[Optional[Span]] = ContextVar(
+            f"rag_span_{id(self)}", default=None
+        )
+        self._lock = threading.Lock()
+        # Finished spans of the traces whose root is still open
+        self._finished: Dict[str, List[Span]] = {}
+
+    @property
+    def current_span(self) -> Optional[Span]:
+        return self._current.get()
+
+    def start_span(
+        self,
+        name: str,
+        parent: Optional[Span] = None,
+        root: bool = False,
+        **attributes: Any,
+    ):
+        """
+        Start a span without making it current; end it with end_span.
+
+        Args:
+            name: Stage name, e.g. "embed" or "llm"
+            parent: Parent span, by default the current span
+            root: Start a new trace when there is no parent
+            **attributes: Initial span attributes
+
+        Returns:
+            Span: The started span, or NOOP_SPAN when nothing is recorded
+        """
+        parent = parent or self._current.get()
+        if not self.exporters or (parent is None and not root):
+            return NOOP_SPAN
+        span = Span(
+            name=name,
+            trace_id=parent.trace_id if parent else os.urandom(16).hex(),
+            span_id=os.urandom(8).hex(),
+            parent_id=parent.span_id if parent else None,
+            attributes=attributes,
+        )
+        if parent is None:
+            with self._lock:
+                self._finished[span.trace_id] = []
+        return span
+
+    def end_span(self, span, error: Optional[BaseException] = None) -> None:
+        """End a span; ending the root span exports its trace."""
+        if not span.recording:
+            return
+        span.end_time = time.time()
+        span.duration_ms = (time.perf_counter() - span._started) * 1000
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"
+        with self._lock:
+            spans = self._finished.get(span.trace_id)
+            if spans is None:
+                logger.debug(
+                    f"Dropped span {span.name} ending after trace "
+                    f"{span.trace_id[:8]} was exported"
+                )
+                return
+            spans.append(span)
+            if span.parent_id is not None:
+                return
+            del self._finished[span.trace_id]
+        for exporter in self.exporters:
+            try:
+                exporter.export(spans)
+            except Exception as e:
+                logger.warning(f"{type(exporter).__name__} failed: {e}")
+
+    @contextmanager
+    def activate(self, span) -> Iterator[Any]:
+        """Make span the current span for the block, without ending it."""
+        if not span.recording:
+            yield span
+            return
+        token = self._current.set(span)
+        try:
+            yield span
+        finally:
+            self._current.reset(token)
+
+    @contextmanager
+    def span(self, name: str, root: bool = False, **attributes: Any) -> Iterator[Any]:
+        """
+        Time the block as a child of the current span, or as the root of a
+        new trace when root=True. Exceptions are recorded on the span.
+        """
+        span = self.start_span(name, root=root, **attributes)
+        if not span.recording:
+            yield span
+            return
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            self._current.reset(token)
+            self.end_span(span, e)
+            raise
+        self._current.reset(token)
+        self.end_span(span)
+
+    def render_metrics(self) -> Optional[str]:
+        """Prometheus text of the first PrometheusExporter, if one is configured."""
+        for exporter in self.exporters:
+            if isinstance(exporter, PrometheusExporter):
+                return exporter.render()
+        return None
+
+    def shutdown(self) -> None:
+        for exporter in self.exporters:
+            exporter.shutdown()
+
+
+EXPORTERS: Dict[str, Callable[[], Exporter]] = {
+    "log": LogExporter,
+    "prometheus": PrometheusExporter,
+    "otlp": OTLPExporter.from_env,
+}
+
+
+def register_exporter(name: str, factory: Callable[[], Exporter]) -> None:
+    """Make an exporter available to TRACE_EXPORTERS under name."""
+    EXPORTERS[name.lower()] = factory
+
+
+_default_tracer: Optional[Tracer] = None
+_default_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """
+    Return the process-wide tracer, with the exporters listed in the
+    comma-separated TRACE_EXPORTERS variable (log, prometheus, otlp or a
+    registered name; "none" disables tracing). Defaults to log.
+    """
+    global _default_tracer
+    if _default_tracer is not None:
+        return _default_tracer
+    with _default_tracer_lock:
+        if _default_tracer is None:
+            names = [
+                name.strip().lower()
+                for name in os.getenv("TRACE_EXPORTERS", "log").split(",")
+                if name.strip() and name.strip().lower() != "none"
+            ]
+            exporters = []
+            for name in names:
+                if name not in EXPORTERS:
+                    logger.warning(f"Unknown trace exporter {name!r}, ignoring it")
+                    continue
+                exporters.append(EXPORTERS[name]())
+            _default_tracer = Tracer(exporters)
+        return _default_tracer
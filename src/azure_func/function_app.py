@@ -1,42 +1,98 @@
 import azure.functions as func
+from azurefunctions.extensions.http.fastapi import (
+    JSONResponse,
+    PlainTextResponse,
+    Request,
+    Response,
+    StreamingResponse,
+)
+import asyncio
 import logging
 import json
 import os
 import sys
+import time
 from pathlib import Path
+from typing import AsyncIterator, Iterator
 
 root_dir = Path(__file__).parent.parent
 sys.path.append(str(root_dir))
 
+from RAG.ai_search_async import answer_question_async, answer_questions_async
 from RAG.ai_search_langchain import RAGSystem
+from RAG.ingest_jobs import DEFAULT_JOBS_PATH, IngestJobQueue, UploadTooLargeError
+from RAG.streaming_loader import resolve_filename
+from RAG.tracing import get_tracer
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
 
 
+# Largest number of questions accepted by one ask_rag_batch request.
+MAX_BATCH_QUERIES = int(os.getenv("ASK_BATCH_MAX_QUERIES", "500"))
+# Largest file accepted by upload_file, in bytes.
+MAX_UPLOAD_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(200 * 1024 * 1024)))
+
+# Importing the FastAPI extension switches the whole app to HTTP streams
+# (HTTP v2), so every route takes a Request and returns a Response.
 app = func.FunctionApp(http_auth_level=func.AuthLevel.ANONYMOUS)
 
 
 rag_system = RAGSystem()
 
 
+def run_ingest_job(path: str, file_name: str, on_progress) -> int:
+    with open(path, "rb") as f:
+        return rag_system.load_documents_from_stream(f, file_name, on_progress)
+
+
+ingest_jobs = IngestJobQueue(
+    run_job=run_ingest_job,
+    spool_dir=str(Path(__file__).parent / "temp_uploads"),
+    db_path=os.getenv("INGEST_JOBS_PATH", DEFAULT_JOBS_PATH),
+    max_concurrent_jobs=int(os.getenv("INGEST_MAX_CONCURRENT_JOBS", "1")),
+)
+
+
+def iterate_from_thread(
+    stream: AsyncIterator[bytes], loop: asyncio.AbstractEventLoop
+) -> Iterator[bytes]:
+    """Iterate an async byte stream of the event loop from a worker thread."""
+    while True:
+        try:
+            yield asyncio.run_coroutine_threadsafe(stream.__anext__(), loop).result()
+        except StopAsyncIteration:
+            return
+
+
+async def read_json_object(req: Request) -> dict:
+    """Parse the request body, raising ValueError unless it is a JSON object."""
+    body = await req.json()
+    if not isinstance(body, dict):
+        raise ValueError("Request body must be a JSON object")
+    return body
+
+
 @app.route(route="ask_rag", methods=["POST"])
-def ask_rag(req: func.HttpRequest) -> func.HttpResponse:
+async def ask_rag(req: Request) -> Response:
     logging.info("RAG query function processed a request.")
 
     try:
-        req_body = req.get_json()
+        req_body = await read_json_object(req)
         query = req_body.get("query")
 
         if not query:
-            return func.HttpResponse(
+            return PlainTextResponse(
                 "Please provide a 'query' in the request body.", status_code=400
             )
 
-        result = rag_system.ask_question(query)
+        # The chain is synchronous; keep the event loop free for other requests
+        result = await asyncio.to_thread(rag_system.ask_question, query)
 
-        logging.info(f"RAG result: {json.dumps(result, indent=2)}")
+        # The full payloads are only serialized when debugging
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(f"RAG result: {json.dumps(result, indent=2)}")
 
         sources = result.get("sources", [])
         if not isinstance(sources, list):
@@ -49,129 +105,342 @@ def ask_rag(req: func.HttpRequest) -> func.HttpResponse:
             "sources": sources,
         }
 
-        # Log the final response
-        logging.info(f"Sending response: {json.dumps(response_data, indent=2)}")
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(f"Sending response: {json.dumps(response_data, indent=2)}")
 
-        return func.HttpResponse(
-            json.dumps(response_data), mimetype="application/json", status_code=200
-        )
+        return JSONResponse(response_data, status_code=200)
 
     except ValueError as e:
-        return func.HttpResponse(
-            json.dumps(
-                {
-                    "status": "error",
-                    "message": "Invalid JSON in request body",
-                    "error": str(e),
-                }
-            ),
+        return JSONResponse(
+            {
+                "status": "error",
+                "message": "Invalid JSON in request body",
+                "error": str(e),
+            },
             status_code=400,
-            mimetype="application/json",
         )
     except Exception as e:
         logging.error(f"Error processing RAG query: {str(e)}")
-        return func.HttpResponse(
-            json.dumps(
-                {"status": "error", "message": "Internal server error", "error": str(e)}
-            ),
+        return JSONResponse(
+            {"status": "error", "message": "Internal server error", "error": str(e)},
+            status_code=500,
+        )
+
+
+@app.route(route="ask_rag_stream", methods=["POST"])
+async def ask_rag_stream(req: Request) -> StreamingResponse:
+    """Stream the answer as server-sent events: tokens, then sources."""
+    logging.info("Streaming RAG query function processed a request.")
+
+    try:
+        req_body = await read_json_object(req)
+    except ValueError as e:
+        return JSONResponse(
+            {
+                "status": "error",
+                "message": "Invalid JSON in request body",
+                "error": str(e),
+            },
+            status_code=400,
+        )
+
+    query = req_body.get("query")
+    if not query:
+        return JSONResponse(
+            {
+                "status": "error",
+                "message": "Please provide a 'query' in the request body.",
+            },
+            status_code=400,
+        )
+
+    def events():
+        try:
+            for event in rag_system.stream_question(query):
+                if event["type"] == "done":
+                    logging.info(
+                        f"Streamed answer: ttft {event['ttft_ms']} ms, "
+                        f"total {event['total_ms']} ms"
+                    )
+                yield f"data: {json.dumps(event)}\n\n"
+        except Exception as e:
+            logging.error(f"Error streaming RAG answer: {str(e)}")
+            yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.route(route="ask_search", methods=["POST"])
+async def ask_search(req: Request) -> Response:
+    """
+    Answer a question on the asyncio query path, optionally fanning out over
+    several reformulations of the question.
+    """
+    logging.info("Async search query function processed a request.")
+
+    try:
+        req_body = await read_json_object(req)
+    except ValueError as e:
+        return JSONResponse(
+            {
+                "status": "error",
+                "message": "Invalid JSON in request body",
+                "error": str(e),
+            },
+            status_code=400,
+        )
+
+    query = req_body.get("query")
+    if not query:
+        return PlainTextResponse(
+            "Please provide a 'query' in the request body.", status_code=400
+        )
+
+    try:
+        top_k = int(req_body.get("top_k", 5))
+        reformulations = int(req_body.get("reformulations", 0))
+    except (TypeError, ValueError):
+        return PlainTextResponse(
+            "'top_k' and 'reformulations' must be integers.", status_code=400
+        )
+
+    try:
+        result = await answer_question_async(
+            query, top_k=top_k, reformulations=reformulations
+        )
+    except Exception as e:
+        logging.error(f"Error processing async search query: {str(e)}")
+        return JSONResponse(
+            {"status": "error", "message": "Internal server error", "error": str(e)},
             status_code=500,
-            mimetype="application/json",
         )
 
+    return JSONResponse({"status": "success", "query": query, **result})
+
+
+@app.route(route="ask_rag_batch", methods=["POST"])
+async def ask_rag_batch(req: Request) -> StreamingResponse:
+    """
+    Answer a list of questions, streaming one JSON line per question as it
+    finishes (or in input order with "ordered": true), then a summary line.
+    """
+    logging.info("Batch RAG query function processed a request.")
+
+    try:
+        req_body = await read_json_object(req)
+    except ValueError as e:
+        return JSONResponse(
+            {
+                "status": "error",
+                "message": "Invalid JSON in request body",
+                "error": str(e),
+            },
+            status_code=400,
+        )
+
+    queries = req_body.get("queries")
+    if not isinstance(queries, list) or not queries:
+        return JSONResponse(
+            {
+                "status": "error",
+                "message": "Please provide a non-empty 'queries' list in the request body.",
+            },
+            status_code=400,
+        )
+    if len(queries) > MAX_BATCH_QUERIES:
+        return JSONResponse(
+            {
+                "status": "error",
+                "message": f"At most {MAX_BATCH_QUERIES} queries per request.",
+            },
+            status_code=413,
+        )
+
+    try:
+        top_k = int(req_body.get("top_k", 5))
+        reformulations = int(req_body.get("reformulations", 0))
+    except (TypeError, ValueError):
+        return JSONResponse(
+            {
+                "status": "error",
+                "message": "'top_k' and 'reformulations' must be integers.",
+            },
+            status_code=400,
+        )
+    ordered = req_body.get("ordered", False)
+    if not isinstance(ordered, bool):
+        return JSONResponse(
+            {
+                "status": "error",
+                "message": "'ordered' must be a boolean.",
+            },
+            status_code=400,
+        )
+
+    async def lines():
+        started = time.perf_counter()
+        errors = 0
+        try:
+            async for result in answer_questions_async(
+                queries,
+                top_k=top_k,
+                reformulations=reformulations,
+                ordered=ordered,
+            ):
+                errors += result["status"] == "error"
+                yield json.dumps({"type": "result", **result}) + "\n"
+        except Exception as e:
+            logging.error(f"Error processing RAG batch: {str(e)}")
+            yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+            return
+        total_ms = round((time.perf_counter() - started) * 1000, 1)
+        logging.info(
+            f"Answered batch of {len(queries)} queries in {total_ms} ms, "
+            f"{errors} errors"
+        )
+        yield json.dumps(
+            {
+                "type": "done",
+                "count": len(queries),
+                "errors": errors,
+                "total_ms": total_ms,
+            }
+        ) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 
 # @app.route(route="rag-interface", methods=["GET"])
-# def serve_interface(req: func.HttpRequest) -> func.HttpResponse:
+# async def serve_interface(req: Request) -> Response:
 #     try:
 #         html_path = Path(__file__).parent / "static" / "index.html"
 #         with open(html_path, "r", encoding="utf-8") as file:
 #             content = file.read()
-#         return func.HttpResponse(body=content, mimetype="text/html", status_code=200)
+#         return Response(content, media_type="text/html", status_code=200)
 #     except Exception as e:
 #         logging.error(f"Error serving interface: {str(e)}")
-#         return func.HttpResponse("Error serving interface", status_code=500)
+#         return PlainTextResponse("Error serving interface", status_code=500)
 
 
 @app.route(route="upload_file", methods=["POST"])
-def upload_file(req: func.HttpRequest) -> func.HttpResponse:
+async def upload_file(req: Request) -> Response:
     logging.info("File upload function processed a request.")
 
     try:
-        # Get the file from the request
-        file_data = req.get_body()
-        file_name = req.params.get("filename")
-
-        if not file_data or not file_name:
-            return func.HttpResponse(
-                json.dumps(
-                    {"status": "error", "message": "No file or filename provided"}
-                ),
+        file_name = req.query_params.get("filename")
+        if not file_name:
+            return JSONResponse(
+                {"status": "error", "message": "No file or filename provided"},
                 status_code=400,
-                mimetype="application/json",
             )
 
-        temp_dir = Path(__file__).parent / "temp_uploads"
-        temp_dir.mkdir(exist_ok=True)
-
-        temp_file_path = temp_dir / file_name
-        with open(temp_file_path, "wb") as f:
-            f.write(file_data)
+        too_large = JSONResponse(
+            {
+                "status": "error",
+                "message": f"Files larger than {MAX_UPLOAD_BYTES} bytes are not accepted",
+            },
+            status_code=413,
+        )
+        content_length = req.headers.get("Content-Length")
+        if content_length and content_length.isdigit():
+            if int(content_length) > MAX_UPLOAD_BYTES:
+                return too_large
 
         try:
+            file_name = resolve_filename(file_name, req.headers.get("Content-Type"))
+        except ValueError as e:
+            return JSONResponse(
+                {"status": "error", "message": str(e)},
+                status_code=415,
+            )
 
-            docs = rag_system.load_documents_from_file(str(temp_file_path))
-
-            temp_file_path.unlink()
-
-            return func.HttpResponse(
-                json.dumps(
-                    {
-                        "status": "success",
-                        "message": f"Successfully processed {len(docs)} document chunks from {file_name}",
-                        "chunks_processed": len(docs),
-                    }
-                ),
-                mimetype="application/json",
-                status_code=200,
+        # Spool the upload under a unique name, block by block as it arrives,
+        # and ingest it in the background; progress is available from
+        # /ingest_status.
+        try:
+            job_id = await asyncio.to_thread(
+                ingest_jobs.submit,
+                iterate_from_thread(req.stream(), asyncio.get_running_loop()),
+                file_name,
+                MAX_UPLOAD_BYTES,
+            )
+        except UploadTooLargeError:
+            return too_large
+        except ValueError:
+            return JSONResponse(
+                {"status": "error", "message": "No file or filename provided"},
+                status_code=400,
             )
-        finally:
 
-            if temp_file_path.exists():
-                temp_file_path.unlink()
+        return JSONResponse(
+            {
+                "status": "queued",
+                "message": f"Queued {file_name} for processing",
+                "job_id": job_id,
+            },
+            status_code=202,
+        )
 
     except Exception as e:
         logging.error(f"Error processing file upload: {str(e)}")
-        return func.HttpResponse(
-            json.dumps(
-                {
-                    "status": "error",
-                    "message": "Error processing file upload",
-                    "error": str(e),
-                }
-            ),
+        return JSONResponse(
+            {
+                "status": "error",
+                "message": "Error processing file upload",
+                "error": str(e),
+            },
             status_code=500,
-            mimetype="application/json",
         )
 
 
+@app.route(route="ingest_status", methods=["GET"])
+async def ingest_status(req: Request) -> Response:
+    job_id = req.query_params.get("job_id")
+    if not job_id:
+        return JSONResponse(
+            {"status": "error", "message": "No job_id provided"}, status_code=400
+        )
+
+    job = await asyncio.to_thread(ingest_jobs.status, job_id)
+    if job is None:
+        return JSONResponse(
+            {"status": "error", "message": f"Unknown job {job_id}"}, status_code=404
+        )
+
+    return JSONResponse({"status": "success", "job": job})
+
+
+@app.route(route="metrics", methods=["GET"])
+async def metrics(req: Request) -> Response:
+    """Stage latency, token and cache metrics in the Prometheus text format."""
+    body = get_tracer().render_metrics()
+    if body is None:
+        return PlainTextResponse(
+            "Metrics are disabled; add 'prometheus' to TRACE_EXPORTERS.",
+            status_code=404,
+        )
+    return Response(body, media_type="text/plain; version=0.0.4")
+
+
 @app.route(route="http_trigger", auth_level=func.AuthLevel.ANONYMOUS)
-def http_trigger(req: func.HttpRequest) -> func.HttpResponse:
+async def http_trigger(req: Request) -> Response:
     logging.info("Python HTTP trigger function processed a request.")
 
-    name = req.params.get("name")
+    name = req.query_params.get("name")
     if not name:
         try:
-            req_body = req.get_json()
+            req_body = await req.json()
         except ValueError:
             pass
         else:
-            name = req_body.get("name")
+            name = req_body.get("name") if isinstance(req_body, dict) else None
 
     if name:
-        return func.HttpResponse(
+        return PlainTextResponse(
             f"Hello, {name}. This HTTP triggered function executed successfully."
         )
     else:
-        return func.HttpResponse(
+        return PlainTextResponse(
             "This HTTP triggered function executed successfully. Pass a name in the query string or in the request body for a personalized response.",
             status_code=200,
         )
@@ -1,15 +1,16 @@
 import os
+import sys
 from datetime import datetime
-from openai import AzureOpenAI
+from pathlib import Path
 from dotenv import load_dotenv
 
+sys.path.append(str(Path(__file__).parent.parent))
+
+from RAG.clients import get_openai_client
+from RAG.rate_limit import Priority, request_priority
+
 load_dotenv()
 
-client = AzureOpenAI(
-    api_version="2024-12-01-preview",
-    azure_endpoint=os.getenv("OPEN_AI_ENDPOINT"),
-    api_key=os.getenv("API_OPEN_AI_KEY"),
-)
 model_name = "gpt-4o"
 deployment = "gpt-4o"
 
@@ -37,22 +38,23 @@ prompts = [
 def run_prompts(prompts):
     results = []
     for prompt in prompts:
-        response = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a helpful assistant.",
-                },
-                {
-                    "role": "user",
-                    "content": prompt,
-                },
-            ],
-            max_tokens=768,
-            temperature=1.0,
-            top_p=1.0,
-            model=deployment,
-        )
+        with request_priority(Priority.BATCH):
+            response = get_openai_client().chat.completions.create(
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "You are a helpful assistant.",
+                    },
+                    {
+                        "role": "user",
+                        "content": prompt,
+                    },
+                ],
+                max_tokens=768,
+                temperature=1.0,
+                top_p=1.0,
+                model=deployment,
+            )
         usage = response.usage
         content = response.choices[0].message.content
         prompt_tokens = usage.prompt_tokens
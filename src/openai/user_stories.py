@@ -1,15 +1,14 @@
 import os.path
+import sys
+from pathlib import Path
 from dotenv import load_dotenv
-from openai import AzureOpenAI
 
+sys.path.append(str(Path(__file__).parent.parent))
+
+from RAG.clients import get_openai_client
 
 load_dotenv()
 
-client = AzureOpenAI(
-    api_version="2024-12-01-preview",
-    azure_endpoint=os.getenv("OPEN_AI_ENDPOINT"),
-    api_key=os.getenv("API_OPEN_AI_KEY"),
-)
 MODEL_NAME = "gpt-4o"
 DEPLOYMENT = "gpt-4o"
 
@@ -33,7 +32,7 @@ def generate_user_stories(project_topic: str) -> str:
         "Return only user stories and acceptance criteria, without any additional text or explanations."
     )
 
-    response = client.chat.completions.create(
+    response = get_openai_client().chat.completions.create(
         model=MODEL_NAME,
         messages=[
             {
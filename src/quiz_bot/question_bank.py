@@ -0,0 +1,208 @@
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from quiz_session import question_stem, stem_hash
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BANK_PATH = ".cache/quiz_questions.sqlite"
+# Jaccard similarity of stem words at which a question counts as a duplicate.
+DUPLICATE_SIMILARITY = float(os.getenv("QUIZ_DUPLICATE_SIMILARITY", "0.7"))
+
+_WORD = re.compile(r"\w{3,}")
+
+
+def stem_tokens(stem: str) -> List[str]:
+    """Distinct words of a stem; words under three letters carry little."""
+    return sorted(set(_WORD.findall(stem.casefold())))
+
+
+@dataclass
+class BankQuestion:
+    id: int
+    tier: str
+    topic: str
+    text: str
+    answer: str
+    times_served: int = 0
+
+
+class QuestionBank:
+    """
+    Local, SQLite-backed bank of validated quiz questions, keyed by tier,
+    topic and the hash of the normalized question stem.
+
+    Besides exact repeats (same stem hash in the tier), add() rejects near
+    duplicates: questions whose stem words have a Jaccard similarity of at
+    least similarity with a banked question of the tier. Candidates are
+    found through an inverted index of stem words, so the check does not
+    scan the bank.
+
+    Args:
+        db_path: SQLite file of the bank
+        similarity: Jaccard similarity from which questions are duplicates
+    """
+
+    def __init__(
+        self, db_path: str = DEFAULT_BANK_PATH, similarity: float = DUPLICATE_SIMILARITY
+    ):
+        self.similarity = similarity
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS questions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tier TEXT NOT NULL,
+                topic TEXT NOT NULL,
+                topic_key TEXT NOT NULL,
+                stem_hash TEXT NOT NULL,
+                text TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                token_count INTEGER NOT NULL,
+                times_served INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                UNIQUE (tier, stem_hash)
+            );
+            CREATE INDEX IF NOT EXISTS questions_tier_topic
+                ON questions (tier, topic_key);
+            CREATE INDEX IF NOT EXISTS questions_tier_served
+                ON questions (tier, times_served);
+            CREATE TABLE IF NOT EXISTS question_tokens (
+                token TEXT NOT NULL,
+                question_id INTEGER NOT NULL,
+                PRIMARY KEY (token, question_id)
+            ) WITHOUT ROWID;
+            """
+        )
+        self._conn.commit()
+
+    def _execute(self, sql: str, params=()) -> List[sqlite3.Row]:
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+            self._conn.commit()
+            return rows
+
+    def count(self, tier: Optional[str] = None) -> int:
+        rows = self._execute(
+            "SELECT COUNT(*) FROM questions WHERE ? IS NULL OR tier = ?", (tier, tier)
+        )
+        return rows[0][0]
+
+    def _find_duplicate(
+        self, tier: str, digest: str, tokens: List[str]
+    ) -> Optional[int]:
+        """Id of a banked question of the tier the stem repeats, if any."""
+        row = self._conn.execute(
+            "SELECT id FROM questions WHERE tier = ? AND stem_hash = ?",
+            (tier, digest),
+        ).fetchone()
+        if row is not None:
+            return row["id"]
+        if not tokens:
+            return None
+        # Jaccard >= s needs at least s * len(tokens) shared words
+        placeholders = ", ".join("?" * len(tokens))
+        rows = self._conn.execute(
+            f"""
+            SELECT q.id, q.token_count, COUNT(*) AS shared
+            FROM question_tokens t JOIN questions q ON q.id = t.question_id
+            WHERE t.token IN ({placeholders}) AND q.tier = ?
+            GROUP BY q.id
+            HAVING shared >= ?
+            ORDER BY shared DESC
+            """,
+            (*tokens, tier, math.ceil(self.similarity * len(tokens))),
+        ).fetchall()
+        for row in rows:
+            union = len(tokens) + row["token_count"] - row["shared"]
+            if row["shared"] / union >= self.similarity:
+                return row["id"]
+        return None
+
+    def add(self, tier: str, topic: str, text: str, answer: str) -> Optional[int]:
+        """
+        Bank a question unless it duplicates one already banked.
+
+        Returns:
+            Optional[int]: The new question's id, or None for a duplicate
+        """
+        stem = question_stem(text)
+        digest, tokens = stem_hash(stem), stem_tokens(stem)
+        with self._lock:
+            duplicate = self._find_duplicate(tier, digest, tokens)
+            if duplicate is not None:
+                logger.debug(f"Question duplicates banked question {duplicate}")
+                return None
+            cursor = self._conn.execute(
+                "INSERT INTO questions (tier, topic, topic_key, stem_hash, text, "
+                "answer, token_count, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    tier,
+                    topic,
+                    topic.strip().casefold(),
+                    digest,
+                    text,
+                    answer,
+                    len(tokens),
+                    time.time(),
+                ),
+            )
+            question_id = cursor.lastrowid
+            self._conn.executemany(
+                "INSERT INTO question_tokens (token, question_id) VALUES (?, ?)",
+                [(token, question_id) for token in tokens],
+            )
+            self._conn.commit()
+        return question_id
+
+    def sample(
+        self, tier: str, count: int, exclude: Iterable[int] = ()
+    ) -> List[BankQuestion]:
+        """
+        Randomly pick up to count questions of the tier on distinct topics,
+        preferring the least served ones and skipping the excluded ids (the
+        questions already used in the game).
+        """
+        exclude = list(exclude)
+        placeholders = ", ".join("?" * len(exclude))
+        rows = self._execute(
+            "SELECT id, tier, topic, topic_key, text, answer, times_served "
+            "FROM questions WHERE tier = ? "
+            + (f"AND id NOT IN ({placeholders}) " if exclude else "")
+            + "ORDER BY times_served, RANDOM() LIMIT ?",
+            (tier, *exclude, count * 8),
+        )
+        picked: Dict[str, BankQuestion] = {}
+        for row in rows:
+            if row["topic_key"] not in picked:
+                picked[row["topic_key"]] = BankQuestion(
+                    row["id"],
+                    row["tier"],
+                    row["topic"],
+                    row["text"],
+                    row["answer"],
+                    row["times_served"],
+                )
+                if len(picked) == count:
+                    break
+        return list(picked.values())
+
+    def mark_served(self, question_id: int) -> None:
+        self._execute(
+            "UPDATE questions SET times_served = times_served + 1 WHERE id = ?",
+            (question_id,),
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
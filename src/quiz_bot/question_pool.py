@@ -0,0 +1,377 @@
+import logging
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Set, Tuple
+
+from RAG.rate_limit import Priority, request_priority
+
+from question_bank import QuestionBank
+
+logger = logging.getLogger(__name__)
+
+# Consecutive failed refills after which waiting players get the error.
+MAX_CONSECUTIVE_FAILURES = 5
+# Consecutive bank fills of a tier without an accepted question after which
+# the tier is no longer filled, e.g. once the model only repeats itself.
+MAX_REJECTED_FILLS = 5
+# Longest pause between failed or rejected refills.
+MAX_BACKOFF_SECONDS = 30
+
+
+@dataclass
+class PooledQuestion:
+    """A validated question ready to be served."""
+
+    tier: str
+    topic: str
+    text: str
+    answer: str
+    bank_id: Optional[int] = None
+
+
+class QuestionPool:
+    """
+    Per-tier buffers of pre-generated questions, kept topped up by
+    background workers so a round is served without waiting for the model.
+
+    A refill asks choose_topics for a few topics and generate for a question
+    on each of them, in the tier that is furthest below its buffer size
+    (tiers a player is waiting on first). generate is expected to validate
+    the question and raise ValueError when the model broke the format; such
+    questions are dropped and regenerated off the critical path. A refill
+    whose every question was rejected counts as a failed one and backs off.
+
+    A round offers questions on distinct topics. The ones the player does
+    not pick go back to the buffer for a later round.
+
+    With a bank, refills draw questions of the bank not yet used in this
+    game first and only generate, into the bank, once the tier runs out.
+    While every buffer is full, workers keep generating into the bank until
+    it holds bank_target questions per tier, giving up on a tier once
+    MAX_REJECTED_FILLS fills in a row added nothing. Offline, the pool serves
+    only from the bank and never calls choose_topics or generate.
+
+    Args:
+        choose_topics: Returns a list of new topics
+        generate: Returns (question text, correct letter) for (topic, tier)
+        tiers: Tier names, in game order
+        size: Questions kept ready per tier
+        workers: Background generation threads
+        bank: Persistent question bank to draw from and fill
+        offline: Serve only from the bank
+        bank_target: Questions per tier to fill the bank up to when idle
+    """
+
+    def __init__(
+        self,
+        choose_topics: Callable[[], Sequence[str]],
+        generate: Callable[[str, str], Tuple[str, str]],
+        tiers: Sequence[str],
+        size: int = 4,
+        workers: int = 2,
+        bank: Optional[QuestionBank] = None,
+        offline: bool = False,
+        bank_target: int = 0,
+    ):
+        if offline and bank is None:
+            raise ValueError("Offline play needs a question bank")
+        self.choose_topics = choose_topics
+        self.generate = generate
+        self.tiers = list(tiers)
+        self.size = size
+        self.workers = workers
+        self.bank = bank
+        self.offline = offline
+        self.bank_target = 0 if offline or bank is None else bank_target
+        self.stats: Counter = Counter()
+
+        self._buffers: Dict[str, Deque[PooledQuestion]] = {
+            tier: deque() for tier in self.tiers
+        }
+        self._pending: Counter = Counter()
+        self._wanted: Counter = Counter()
+        # Bank questions used in this game, and tiers the bank ran out of
+        self._drawn: Set[int] = set()
+        self._exhausted: Set[str] = set()
+        # Consecutive bank fills that added nothing, and tiers given up on
+        self._rejected_fills: Counter = Counter()
+        self._unfillable: Set[str] = set()
+        self._failures = 0
+        self._error: Optional[Exception] = None
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> "QuestionPool":
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._work, name=f"question-pool-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def __enter__(self) -> "QuestionPool":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def ready(self, tier: str) -> int:
+        with self._condition:
+            return len(self._buffers[tier])
+
+    def draw_round(
+        self, tier: str, count: int = 2, timeout: Optional[float] = None
+    ) -> List[PooledQuestion]:
+        """
+        Take count questions on distinct topics from the tier's buffer,
+        waiting for the workers when it holds fewer.
+
+        Raises:
+            TimeoutError: No round was ready within timeout seconds
+            RuntimeError: Refills keep failing
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        started = time.perf_counter()
+        with self._condition:
+            self._wanted[tier] += 1
+            try:
+                while True:
+                    offered = self._take(tier, count)
+                    if offered:
+                        break
+                    if tier in self._exhausted and not self._pending[tier]:
+                        # Offer what is left rather than end the game early
+                        offered = self._take(tier, 1)
+                        if offered:
+                            break
+                        raise RuntimeError(
+                            f"The question bank has no more tier {tier} questions"
+                        )
+                    if self._error is not None:
+                        raise RuntimeError(
+                            f"Question generation keeps failing: {self._error}"
+                        )
+                    remaining = (
+                        None if deadline is None else deadline - time.monotonic()
+                    )
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError(f"No questions ready for tier {tier}")
+                    self._condition.notify_all()
+                    self._condition.wait(remaining)
+            finally:
+                self._wanted[tier] -= 1
+                self._condition.notify_all()
+            waited_ms = (time.perf_counter() - started) * 1000
+            self.stats["rounds"] += 1
+            if waited_ms > 1:
+                self.stats["rounds_waited"] += 1
+        if waited_ms > 1:
+            logger.info(f"Waited {waited_ms:.0f} ms for tier {tier} questions")
+        return offered
+
+    def put_back(self, question: PooledQuestion) -> None:
+        """Return an offered but unplayed question to its buffer."""
+        with self._condition:
+            self._buffers[question.tier].appendleft(question)
+            self._condition.notify_all()
+
+    def _take(self, tier: str, count: int) -> List[PooledQuestion]:
+        buffer = self._buffers[tier]
+        offered: List[PooledQuestion] = []
+        topics = set()
+        for question in buffer:
+            if question.topic.casefold() not in topics:
+                offered.append(question)
+                topics.add(question.topic.casefold())
+                if len(offered) == count:
+                    break
+        if len(offered) < count:
+            return []
+        for question in offered:
+            buffer.remove(question)
+        return offered
+
+    def _next_tier(self) -> Optional[str]:
+        """The tier to refill next: waited on first, then the emptiest."""
+        deficits = {
+            tier: self.size - len(self._buffers[tier]) - self._pending[tier]
+            for tier in self.tiers
+        }
+        candidates = [
+            t
+            for t in self.tiers
+            if (deficits[t] > 0 or self._wanted[t]) and t not in self._exhausted
+        ]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda t: (self._wanted[t] > 0, deficits[t]))
+
+    def _work(self) -> None:
+        # Pre-generation yields Azure OpenAI capacity to interactive requests
+        with request_priority(Priority.BATCH):
+            while True:
+                with self._condition:
+                    tier = self._next_tier()
+                    while tier is None and not self._stopped and not self._fillable:
+                        self._condition.wait()
+                        tier = self._next_tier()
+                    if self._stopped:
+                        return
+                    if tier is not None:
+                        self._pending[tier] += 1
+                if tier is None:
+                    # Bank counts are queried outside the lock
+                    fill_tier = self._next_fill_tier()
+                    if fill_tier is not None:
+                        self._generate(fill_tier, buffer=False)
+                        continue
+                    with self._condition:
+                        if self._next_tier() is None and not self._stopped:
+                            self._condition.wait()
+                    continue
+                try:
+                    self._refill(tier)
+                finally:
+                    with self._condition:
+                        self._pending[tier] -= 1
+                        self._condition.notify_all()
+
+    @property
+    def _fillable(self) -> bool:
+        """Whether some tier may still be generated into the bank."""
+        return bool(self.bank_target) and len(self._unfillable) < len(self.tiers)
+
+    def _next_fill_tier(self) -> Optional[str]:
+        """
+        The tier to generate into the bank while the buffers are full.
+
+        Runs one count query per tier, so it is called without the lock.
+        """
+        with self._condition:
+            if not self._fillable:
+                return None
+            tiers = [t for t in self.tiers if t not in self._unfillable]
+        counts = {tier: self.bank.count(tier) for tier in tiers}
+        tier = min(tiers, key=counts.get)
+        return tier if counts[tier] < self.bank_target else None
+
+    def _refill(self, tier: str) -> None:
+        if self.bank is not None and self._draw_from_bank(tier):
+            return
+        if self.offline:
+            with self._condition:
+                self._exhausted.add(tier)
+                self._condition.notify_all()
+            logger.info(f"The question bank has no more tier {tier} questions")
+            return
+        self._generate(tier)
+
+    def _draw_from_bank(self, tier: str) -> bool:
+        with self._condition:
+            exclude = set(self._drawn)
+        drawn = self.bank.sample(tier, 2, exclude=exclude)
+        with self._condition:
+            for question in drawn:
+                if question.id in self._drawn:
+                    continue
+                self._drawn.add(question.id)
+                self._buffers[tier].append(
+                    PooledQuestion(
+                        tier,
+                        question.topic,
+                        question.text,
+                        question.answer,
+                        question.id,
+                    )
+                )
+                self.stats["from_bank"] += 1
+            self._condition.notify_all()
+        return bool(drawn)
+
+    def _generate(self, tier: str, buffer: bool = True) -> None:
+        try:
+            topics = list(dict.fromkeys(t.strip() for t in self.choose_topics()))
+        except Exception as e:
+            self._failed(e)
+            return
+        added = rejected = 0
+        for topic in filter(None, topics):
+            try:
+                text, answer = self.generate(topic, tier)
+            except ValueError as e:
+                rejected += 1
+                with self._condition:
+                    self.stats["rejected"] += 1
+                logger.warning(f"Rejected a tier {tier} question on {topic}: {e}")
+                continue
+            except Exception as e:
+                self._failed(e)
+                return
+            bank_id = None
+            if self.bank is not None:
+                bank_id = self.bank.add(tier, topic, text, answer)
+                if bank_id is None:
+                    rejected += 1
+                    with self._condition:
+                        self.stats["rejected"] += 1
+                    logger.info(f"Rejected a near duplicate tier {tier} question")
+                    continue
+            with self._condition:
+                if buffer:
+                    if bank_id is not None:
+                        self._drawn.add(bank_id)
+                    self._buffers[tier].append(
+                        PooledQuestion(tier, topic, text, answer, bank_id)
+                    )
+                self._failures = 0
+                self._error = None
+                self._rejected_fills[tier] = 0
+                self.stats["generated"] += 1
+                self._condition.notify_all()
+            added += 1
+        if rejected and not added:
+            self._all_rejected(tier, rejected, buffer)
+
+    def _all_rejected(self, tier: str, rejected: int, buffer: bool) -> None:
+        """Back off after a refill that added no question."""
+        error = ValueError(f"All {rejected} tier {tier} questions were rejected")
+        if buffer:
+            self._failed(error)
+            return
+        with self._condition:
+            self._rejected_fills[tier] += 1
+            fills = self._rejected_fills[tier]
+            if fills >= MAX_REJECTED_FILLS:
+                self._unfillable.add(tier)
+                self._condition.notify_all()
+        if fills >= MAX_REJECTED_FILLS:
+            logger.warning(f"Stopped filling the bank with tier {tier} questions")
+            return
+        logger.info(f"Bank fill rejected ({fills}x): {error}")
+        # Waiting players and stop() cut the pause short
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._stopped or any(self._wanted.values()),
+                min(2**fills, MAX_BACKOFF_SECONDS),
+            )
+
+    def _failed(self, error: Exception) -> None:
+        with self._condition:
+            self._failures += 1
+            self.stats["failed"] += 1
+            if self._failures >= MAX_CONSECUTIVE_FAILURES:
+                self._error = error
+            self._condition.notify_all()
+            failures = self._failures
+        logger.warning(f"Question pool refill failed ({failures}x): {error}")
+        # Back off before the next refill
+        time.sleep(min(2**failures, MAX_BACKOFF_SECONDS))
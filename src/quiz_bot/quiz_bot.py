@@ -1,16 +1,22 @@
+import argparse
 import os.path
 import re
+import sys
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import Dict, List
 from dotenv import load_dotenv
-from openai import AzureOpenAI
 
+sys.path.append(str(Path(__file__).parent.parent))
+
+from RAG.clients import get_openai_client
+from question_bank import DEFAULT_BANK_PATH, QuestionBank
+from question_pool import QuestionPool
+from quiz_session import QuizSession
 
 load_dotenv()
 
-client = AzureOpenAI(
-    api_version="2024-12-01-preview",
-    azure_endpoint=os.getenv("OPEN_AI_ENDPOINT"),
-    api_key=os.getenv("API_OPEN_AI_KEY"),
-)
 MODEL_NAME = "gpt-4o"
 DEPLOYMENT = "gpt-4o"
 
@@ -66,7 +72,7 @@ chat_prompt_overall_8 = [
 
 
 def choose_topic():
-    response = client.chat.completions.create(
+    response = get_openai_client().chat.completions.create(
         messages=[
             {
                 "role": "assistant",
@@ -88,71 +94,80 @@ def choose_topic():
     return matches
 
 
-def update_history(question):
-    chat_prompt_overall_14.append(question)
-    chat_prompt_overall_57.append(question)
-    chat_prompt_overall_8.append(question)
+@dataclass(frozen=True)
+class Tier:
+    """Questions up to last of a game: their answer letters and prompt."""
 
+    name: str
+    last: int
+    letters: str
+    prompt: List[Dict[str, str]]
 
-def get_question(topic, question_num):
-    prompt = f"Wygeneruj pytanie z tematyki {topic} w języku polskim. Unikaj pytań, które już były."
-    if question_num <= 4:
-        prompt = f"Wygeneruj pytanie z tematyki {topic} w języku polskim. Unikaj pytań, które już były."
-        chat_prompt_overall_14.append({"role": "user", "content": prompt})
-        response = client.chat.completions.create(
-            model=DEPLOYMENT,
-            messages=chat_prompt_overall_14,
-            temperature=1.0,
-            max_tokens=350,
-        )
 
-        content = response.choices[0].message.content
-        update_history(content)
-
-        match = re.search(r"Odpowiedź: ([A-D])", content)
-        if not match:
-            raise ValueError("Nie znaleziono poprawnej odpowiedzi w propmtcie.")
-
-        answer = match.group(1)
-        question_text = re.sub(r"Odpowiedź: ([A-D])", "", content).strip()
-        return question_text, answer
-    elif question_num <= 7:
-        prompt = f"Wygeneruj pytanie z tematyki {topic} w języku polskim. Unikaj pytań, które już były."
-        chat_prompt_overall_57.append({"role": "user", "content": prompt})
-
-        response = client.chat.completions.create(
-            model=DEPLOYMENT,
-            messages=chat_prompt_overall_57,
-            temperature=1.0,
-            max_tokens=350,
-        )
-        content = response.choices[0].message.content
-        update_history(content)
-        match = re.search(r"Odpowiedź: ([A-C])", content)
-        if not match:
-            raise ValueError("Nie znaleziono poprawnej odpowiedzi w propmtcie.")
-
-        answer = match.group(1)
-        question_text = re.sub(r"Odpowiedź: ([A-C])", "", content).strip()
-        return question_text, answer
-    else:
-        prompt = f"Wygeneruj pytanie z tematyki {topic} w języku polskim. Unikaj pytań, które już były."
-        chat_prompt_overall_8.append({"role": "user", "content": prompt})
-        response = client.chat.completions.create(
-            model=DEPLOYMENT,
-            messages=chat_prompt_overall_8,
-            temperature=1.0,
-            max_tokens=350,
+TIERS = [
+    Tier("1-4", 4, "ABCD", chat_prompt_overall_14),
+    Tier("5-7", 7, "ABC", chat_prompt_overall_57),
+    Tier("8", 8, "AB", chat_prompt_overall_8),
+]
+TIERS_BY_NAME = {tier.name: tier for tier in TIERS}
+
+# Questions kept ready per tier, and the threads generating them.
+POOL_SIZE = int(os.getenv("QUIZ_POOL_SIZE", "4"))
+POOL_WORKERS = int(os.getenv("QUIZ_POOL_WORKERS", "2"))
+# Questions per tier the question bank is filled up to between rounds.
+BANK_TARGET = int(os.getenv("QUIZ_BANK_TARGET", "50"))
+
+
+def tier_for(question_num):
+    for tier in TIERS:
+        if question_num <= tier.last:
+            return tier
+    return TIERS[-1]
+
+
+def parse_question(content, letters):
+    """
+    Split a generated question into its text and correct answer, checking
+    it offers exactly the tier's options and ends with "Odpowiedź: X".
+    """
+    match = re.search(rf"Odpowiedź: ([{letters}])", content)
+    if not match:
+        raise ValueError("Nie znaleziono poprawnej odpowiedzi w propmtcie.")
+    question_text = content[: match.start()].strip()
+    options = re.findall(r"^\s*([A-D])[).:]?\s", question_text, re.MULTILINE)
+    if sorted(set(options)) != list(letters):
+        raise ValueError(
+            f"Oczekiwano odpowiedzi {', '.join(letters)}, otrzymano {', '.join(options)}."
         )
-        content = response.choices[0].message.content
-        update_history(content)
-        match = re.search(r"Odpowiedź: ([A-B])", content)
-        if not match:
-            raise ValueError("Nie znaleziono poprawnej odpowiedzi w propmtcie.")
+    return question_text, match.group(1)
 
-        answer = match.group(1)
-        question_text = re.sub(r"Odpowiedź: ([A-B])", "", content).strip()
-        return question_text, answer
+
+def get_question(topic, question_num, session=None):
+    return generate_question(topic, tier_for(question_num).name, session)
+
+
+def generate_question(topic, tier_name, session=None):
+    """
+    Generate a question for the tier, steering away from the questions of
+    the session (the game) so far; a repeat raises ValueError like a
+    malformed question does. The question is not recorded in the session:
+    it may be buffered or banked rather than asked.
+    """
+    tier = TIERS_BY_NAME[tier_name]
+    prompt = f"Wygeneruj pytanie z tematyki {topic} w języku polskim. Unikaj pytań, które już były."
+    history = session.history_messages() if session is not None else []
+    messages = tier.prompt + history + [{"role": "user", "content": prompt}]
+    response = get_openai_client().chat.completions.create(
+        model=DEPLOYMENT,
+        messages=messages,
+        temperature=1.0,
+        max_tokens=350,
+    )
+    content = response.choices[0].message.content
+    question_text, answer = parse_question(content, tier.letters)
+    if session is not None and session.asked(question_text):
+        raise ValueError("To pytanie już padło w tej grze.")
+    return question_text, answer
 
 
 def save_log(question_num, question_text, correct_answer, bets, prize):
@@ -214,6 +229,20 @@ def place_bet(possible_answers, correct_answer, current_money):
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Gra postaw na milion.")
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Graj tylko pytaniami z banku pytań, bez wywołań modelu",
+    )
+    parser.add_argument("--bank", default=DEFAULT_BANK_PATH, help="Plik banku pytań")
+    args = parser.parse_args()
+
+    bank = QuestionBank(args.bank)
+    if args.offline and not bank.count():
+        print(f"Bank pytań {args.bank} jest pusty. Zagraj najpierw online.")
+        return
+
     prize = 1000000
     question = 1
     print("Witaj w grze postaw na milion!")
@@ -227,39 +256,57 @@ def main():
     )
     print("Powodzenie w grze!")
 
-    while question <= 8 and prize > 0:
-        print(f"\nPytanie {question}:")
-        print(f"Na szali masz {prize} zł")
-        print("Wybierz tematykę pytania:")
-        topics = choose_topic()
-        print(f"Tematyka 1: {topics[0]}")
-        print(f"Tematyka 2: {topics[1]}")
-        print("Wybierz tematykę pytania (1 lub 2):")
-        while True:
+    session = QuizSession()
+    with QuestionPool(
+        choose_topic,
+        partial(generate_question, session=session),
+        [tier.name for tier in TIERS],
+        size=POOL_SIZE,
+        workers=POOL_WORKERS,
+        bank=bank,
+        offline=args.offline,
+        bank_target=BANK_TARGET,
+    ) as pool:
+        while question <= 8 and prize > 0:
+            tier = tier_for(question)
+            print(f"\nPytanie {question}:")
+            print(f"Na szali masz {prize} zł")
+            print("Wybierz tematykę pytania:")
             try:
-                choice = int(input("Wpisz 1 lub 2, aby wybrać tematykę: "))
-                if choice in [1, 2]:
-                    break
-                else:
-                    print("Niepoprawny wybór. Wpisz 1 lub 2.")
-            except ValueError:
-                print("To nie jest liczba. Spróbuj jeszcze raz.")
-
-        selected_topic = topics[choice - 1]
-        print(f"Wybrałeś tematykę: {selected_topic}")
-        quest, ans = get_question(selected_topic, question)
-        print(f"\nPytanie: {quest}")
-        if question <= 4:
-            options = ["A", "B", "C", "D"]
-        elif question <= 7:
-            options = ["A", "B", "C"]
-        else:
-            options = ["A", "B"]
-
-        new_prize, bets = place_bet(options, ans, prize)
-        save_log(question, quest, ans, bets, new_prize)
-        prize = new_prize
-        question += 1
+                offered = pool.draw_round(tier.name)
+            except RuntimeError as e:
+                print(f"Nie można przygotować kolejnego pytania: {e}")
+                break
+            for i, candidate in enumerate(offered, start=1):
+                print(f"Tematyka {i}: {candidate.topic}")
+            choice = 1
+            if len(offered) > 1:
+                print("Wybierz tematykę pytania (1 lub 2):")
+            while len(offered) > 1:
+                try:
+                    choice = int(input("Wpisz 1 lub 2, aby wybrać tematykę: "))
+                    if choice in [1, 2]:
+                        break
+                    else:
+                        print("Niepoprawny wybór. Wpisz 1 lub 2.")
+                except ValueError:
+                    print("To nie jest liczba. Spróbuj jeszcze raz.")
+
+            selected = offered.pop(choice - 1)
+            for other in offered:
+                pool.put_back(other)
+            print(f"Wybrałeś tematykę: {selected.topic}")
+            quest, ans = selected.text, selected.answer
+            session.record(selected.topic, quest)
+            print(f"\nPytanie: {quest}")
+            if selected.bank_id is not None:
+                bank.mark_served(selected.bank_id)
+            options = list(tier.letters)
+
+            new_prize, bets = place_bet(options, ans, prize)
+            save_log(question, quest, ans, bets, new_prize)
+            prize = new_prize
+            question += 1
 
     print(f"\nKoniec gry! Twój końcowy stan konta to: {prize} zł")
     print("Dziękujemy za grę!")
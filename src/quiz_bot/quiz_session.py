@@ -0,0 +1,118 @@
+import hashlib
+import os
+import re
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set
+
+# Previous questions quoted verbatim in each prompt.
+HISTORY_WINDOW = int(os.getenv("QUIZ_HISTORY_WINDOW", "6"))
+# Older topics listed in the summary; the oldest are dropped beyond this.
+SUMMARY_TOPICS = int(os.getenv("QUIZ_SUMMARY_TOPICS", "24"))
+
+_OPTION_LINE = re.compile(r"^\s*[A-D][).:]?\s")
+_NON_WORD = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def question_stem(question_text: str) -> str:
+    """The question itself, without its answer options."""
+    lines = []
+    for line in question_text.strip().splitlines():
+        if _OPTION_LINE.match(line):
+            break
+        lines.append(line.strip())
+    return " ".join(filter(None, lines))
+
+
+def stem_hash(stem: str) -> str:
+    """Hash of a stem ignoring case, punctuation and spacing."""
+    normalized = _WHITESPACE.sub(" ", _NON_WORD.sub(" ", stem.casefold())).strip()
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+class QuizSession:
+    """
+    The question history of one game, kept compact so the prompt of every
+    question costs about the same number of tokens however long the game.
+
+    The stems of the last history_window questions are quoted in the prompt
+    to steer the model away from them; older questions are folded into a
+    one-line summary of the topics already covered. Hashes of every stem
+    are kept to reject verbatim repeats the model produces anyway.
+
+    Only questions actually put to the player are recorded; pre-generated
+    questions are checked with asked() and recorded when served.
+
+    Safe to use from the question pool's worker threads.
+
+    Args:
+        history_window: Previous question stems quoted in each prompt
+        summary_topics: Older topics kept in the summary
+    """
+
+    def __init__(
+        self, history_window: int = HISTORY_WINDOW, summary_topics: int = SUMMARY_TOPICS
+    ):
+        self.recent: Deque[str] = deque(maxlen=max(history_window, 0))
+        self.summary_topics: Dict[str, None] = {}
+        self.max_summary_topics = summary_topics
+        self.seen: Set[str] = set()
+        self._recent_topics: Deque[str] = deque(maxlen=max(history_window, 0))
+        self._lock = threading.Lock()
+
+    def asked(self, question_text: str) -> bool:
+        """Whether an equivalent question was already recorded."""
+        digest = stem_hash(question_stem(question_text))
+        with self._lock:
+            return digest in self.seen
+
+    def record(self, topic: str, question_text: str) -> bool:
+        """
+        Add a question to the history.
+
+        Returns:
+            bool: False if an equivalent question was already asked
+        """
+        stem = question_stem(question_text)
+        digest = stem_hash(stem)
+        with self._lock:
+            if digest in self.seen:
+                return False
+            self.seen.add(digest)
+            if self.recent.maxlen and len(self.recent) == self.recent.maxlen:
+                self._summarize(self._recent_topics[0])
+            elif not self.recent.maxlen:
+                self._summarize(topic)
+            self.recent.append(stem)
+            self._recent_topics.append(topic)
+        return True
+
+    def _summarize(self, topic: str) -> None:
+        self.summary_topics.pop(topic, None)
+        self.summary_topics[topic] = None
+        while len(self.summary_topics) > self.max_summary_topics:
+            del self.summary_topics[next(iter(self.summary_topics))]
+
+    def summary(self) -> Optional[str]:
+        with self._lock:
+            if not self.summary_topics:
+                return None
+            return "Wcześniejsze pytania dotyczyły tematyk: " + ", ".join(
+                self.summary_topics
+            )
+
+    def history_messages(self) -> List[Dict[str, str]]:
+        """The compact history to put between the system and user prompts."""
+        summary = self.summary()
+        with self._lock:
+            recent = list(self.recent)
+        lines = []
+        if summary:
+            lines.append(summary + ".")
+        if recent:
+            lines.append("Ostatnie pytania:")
+            lines.extend(f"- {stem}" for stem in recent)
+        if not lines:
+            return []
+        return [{"role": "assistant", "content": "\n".join(lines)}]
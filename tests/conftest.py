@@ -0,0 +1,25 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# src/openai would shadow the openai package if it came first on the path.
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT / "src"))
+# The quiz bot modules import their siblings directly.
+sys.path.append(str(ROOT / "src" / "quiz_bot"))
+
+
+@pytest.fixture
+def rag_system(tmp_path, monkeypatch):
+    """RAGSystem on a local index in tmp_path, with stub embeddings and LLM."""
+    from RAG.ai_search_langchain import RAGSystem
+    from RAG.stubs import StubEmbeddings, StubLLM
+
+    monkeypatch.setenv("SEARCH_BACKEND", "local")
+    monkeypatch.setenv("LOCAL_INDEX_PATH", str(tmp_path / "index"))
+    monkeypatch.setenv("INGEST_MANIFEST_PATH", str(tmp_path / "manifest.sqlite"))
+    rag_system = RAGSystem()
+    rag_system._embeddings = StubEmbeddings()
+    rag_system._llm = StubLLM()
+    return rag_system
@@ -0,0 +1,87 @@
+import time
+
+from RAG.answer_cache import SemanticAnswerCache
+from RAG.stubs import hash_embedding
+
+QUESTION = "Which hotels in London have a pool?"
+
+
+def answer(text):
+    return {"answer": text, "sources": []}
+
+
+def test_similar_questions_hit_and_results_are_copies():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.store(hash_embedding(QUESTION), QUESTION, answer("The Savoy"), 1.0)
+
+    hit = cache.lookup(hash_embedding("which hotels in London have a pool"))
+    assert hit == answer("The Savoy")
+    hit["answer"] = "changed"
+    assert cache.lookup(hash_embedding(QUESTION)) == answer("The Savoy")
+    assert cache.lookup(hash_embedding("How old is Big Ben?")) is None
+    assert (cache.stats["hits"], cache.stats["misses"]) == (2, 1)
+
+
+def test_invalidate_drops_every_answer():
+    cache = SemanticAnswerCache()
+    cache.store(hash_embedding(QUESTION), QUESTION, answer("The Savoy"), 1.0)
+    cache.invalidate()
+
+    assert cache.lookup(hash_embedding(QUESTION)) is None
+    assert cache.stats["invalidations"] == 1
+
+
+def test_answers_computed_before_an_invalidation_are_not_stored():
+    cache = SemanticAnswerCache()
+    generation = cache.generation
+    # Documents are ingested while the question is being answered
+    cache.invalidate()
+    cache.store(hash_embedding(QUESTION), QUESTION, answer("stale"), 1.0, generation)
+    assert cache.lookup(hash_embedding(QUESTION)) is None
+
+    cache.store(
+        hash_embedding(QUESTION), QUESTION, answer("fresh"), 1.0, cache.generation
+    )
+    assert cache.lookup(hash_embedding(QUESTION)) == answer("fresh")
+
+
+def test_entries_expire_and_are_evicted_least_recently_used_first():
+    cache = SemanticAnswerCache(ttl_seconds=0.05, max_entries=2)
+    questions = ["Where is the Savoy?", "How old is Big Ben?", "Is the Tube fast?"]
+    for question in questions[:2]:
+        cache.store(hash_embedding(question), question, answer(question), 1.0)
+    cache.lookup(hash_embedding(questions[0]))
+    cache.store(hash_embedding(questions[2]), questions[2], answer(questions[2]), 1.0)
+
+    assert cache.lookup(hash_embedding(questions[1])) is None
+    assert cache.lookup(hash_embedding(questions[0])) is not None
+    time.sleep(0.06)
+    assert cache.lookup(hash_embedding(questions[0])) is None
+
+
+def test_disabled_cache_stores_nothing():
+    cache = SemanticAnswerCache(enabled=False)
+    cache.store(hash_embedding(QUESTION), QUESTION, answer("The Savoy"), 1.0)
+
+    assert cache.lookup(hash_embedding(QUESTION)) is None
+    assert cache.stats["entries"] == 0
+
+
+def test_ingestion_invalidates_cached_answers(rag_system, tmp_path):
+    first = tmp_path / "savoy.txt"
+    first.write_text("The Savoy hotel in London has a pool.", encoding="utf-8")
+    rag_system.ingest_many([str(first)])
+    rag_system.ask_question(QUESTION)
+    assert rag_system.answer_cache.stats["entries"] == 1
+    assert rag_system.ask_question(QUESTION) == rag_system.ask_question(QUESTION)
+    assert rag_system.answer_cache.stats["hits"] == 2
+
+    # Re-ingesting an unchanged file leaves the index and the cache alone
+    rag_system.ingest_many([str(first)])
+    assert rag_system.answer_cache.stats["entries"] == 1
+
+    second = tmp_path / "ritz.txt"
+    second.write_text("The Ritz hotel in London has a pool too.", encoding="utf-8")
+    rag_system.ingest_many([str(second)])
+    assert rag_system.answer_cache.stats["entries"] == 0
+    assert "Ritz" in rag_system.ask_question(QUESTION)["answer"]
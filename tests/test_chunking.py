@@ -0,0 +1,73 @@
+import pytest
+from langchain.schema import Document
+
+from RAG.chunking import TextChunker
+
+TEXT = "\n\n".join(
+    f"Paragraph {p}. " + " ".join(f"Sentence {p}.{s} about hotels." for s in range(8))
+    for p in range(10)
+)
+
+
+def test_chunks_cover_the_text_within_the_size():
+    chunker = TextChunker(chunk_size=200, chunk_overlap=40)
+    chunks = list(chunker.iter_chunks(TEXT, source="a.pdf", page=3))
+
+    assert len(chunks) > 1
+    assert chunks[0].start == 0
+    assert chunks[-1].end == len(TEXT)
+    for chunk, following in zip(chunks, chunks[1:]):
+        assert len(chunk) <= 200
+        assert chunk.page_content == chunk.page_content.strip()
+        # Consecutive chunks overlap and start on a word boundary
+        assert following.start < chunk.end
+        assert TEXT[following.start - 1].isspace()
+    assert [c.index for c in chunks] == list(range(1, len(chunks) + 1))
+
+
+def test_chunks_break_at_separators():
+    chunker = TextChunker(chunk_size=200, chunk_overlap=0)
+    for chunk in chunker.iter_chunks(TEXT):
+        assert chunk.page_content.endswith(".")
+
+
+def test_text_without_separators_is_cut_hard():
+    chunker = TextChunker(chunk_size=100, chunk_overlap=0)
+    chunks = list(chunker.iter_chunks("x" * 250))
+
+    assert [len(c) for c in chunks] == [100, 100, 50]
+
+
+def test_metadata_and_documents():
+    chunker = TextChunker(chunk_size=200, chunk_overlap=40)
+    chunk = next(chunker.iter_chunks(TEXT, source="a.pdf", page=3))
+    document = chunk.to_document()
+
+    assert document.page_content == TEXT[chunk.start : chunk.end]
+    assert document.metadata == {
+        "source": "a.pdf",
+        "chunk": 1,
+        "page": 3,
+        "start": chunk.start,
+        "end": chunk.end,
+    }
+
+
+def test_split_documents_numbers_chunks_across_pages():
+    chunker = TextChunker(chunk_size=200, chunk_overlap=40)
+    pages = [
+        Document(page_content=TEXT, metadata={"source": "a.pdf", "page": page})
+        for page in range(3)
+    ]
+    chunks = list(chunker.split_documents(pages))
+
+    assert [c.index for c in chunks] == list(range(1, len(chunks) + 1))
+    assert {c.page for c in chunks} == {0, 1, 2}
+
+
+@pytest.mark.parametrize(
+    "kwargs", [{"unit": "words"}, {"chunk_overlap": 200}, {"chunk_overlap": -1}]
+)
+def test_invalid_configuration(kwargs):
+    with pytest.raises(ValueError):
+        TextChunker(chunk_size=200, **kwargs)
@@ -0,0 +1,108 @@
+import json
+
+from RAG.chunking import TextChunker
+from RAG.context_packer import ContextPacker, Passage
+from RAG.tokens import count_tokens
+
+TEXT = " ".join(f"Sentence {i} describes the hotel rooms in detail." for i in range(60))
+
+
+def chunk_passages(source: str = "a.pdf", overlap: int = 100):
+    chunker = TextChunker(chunk_size=400, chunk_overlap=overlap)
+    return [
+        Passage(
+            chunk.page_content,
+            source=source,
+            page=1,
+            chunk=chunk.index,
+            start=chunk.start,
+            end=chunk.end,
+        )
+        for chunk in chunker.iter_chunks(TEXT, first_index=0)
+    ]
+
+
+def test_consecutive_chunks_are_merged_without_overlap():
+    passages = chunk_passages()
+    packed = ContextPacker(max_tokens=10000).pack(passages[:3])
+
+    [passage] = packed.passages
+    assert passage.chunks == [0, 1, 2]
+    assert passage.text == TEXT[: passages[2].end]
+    assert packed.merged == 2
+    assert packed.tokens < packed.tokens_before
+
+
+def test_first_chunk_merges_with_its_successor():
+    # Chunk numbers start at 0; the chunk before chunk 1 must still be found
+    passages = chunk_passages()
+    packed = ContextPacker(max_tokens=10000).pack([passages[1], passages[0]])
+
+    [passage] = packed.passages
+    assert passage.chunks == [0, 1]
+
+
+def test_chunks_are_merged_by_offsets_or_by_repeated_text():
+    passages = chunk_passages()
+    without_offsets = [
+        Passage(p.text, source=p.source, page=p.page, chunk=p.chunk) for p in passages
+    ]
+    packer = ContextPacker(max_tokens=10000)
+
+    assert (
+        packer.pack(without_offsets[:3]).passages[0].text
+        == packer.pack(passages[:3]).passages[0].text
+    )
+
+
+def test_unrelated_chunks_stay_in_relevance_order():
+    passages = chunk_passages()
+    packed = ContextPacker(max_tokens=10000).pack([passages[4], passages[1]])
+
+    assert [p.chunks for p in packed.passages] == [[4], [1]]
+
+
+def test_duplicates_are_dropped():
+    passages = chunk_passages()
+    packed = ContextPacker(max_tokens=10000).pack([passages[0], passages[0]])
+
+    assert packed.dropped == 1
+    assert len(packed.passages) == 1
+
+
+def test_unknown_sources_are_neither_merged_nor_deduplicated():
+    passages = chunk_passages(source="")
+    packed = ContextPacker(max_tokens=10000).pack(
+        [passages[0], passages[1], passages[1]]
+    )
+
+    assert [p.chunks for p in packed.passages] == [[0], [1], [1]]
+    assert packed.dropped == packed.merged == 0
+
+
+def test_budget_truncates_one_chunk_and_drops_the_rest():
+    passages = chunk_passages(overlap=0)
+    budget = count_tokens(passages[0].text) + 50
+    packer = ContextPacker(max_tokens=budget, min_partial_tokens=20)
+    packed = packer.pack([passages[0], passages[3], passages[6]])
+
+    assert packed.tokens <= budget
+    assert packed.truncated == 1
+    assert packed.dropped == 1
+    assert packed.passages[1].text.startswith(passages[3].text[:20])
+
+
+def test_from_fields_reads_search_metadata():
+    meta = {"filepath": "docs/a.pdf", "page": 2, "chunk": 7, "start": 10, "end": 90}
+    passage = Passage.from_fields(
+        "text", {"title": "a.pdf", "meta_json_string": json.dumps(meta)}
+    )
+
+    assert (passage.source, passage.page, passage.chunk) == ("docs/a.pdf", 2, 7)
+    assert (passage.start, passage.end) == (10, 90)
+
+
+def test_from_fields_does_not_use_titles_as_sources():
+    passage = Passage.from_fields("text", {"title": "a.pdf", "chunk": 1})
+
+    assert passage.source == ""
@@ -0,0 +1,196 @@
+from collections import Counter
+from types import SimpleNamespace
+from typing import Any, Tuple
+
+import pytest
+from openai import AzureOpenAI
+
+from RAG.clients import DEFAULT_API_VERSION
+from RAG.embedding_pipeline import EmbeddingPipeline, batch_by_tokens
+from RAG.stubs import FakeOpenAIServer, hash_embedding
+from RAG.tokens import count_tokens
+
+
+class FlakyOpenAIServer(FakeOpenAIServer):
+    """
+    FakeOpenAIServer answering the first `errors` embedding requests with the
+    given status, and rejecting every batch containing "poison" with a 400.
+    """
+
+    def __init__(self, errors: int = 0, status: int = 503, **kwargs):
+        super().__init__(**kwargs)
+        self.errors = errors
+        self.status = status
+
+    def route(self, method: str, path: str, body: Any) -> Tuple[str, Any]:
+        if path.endswith("/embeddings"):
+            if any("poison" in text for text in body.get("input", [])):
+                return "rejected", (400, {"error": {"message": "Invalid input"}})
+            with self._lock:
+                failing = self.errors > 0
+                self.errors -= failing
+            if failing:
+                headers = {"retry-after-ms": "1"} if self.status == 429 else {}
+                message = {"error": {"code": str(self.status), "message": "Failed"}}
+                return "failed", (self.status, message, headers)
+        return super().route(method, path, body)
+
+
+def make_chunks(count: int, words: int = 20):
+    return [
+        {"id": f"chunk-{i}", "content": f"chunk {i} about hotels " * words}
+        for i in range(count)
+    ]
+
+
+def make_pipeline(server: FakeOpenAIServer, uploaded: list, **kwargs):
+    # The pipeline retries itself, so the client must not
+    client = AzureOpenAI(
+        api_version=DEFAULT_API_VERSION,
+        azure_endpoint=server.url,
+        api_key="test",
+        max_retries=0,
+    )
+
+    def embed_batch(texts):
+        response = client.embeddings.create(model="embedding", input=texts)
+        return [item.embedding for item in response.data]
+
+    def upload_documents(documents):
+        uploaded.extend(documents)
+        return [SimpleNamespace(key=d["id"], succeeded=True) for d in documents]
+
+    kwargs.setdefault("backoff_base", 0.001)
+    return EmbeddingPipeline(embed_batch, upload_documents, **kwargs)
+
+
+def test_batches_are_bounded_by_tokens_and_size():
+    chunks = make_chunks(50)
+    max_tokens = max(count_tokens(c["content"]) for c in chunks) * 4
+    batches = list(batch_by_tokens(chunks, max_tokens, 3))
+
+    assert [c["id"] for batch in batches for c in batch] == [c["id"] for c in chunks]
+    assert all(len(batch) <= 3 for batch in batches)
+
+    batches = list(batch_by_tokens(chunks, max_tokens, 64))
+    assert len(batches) > 1
+    for batch, following in zip(batches, batches[1:]):
+        tokens = sum(count_tokens(c["content"]) for c in batch)
+        assert tokens <= max_tokens
+        # A batch is only closed when the next chunk does not fit
+        assert tokens + count_tokens(following[0]["content"]) > max_tokens
+
+
+def test_oversized_chunk_gets_its_own_batch():
+    chunks = make_chunks(3, words=1) + make_chunks(1, words=500)
+    batches = list(batch_by_tokens(chunks, 100, 64))
+
+    assert [len(batch) for batch in batches] == [3, 1]
+
+
+def test_run_embeds_and_uploads_every_chunk():
+    chunks = make_chunks(40)
+    uploaded = []
+    with FakeOpenAIServer() as server:
+        pipeline = make_pipeline(
+            server, uploaded, max_batch_size=8, upload_page_size=16
+        )
+        report = pipeline.run(iter(chunks))
+
+    assert report.chunks_total == report.chunks_embedded == report.chunks_indexed == 40
+    assert report.batches_total == 5
+    assert not report.failed_batches
+    assert server.requests["embeddings"] == 5
+    assert sorted(d["id"] for d in uploaded) == sorted(c["id"] for c in chunks)
+    for document in uploaded:
+        assert document["contentVector"] == pytest.approx(
+            hash_embedding(document["content"])
+        )
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_retryable_errors_are_retried(status):
+    uploaded = []
+    with FlakyOpenAIServer(errors=3, status=status) as server:
+        pipeline = make_pipeline(server, uploaded, max_batch_size=4, max_workers=1)
+        report = pipeline.run(make_chunks(8))
+
+    assert server.requests["failed"] == 3
+    assert server.requests["embeddings"] == 2
+    assert report.chunks_indexed == 8
+    assert not report.failed_batches
+
+
+def test_batch_failing_after_max_retries_is_reported():
+    uploaded = []
+    with FlakyOpenAIServer(errors=10) as server:
+        pipeline = make_pipeline(
+            server, uploaded, max_batch_size=4, max_workers=1, max_retries=2
+        )
+        report = pipeline.run(make_chunks(4))
+
+    assert server.requests["failed"] == 3
+    assert report.chunks_indexed == 0
+    [failed] = report.failed_batches
+    assert failed.stage == "embed"
+    assert failed.chunk_ids == [f"chunk-{i}" for i in range(4)]
+
+
+def test_partial_failures_are_reported_per_batch():
+    chunks = make_chunks(12)
+    chunks[5]["content"] += " poison"
+    uploaded = []
+    with FlakyOpenAIServer() as server:
+        pipeline = make_pipeline(server, uploaded, max_batch_size=4)
+        report = pipeline.run(chunks)
+
+    # Client errors are not retried
+    assert server.requests["rejected"] == 1
+    assert report.chunks_total == 12
+    assert report.chunks_embedded == report.chunks_indexed == 8
+    [failed] = report.failed_batches
+    assert (failed.stage, failed.batch_index) == ("embed", 1)
+    assert failed.chunk_ids == ["chunk-4", "chunk-5", "chunk-6", "chunk-7"]
+    assert "chunk-5" not in {d["id"] for d in uploaded}
+
+
+def test_documents_rejected_by_the_index_are_reported():
+    def upload_documents(documents):
+        return [
+            SimpleNamespace(key=d["id"], succeeded=d["id"] != "chunk-2")
+            for d in documents
+        ]
+
+    pipeline = EmbeddingPipeline(
+        lambda texts: [hash_embedding(t) for t in texts], upload_documents
+    )
+    report = pipeline.run(make_chunks(6))
+
+    assert report.chunks_embedded == 6
+    assert report.chunks_indexed == 5
+    [failed] = report.failed_batches
+    assert (failed.stage, failed.chunk_ids) == ("upload", ["chunk-2"])
+
+
+def test_upload_failure_reports_the_whole_page():
+    calls = Counter()
+
+    def upload_documents(documents):
+        calls["upload"] += 1
+        if calls["upload"] == 1:
+            raise ValueError("index unavailable")
+        return []
+
+    pipeline = EmbeddingPipeline(
+        lambda texts: [hash_embedding(t) for t in texts],
+        upload_documents,
+        max_batch_size=2,
+        max_workers=1,
+        upload_page_size=4,
+    )
+    report = pipeline.run(make_chunks(8))
+
+    assert report.chunks_indexed == 4
+    [failed] = report.failed_batches
+    assert failed.stage == "upload"
+    assert len(failed.chunk_ids) == 4
@@ -0,0 +1,147 @@
+import io
+import os
+import threading
+import time
+
+import pytest
+
+from RAG.ingest_jobs import IngestJobQueue, UploadTooLargeError
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    ran = []
+    done = threading.Event()
+
+    def run_job(path, filename, progress):
+        with open(path, "rb") as f:
+            ran.append((filename, f.read()))
+        done.set()
+
+    queue = IngestJobQueue(
+        run_job, str(tmp_path / "spool"), db_path=str(tmp_path / "jobs.sqlite")
+    )
+    queue.ran, queue.done = ran, done
+    return queue
+
+
+def test_submit_spools_blocks_of_an_iterator(jobs):
+    blocks = (b"block %d\n" % i for i in range(1000))
+    job_id = jobs.submit(blocks, "notes.txt")
+
+    assert jobs.done.wait(5)
+    assert jobs.ran == [("notes.txt", b"".join(b"block %d\n" % i for i in range(1000)))]
+    jobs._queue.join()
+    assert jobs.status(job_id)["status"] == "succeeded"
+
+
+def test_submit_reads_file_like_objects(jobs):
+    jobs.submit(io.BytesIO(b"x" * 3_000_000), "big.txt")
+
+    assert jobs.done.wait(5)
+    assert jobs.ran[0][1] == b"x" * 3_000_000
+
+
+def test_upload_over_the_limit_is_rejected_while_streaming(jobs):
+    read = []
+
+    def blocks():
+        for i in range(100):
+            read.append(i)
+            yield b"x" * 1024
+
+    with pytest.raises(UploadTooLargeError):
+        jobs.submit(blocks(), "big.txt", max_bytes=10 * 1024)
+
+    # Spooling stops at the first block over the limit and leaves no file
+    assert len(read) == 11
+    assert list(jobs.spool_dir.iterdir()) == []
+    assert jobs._execute("SELECT COUNT(*) FROM jobs")[0][0] == 0
+
+
+def test_empty_upload_is_rejected(jobs):
+    with pytest.raises(ValueError):
+        jobs.submit(iter([]), "empty.txt")
+
+    assert list(jobs.spool_dir.iterdir()) == []
+
+
+def wait_for(jobs, job_id, status, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = jobs.status(job_id)
+        if job["status"] == status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Job {job_id} is {jobs.status(job_id)['status']}")
+
+
+def test_jobs_report_progress_and_failures(tmp_path):
+    release = threading.Event()
+
+    def run_job(path, filename, progress):
+        progress({"pages_parsed": 2, "chunks_embedded": 5, "chunks_indexed": 3})
+        release.wait(5)
+        if filename == "bad.txt":
+            raise RuntimeError("Cannot parse")
+        progress({"pages_parsed": 2, "chunks_embedded": 8, "chunks_indexed": 8})
+
+    jobs = IngestJobQueue(
+        run_job,
+        str(tmp_path / "spool"),
+        db_path=str(tmp_path / "jobs.sqlite"),
+        progress_interval=0,
+    )
+    first = jobs.submit([b"text"], "good.txt")
+    second = jobs.submit([b"text"], "bad.txt")
+
+    job = wait_for(jobs, first, "running")
+    assert job["chunks_embedded"] == 5
+    assert jobs.status(second)["queue_position"] == 0
+    assert jobs.status(second)["status"] == "queued"
+    release.set()
+
+    job = wait_for(jobs, first, "succeeded")
+    assert (job["chunks_embedded"], job["chunks_indexed"]) == (8, 8)
+    job = wait_for(jobs, second, "failed")
+    assert job["error"] == "Cannot parse"
+    # Spool files are removed once their job finishes
+    jobs._queue.join()
+    assert list(jobs.spool_dir.iterdir()) == []
+    assert jobs.status("unknown") is None
+
+
+def test_unfinished_jobs_resume_after_a_restart(tmp_path):
+    blocked = threading.Event()
+
+    def never_finishes(path, filename, progress):
+        blocked.wait()
+
+    spool, db_path = str(tmp_path / "spool"), str(tmp_path / "jobs.sqlite")
+    jobs = IngestJobQueue(never_finishes, spool, db_path=db_path)
+    running = jobs.submit([b"one"], "one.txt")
+    queued = jobs.submit([b"two"], "two.txt")
+    wait_for(jobs, running, "running")
+
+    ran = []
+    restarted = IngestJobQueue(
+        lambda path, filename, progress: ran.append(open(path, "rb").read()),
+        spool,
+        db_path=db_path,
+    )
+    wait_for(restarted, queued, "succeeded")
+    wait_for(restarted, running, "succeeded")
+    assert sorted(ran) == [b"one", b"two"]
+    blocked.set()
+
+
+def test_sweep_removes_only_stale_unreferenced_files(jobs):
+    stale = jobs.spool_dir / "stale.pdf"
+    stale.write_bytes(b"x")
+    fresh = jobs.spool_dir / "fresh.pdf"
+    fresh.write_bytes(b"x")
+    old = time.time() - jobs.spool_ttl_seconds - 60
+    os.utime(stale, (old, old))
+
+    assert jobs.sweep() == 1
+    assert not stale.exists() and fresh.exists()
@@ -0,0 +1,99 @@
+import json
+
+from RAG.ingest_manifest import IngestManifest
+
+PARAGRAPHS = [
+    f"Paragraph {i} describes hotel number {i} near the river in great detail. " * 6
+    for i in range(12)
+]
+
+
+def documents(paragraphs, chunk_numbers=None):
+    return [
+        {
+            "content": text,
+            "meta_json_string": json.dumps({"chunk": number}),
+        }
+        for text, number in zip(
+            paragraphs, chunk_numbers or range(1, len(paragraphs) + 1)
+        )
+    ]
+
+
+def ingest(manifest, docs):
+    plan = manifest.plan("a.txt")
+    changed = list(plan.filter_changed(docs))
+    manifest.apply("a.txt", plan.changed, plan.delete)
+    return plan, changed
+
+
+def test_only_new_and_changed_chunks_pass_through():
+    manifest = IngestManifest(":memory:")
+    plan, changed = ingest(manifest, documents(PARAGRAPHS[:4]))
+    assert len(changed) == 4
+    assert len(manifest.chunk_ids("a.txt")) == 4
+
+    plan, changed = ingest(manifest, documents(PARAGRAPHS[:4]))
+    assert changed == []
+    assert plan.unchanged == 4
+    assert plan.delete == []
+
+    edited = PARAGRAPHS[:2] + ["A new paragraph."] + PARAGRAPHS[3:4]
+    plan, changed = ingest(manifest, documents(edited))
+    assert [d["content"] for d in changed] == ["A new paragraph."]
+    assert len(plan.delete) == 1
+    assert len(manifest.chunk_ids("a.txt")) == 4
+
+
+def test_ids_are_stable_and_unique_for_repeated_chunks():
+    manifest = IngestManifest(":memory:")
+    _, first = ingest(manifest, documents([PARAGRAPHS[0]] * 3))
+    ids = [d["id"] for d in first]
+
+    assert len(set(ids)) == 3
+    plan = manifest.plan("a.txt")
+    again = documents([PARAGRAPHS[0]] * 3)
+    list(plan.filter_changed(again))
+    assert [d["id"] for d in again] == ids
+
+
+def test_moved_chunks_are_reuploaded_with_their_position():
+    manifest = IngestManifest(":memory:")
+    _, first = ingest(manifest, documents(PARAGRAPHS[:4]))
+
+    # Inserting a chunk shifts the numbers of every chunk after it
+    plan, changed = ingest(manifest, documents(["Inserted."] + PARAGRAPHS[:4]))
+
+    assert [d["content"] for d in changed] == ["Inserted."] + PARAGRAPHS[:4]
+    # Moved chunks keep their ids, so they are replaced rather than duplicated
+    assert [d["id"] for d in changed[1:]] == [d["id"] for d in first]
+    assert plan.delete == []
+    assert ingest(manifest, documents(["Inserted."] + PARAGRAPHS[:4]))[1] == []
+
+
+def test_reingest_keeps_chunk_numbers_consistent(rag_system, tmp_path):
+    path = tmp_path / "hotels.txt"
+    path.write_text("\n\n".join(PARAGRAPHS), encoding="utf-8")
+    rag_system.ingest_many([str(path)])
+    store = rag_system.search_client
+    first_count = store.get_document_count()
+
+    assert rag_system.ingest_many([str(path)])["chunks_indexed"] == 0
+
+    path.write_text(
+        "\n\n".join(["An inserted introduction. " * 30] + PARAGRAPHS),
+        encoding="utf-8",
+    )
+    rag_system.ingest_many([str(path)])
+
+    stored = [
+        json.loads(store._documents[row]["meta_json_string"])
+        for row in store._rows.values()
+    ]
+    stored.sort(key=lambda meta: meta["chunk"])
+    assert [meta["chunk"] for meta in stored] == list(range(1, len(stored) + 1))
+    assert len(stored) > first_count
+    # Text blocks carry no page, so only offsets tell chunks apart
+    for meta, following in zip(stored, stored[1:]):
+        assert meta["start"] < following["start"] <= meta["end"]
+    assert len(rag_system.manifest.chunk_ids(str(path))) == len(stored)
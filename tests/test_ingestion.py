@@ -0,0 +1,88 @@
+import json
+
+import pytest
+from langchain.schema import Document
+
+from RAG import streaming_loader
+
+PAGES = [
+    f"Page {i} lists the hotels of borough {i} one by one. " * 60 for i in range(40)
+]
+
+
+@pytest.fixture
+def failing_loader(monkeypatch):
+    """Register .boom files: their pages parse until the word BOOM."""
+
+    def iter_pages(stream, source):
+        for number, text in enumerate(stream.read().decode().split("\f")):
+            if text == "BOOM":
+                raise ValueError(f"Corrupt page {number}")
+            yield Document(page_content=text, metadata={"source": source})
+
+    monkeypatch.setitem(streaming_loader._LOADERS, ".boom", iter_pages)
+
+
+def indexed_files(store):
+    return sorted(
+        {
+            json.loads(doc["meta_json_string"])["filepath"]
+            for doc in store._documents
+            if doc
+        }
+    )
+
+
+def test_chunks_of_a_file_failing_midway_are_removed(
+    rag_system, tmp_path, failing_loader
+):
+    good = tmp_path / "good.txt"
+    good.write_text("\n\n".join(PAGES), encoding="utf-8")
+    bad = tmp_path / "bad.boom"
+    bad.write_text("\f".join(PAGES + ["BOOM"]), encoding="utf-8")
+
+    result = rag_system.ingest_many([str(bad), str(good)])
+
+    assert result["files_indexed"] == [str(good)]
+    assert result["files_failed"] == {str(bad): "Corrupt page 40"}
+    store = rag_system.search_client
+    assert indexed_files(store) == [str(good)]
+    assert store.get_document_count() == len(rag_system.manifest.chunk_ids(str(good)))
+    assert rag_system.manifest.chunk_ids(str(bad)) == {}
+
+
+def test_failed_reingest_keeps_the_chunks_already_recorded(
+    rag_system, tmp_path, failing_loader
+):
+    path = tmp_path / "hotels.boom"
+    path.write_text("\f".join(PAGES[:3]), encoding="utf-8")
+    rag_system.ingest_many([str(path)])
+    recorded = rag_system.manifest.chunk_ids(str(path))
+
+    path.write_text("\f".join(PAGES + ["BOOM"]), encoding="utf-8")
+    # Small batches and pages, so some are uploaded before the error propagates
+    rag_system.embedding_pipeline.max_batch_size = 4
+    rag_system.embedding_pipeline.upload_page_size = 10
+    with open(path, "rb") as f, pytest.raises(ValueError):
+        rag_system.ingest(f, str(path))
+
+    # Only the new chunks of the failed run are deleted again
+    store = rag_system.search_client
+    assert sorted(store._rows) == sorted(recorded)
+    assert rag_system.manifest.chunk_ids(str(path)) == recorded
+
+
+def test_load_documents_returns_the_chunks(rag_system, tmp_path):
+    path = tmp_path / "hotels.txt"
+    path.write_text("\n\n".join(PAGES), encoding="utf-8")
+
+    documents = rag_system.load_documents_from_file(str(path))
+
+    assert all(isinstance(doc, Document) for doc in documents)
+    assert "".join(PAGES[0].split()) in "".join(
+        "".join(doc.page_content.split()) for doc in documents
+    )
+    assert [doc.metadata["chunk"] for doc in documents] == list(
+        range(1, len(documents) + 1)
+    )
+    assert rag_system.search_client.get_document_count() == len(documents)
@@ -0,0 +1,116 @@
+import math
+import random
+
+import pytest
+
+from RAG.lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize
+
+WORDS = [f"term{i}" for i in range(300)]
+
+
+def random_document(rng: random.Random):
+    # Zipf-like term frequencies give long and short posting lists
+    weights = [1 / (i + 1) for i in range(len(WORDS))]
+    return {
+        "title": " ".join(rng.choices(WORDS, weights, k=rng.randint(1, 5))),
+        "content": " ".join(rng.choices(WORDS, weights, k=rng.randint(10, 80))),
+    }
+
+
+def brute_force(index: LexicalIndex, documents, removed, query: str):
+    """
+    Exhaustive BM25F over the live documents, as LexicalIndex defines it;
+    removed documents still count towards document frequencies.
+    """
+    terms = set(tokenize(query))
+    fields = {
+        key: [tokenize(doc.get(name, "")) for name in index.fields]
+        for key, doc in documents.items()
+    }
+    all_fields = list(fields.values()) + removed
+    averages = [
+        sum(len(f[i]) for f in fields.values()) / len(fields) or 1.0
+        for i in range(len(index.fields))
+    ]
+    scores = {}
+    for term in terms:
+        df = sum(any(term in f for f in doc) for doc in all_fields)
+        if not df:
+            continue
+        idf = math.log(1 + (len(fields) - df + 0.5) / (df + 0.5))
+        for key, doc in fields.items():
+            tf = sum(
+                weight
+                * doc[i].count(term)
+                / (1 - index.b + index.b * len(doc[i]) / averages[i])
+                for i, weight in enumerate(index.field_weights.values())
+            )
+            if tf:
+                weight = tf * (index.k1 + 1) / (index.k1 + tf)
+                scores[key] = scores.get(key, 0.0) + idf * weight
+    return scores
+
+
+def assert_top_k(found, expected, k):
+    """found holds the k best of expected; ties may be broken either way."""
+    best = sorted(expected.values(), reverse=True)[:k]
+    assert [score for _, score in found] == pytest.approx(best, rel=1e-4)
+    for key, score in found:
+        assert score == pytest.approx(expected[key], rel=1e-4)
+
+
+def test_pruned_search_matches_brute_force_after_updates():
+    rng = random.Random(7)
+    index = LexicalIndex()
+    documents = {}
+    removed = []
+    for i in range(400):
+        documents[f"doc{i}"] = random_document(rng)
+        index.add(f"doc{i}", documents[f"doc{i}"])
+
+    queries = [" ".join(rng.sample(WORDS[:60], 3)) for _ in range(20)]
+    for query in queries:
+        expected = brute_force(index, documents, removed, query)
+        assert_top_k(index.search(query, k=10), expected, 10)
+
+    # Removals change the length norms the pruning bounds were computed with
+    for i in range(0, 400, 3):
+        document = documents.pop(f"doc{i}")
+        removed.append([tokenize(document[name]) for name in index.fields])
+        assert index.remove(f"doc{i}")
+    for i in range(400, 450):
+        documents[f"doc{i}"] = random_document(rng)
+        index.add(f"doc{i}", documents[f"doc{i}"])
+
+    assert len(index) == len(documents)
+    for query in queries:
+        found = index.search(query, k=10)
+        assert {key for key, _ in found} <= set(documents)
+        assert_top_k(found, brute_force(index, documents, removed, query), 10)
+
+
+def test_title_matches_weigh_more():
+    index = LexicalIndex()
+    index.add("title", {"title": "hotel", "content": "rooms and prices"})
+    index.add("content", {"title": "prices", "content": "hotel and rooms"})
+
+    assert [key for key, _ in index.search("hotel")] == ["title", "content"]
+
+
+def test_replacing_and_removing_documents():
+    index = LexicalIndex()
+    index.add("a", {"content": "old words"})
+    index.add("a", {"content": "new words"})
+
+    assert len(index) == 1
+    assert index.search("old") == []
+    assert [key for key, _ in index.search("new")] == ["a"]
+    assert index.remove("a")
+    assert not index.remove("a")
+    assert index.search("new") == []
+
+
+def test_reciprocal_rank_fusion_prefers_documents_in_both_lists():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a", "d"]])
+
+    assert [key for key, _ in fused][:2] == ["a", "c"]
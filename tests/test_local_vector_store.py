@@ -0,0 +1,120 @@
+import os
+
+import numpy as np
+import pytest
+
+from RAG.local_vector_store import LocalVectorStore, get_default_store
+from RAG.stubs import hash_embedding
+
+TOPICS = ["hotels", "museums", "parks", "theatres", "markets", "bridges", "pubs"]
+
+
+def document(i, topic=None):
+    topic = topic or TOPICS[i % len(TOPICS)]
+    text = f"Guide {i} to the {topic} of London"
+    return {
+        "id": f"doc-{i}",
+        "content": text,
+        "title": f"{topic}.pdf",
+        "contentVector": hash_embedding(f"{topic} {topic} {i}"),
+    }
+
+
+def assert_vectors_match_documents(store, replaced=()):
+    """Every live document is the nearest neighbour of its own vector."""
+    replaced = {doc["id"]: doc for doc in replaced}
+    for doc in store._documents:
+        if doc is None:
+            continue
+        i = int(doc["id"].split("-")[1])
+        vector = replaced.get(doc["id"], document(i))["contentVector"]
+        [hit] = store.vector_search(vector, k=1, exact=True)
+        assert hit["id"] == doc["id"]
+
+
+def test_upload_search_delete_and_reload(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    store.upload_documents([document(i) for i in range(20)])
+    zoos = document(3, "zoos")
+    store.merge_or_upload_documents([zoos])
+    results = store.delete_documents([{"id": "doc-5"}, {"id": "missing"}])
+
+    assert [r.succeeded for r in results] == [True, False]
+    assert store.get_document_count() == 19
+    assert store.text_search("zoos", k=1)[0]["id"] == "doc-3"
+    assert_vectors_match_documents(store, [zoos])
+
+    reloaded = LocalVectorStore(str(tmp_path))
+    assert reloaded.get_document_count() == 19
+    assert reloaded.vector_search(document(5)["contentVector"], k=1)[0]["id"] != "doc-5"
+    assert_vectors_match_documents(reloaded, [zoos])
+
+
+def test_hybrid_search_fuses_text_and_vectors(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    store.upload_documents([document(i) for i in range(20)])
+    hits = store.hybrid_search("museums", [document(1)["contentVector"]], k=3)
+
+    assert hits[0]["id"] == "doc-1"
+    assert all("museums" in hit["content"] for hit in hits)
+
+
+def test_interrupted_upload_leaves_no_orphan_vectors(tmp_path, monkeypatch):
+    store = LocalVectorStore(str(tmp_path))
+    store.upload_documents([document(i) for i in range(5)])
+
+    # Crash after the vectors were appended but before the log was written
+    def crash(records):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(store, "_append_log", crash)
+    with pytest.raises(OSError):
+        store.upload_documents([document(i) for i in range(5, 8)])
+    monkeypatch.undo()
+
+    # The failed documents are gone in this process and after a restart
+    assert store.get_document_count() == 5
+    store.upload_documents([document(i) for i in range(8, 12)])
+    assert_vectors_match_documents(store)
+
+    reloaded = LocalVectorStore(str(tmp_path))
+    assert reloaded.get_document_count() == 9
+    reloaded.upload_documents([document(i) for i in range(12, 15)])
+    assert_vectors_match_documents(reloaded)
+    assert_vectors_match_documents(LocalVectorStore(str(tmp_path)))
+
+
+def test_orphan_vectors_are_trimmed_on_load(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    store.upload_documents([document(i) for i in range(5)])
+    # What a process killed between the two writes leaves behind
+    orphans = np.asarray([document(i)["contentVector"] for i in range(5, 8)])
+    with open(tmp_path / "vectors.f32", "ab") as f:
+        f.write(orphans.astype(np.float32).tobytes())
+    with open(tmp_path / "documents.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"op": "upsert", "row": 5, "doc": {"id": "doc-')
+
+    reloaded = LocalVectorStore(str(tmp_path))
+    assert os.path.getsize(tmp_path / "vectors.f32") == 5 * store.dimensions * 4
+    reloaded.upload_documents([document(i) for i in range(8, 12)])
+    assert reloaded.get_document_count() == 9
+    assert_vectors_match_documents(LocalVectorStore(str(tmp_path)))
+
+
+def test_ivf_is_built_past_the_threshold(tmp_path):
+    store = LocalVectorStore(str(tmp_path), ivf_min_rows=200, nprobe=64)
+    store.upload_documents([document(i) for i in range(150)])
+    assert store._centroids is None
+
+    store.upload_documents([document(i) for i in range(150, 250)])
+    assert store._centroids is not None
+    for i in range(0, 250, 25):
+        vector = document(i)["contentVector"]
+        assert store.vector_search(vector, k=1)[0]["id"] == f"doc-{i}"
+
+
+def test_default_store_is_shared_per_path(tmp_path):
+    path = str(tmp_path / "index")
+
+    assert get_default_store(path) is get_default_store(os.path.join(path, "."))
+    assert get_default_store(path) is not get_default_store(str(tmp_path / "other"))
@@ -0,0 +1,103 @@
+import pytest
+
+from question_bank import QuestionBank, stem_tokens
+
+OPTIONS = "\nA) Paris\nB) Rome\nC) Berlin\nD) Madrid"
+
+
+@pytest.fixture
+def bank(tmp_path):
+    bank = QuestionBank(str(tmp_path / "questions.sqlite"))
+    yield bank
+    bank.close()
+
+
+def test_exact_repeats_are_rejected(bank):
+    first = bank.add("easy", "Europe", "What is the capital of France?" + OPTIONS, "A")
+
+    assert first is not None
+    # Case, punctuation and options do not matter
+    assert (
+        bank.add("easy", "Europe", "what is the CAPITAL of france" + "\nA) x", "B")
+        is None
+    )
+    assert bank.count("easy") == 1
+
+
+def test_near_duplicates_are_rejected(bank):
+    bank.add(
+        "easy",
+        "Europe",
+        "Which city is the capital and largest city of France?" + OPTIONS,
+        "A",
+    )
+
+    assert (
+        bank.add(
+            "easy",
+            "Geography",
+            "Which city is the capital and the largest city in France?" + OPTIONS,
+            "A",
+        )
+        is None
+    )
+    assert (
+        bank.add(
+            "easy",
+            "Europe",
+            "Which river flows through the city of Rome?" + OPTIONS,
+            "B",
+        )
+        is not None
+    )
+
+
+def test_duplicates_are_checked_per_tier(bank):
+    text = "What is the capital of France?" + OPTIONS
+
+    assert bank.add("easy", "Europe", text, "A") is not None
+    assert bank.add("hard", "Europe", text, "A") is not None
+    assert bank.count() == 2
+
+
+def test_sample_picks_distinct_topics_and_skips_excluded(bank):
+    subjects = ["rivers", "mountains", "deserts", "islands", "volcanoes", "lakes"]
+    ids = {}
+    for i, subject in enumerate(subjects):
+        topic = f"Topic {i % 3}"
+        ids[i] = bank.add("easy", topic, f"Which {subject} are the largest?", "A")
+
+    sampled = bank.sample("easy", 3)
+    assert len({q.topic for q in sampled}) == 3
+
+    excluded = [ids[0], ids[3]]
+    for _ in range(10):
+        sampled = bank.sample("easy", 3, exclude=excluded)
+        assert not {q.id for q in sampled} & set(excluded)
+        assert {q.topic for q in sampled} == {"Topic 1", "Topic 2"}
+
+
+def test_sample_prefers_least_served(bank):
+    served = bank.add("easy", "Europe", "What is the capital of France?", "A")
+    fresh = bank.add("easy", "Europe", "Which river flows through Rome?", "B")
+    bank.mark_served(served)
+
+    for _ in range(10):
+        [question] = bank.sample("easy", 1)
+        assert question.id == fresh
+
+
+def test_bank_persists(tmp_path):
+    path = str(tmp_path / "questions.sqlite")
+    bank = QuestionBank(path)
+    bank.add("easy", "Europe", "What is the capital of France?", "A")
+    bank.close()
+
+    bank = QuestionBank(path)
+    assert bank.count("easy") == 1
+    assert bank.add("easy", "Europe", "What is the capital of France?", "A") is None
+    bank.close()
+
+
+def test_stem_tokens_ignore_short_words():
+    assert stem_tokens("Is it in the EU, or not?") == ["not", "the"]
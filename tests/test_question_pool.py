@@ -0,0 +1,157 @@
+import itertools
+import threading
+import time
+
+import pytest
+
+import question_pool
+from question_bank import QuestionBank
+from question_pool import MAX_CONSECUTIVE_FAILURES, MAX_REJECTED_FILLS, QuestionPool
+
+OPTIONS = "\nA) Yes\nB) No\nC) Maybe\nD) Never"
+SUBJECTS = itertools.cycle(
+    ["volcano", "glacier", "desert", "canyon", "delta", "island", "reef", "geyser"]
+)
+
+
+@pytest.fixture
+def bank(tmp_path):
+    bank = QuestionBank(str(tmp_path / "questions.sqlite"))
+    yield bank
+    bank.close()
+
+
+@pytest.fixture
+def fast_backoff(monkeypatch):
+    """Record the backoff pauses and keep them short."""
+    sleeps = []
+    sleep = time.sleep
+
+    def record(seconds):
+        sleeps.append(seconds)
+        sleep(0.001)
+
+    monkeypatch.setattr(question_pool.time, "sleep", record)
+    return sleeps
+
+
+def counter():
+    """A generate() that writes a distinct question on every call."""
+    calls = itertools.count()
+
+    def generate(topic, tier):
+        n = next(calls)
+        return f"Is the {next(SUBJECTS)} number {n} about {topic}?" + OPTIONS, "A"
+
+    return generate
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "Timed out"
+        time.sleep(0.005)
+
+
+def test_rounds_offer_distinct_topics_and_unpicked_questions_return():
+    topics = itertools.cycle([["Rivers", "rivers", "Lakes"], ["Seas"]])
+    pool = QuestionPool(lambda: next(topics), counter(), ["easy", "hard"], size=3)
+
+    with pool:
+        offered = pool.draw_round("easy", timeout=5)
+        assert len({q.topic.casefold() for q in offered}) == 2
+        assert all(q.tier == "easy" for q in offered)
+        # A refill may overshoot the buffer size, but never runs once it is full
+        wait_until(lambda: pool.ready("easy") >= 3)
+        time.sleep(0.05)
+        ready = pool.ready("easy")
+        pool.put_back(offered[1])
+        assert pool.ready("easy") == ready + 1
+    assert pool.stats["rounds"] == 1
+
+
+def test_rejected_refills_back_off_and_surface_the_error(fast_backoff):
+    def broken(topic, tier):
+        raise ValueError("No options")
+
+    pool = QuestionPool(lambda: ["Rivers", "Lakes"], broken, ["easy"], workers=1)
+
+    with pool, pytest.raises(RuntimeError, match="keeps failing"):
+        pool.draw_round("easy", timeout=5)
+    # Players get the error on the last failure, before its pause
+    assert fast_backoff[: MAX_CONSECUTIVE_FAILURES - 1] == [2, 4, 8, 16]
+    assert pool.stats["rejected"] >= 2 * MAX_CONSECUTIVE_FAILURES
+
+
+def test_bank_fill_gives_up_on_a_tier_the_model_only_repeats(bank, monkeypatch):
+    monkeypatch.setattr(question_pool, "MAX_BACKOFF_SECONDS", 0.001)
+    calls = []
+
+    def repeats(topic, tier):
+        calls.append(topic)
+        return "Is the same question asked again?" + OPTIONS, "A"
+
+    pool = QuestionPool(
+        lambda: ["Rivers"],
+        repeats,
+        ["easy"],
+        size=0,
+        workers=1,
+        bank=bank,
+        bank_target=10,
+    )
+    with pool:
+        wait_until(lambda: pool._unfillable == {"easy"})
+        made = len(calls)
+        time.sleep(0.05)
+        # Nothing left to fill: the workers wait instead of calling the model
+        assert len(calls) == made == MAX_REJECTED_FILLS + 1
+    assert bank.count("easy") == 1
+
+
+def test_bank_is_filled_up_to_the_target_without_holding_the_lock(bank, monkeypatch):
+    counting = threading.Event()
+    release = threading.Event()
+    count = bank.count
+
+    def slow_count(tier=None):
+        counting.set()
+        release.wait(5)
+        return count(tier)
+
+    monkeypatch.setattr(bank, "count", slow_count)
+    pool = QuestionPool(
+        lambda: ["Rivers", "Lakes"],
+        counter(),
+        ["easy", "hard"],
+        size=0,
+        bank=bank,
+        bank_target=3,
+    )
+    with pool:
+        assert counting.wait(5)
+        threading.Timer(1, release.set).start()
+        started = time.monotonic()
+        pool.ready("easy")
+        assert time.monotonic() - started < 0.5
+        release.set()
+        wait_until(lambda: min(count("easy"), count("hard")) >= 3)
+    assert pool.stats["generated"] >= 6
+
+
+def test_offline_pool_serves_unused_bank_questions_only(bank):
+    generate = counter()
+    for topic in ["Rivers", "Lakes", "Seas"]:
+        bank.add("easy", topic, *generate(topic, "easy"))
+
+    def unused(*args):
+        raise AssertionError("Offline pools never call the model")
+
+    pool = QuestionPool(unused, unused, ["easy"], size=2, bank=bank, offline=True)
+    with pool:
+        first = pool.draw_round("easy", timeout=5)
+        second = pool.draw_round("easy", timeout=5)
+        with pytest.raises(RuntimeError, match="no more tier easy"):
+            pool.draw_round("easy", timeout=5)
+    assert len(first) == 2 and len(second) == 1
+    assert len({q.bank_id for q in first + second}) == 3
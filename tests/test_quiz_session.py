@@ -0,0 +1,71 @@
+from quiz_session import QuizSession, question_stem, stem_hash
+
+OPTIONS = "\nA) Wisła\nB) Odra\nC) Warta\nD) Bug"
+
+
+def question(n):
+    return f"Która rzeka jest w zagadce numer {n}?" + OPTIONS
+
+
+def test_stems_drop_the_options_and_hashes_ignore_formatting():
+    assert question_stem(question(1)) == "Która rzeka jest w zagadce numer 1?"
+    assert question_stem("Line one\nline two\nA. yes\nB. no") == "Line one line two"
+    assert stem_hash("Która  rzeka, jest NAJDŁUŻSZA?") == stem_hash(
+        "która rzeka jest najdłuższa"
+    )
+    assert stem_hash("Która rzeka?") != stem_hash("Które jezioro?")
+
+
+def test_repeats_are_detected_and_not_recorded_twice():
+    session = QuizSession()
+
+    assert not session.asked(question(1))
+    assert session.record("Rzeki", question(1))
+    assert session.asked("KTÓRA rzeka jest w zagadce numer 1\nA) Inna")
+    assert not session.record("Geografia", question(1).upper())
+    assert list(session.recent) == [question_stem(question(1))]
+    assert session.summary() is None
+
+
+def test_older_questions_are_folded_into_the_topic_summary():
+    session = QuizSession(history_window=2)
+    for n, topic in enumerate(["Rzeki", "Góry", "Rzeki", "Morza", "Miasta"]):
+        session.record(topic, question(n))
+
+    assert list(session.recent) == [question_stem(question(n)) for n in (3, 4)]
+    # Topics are listed once, most recently summarized last
+    assert list(session.summary_topics) == ["Góry", "Rzeki"]
+    [message] = session.history_messages()
+    assert message["role"] == "assistant"
+    assert message["content"].splitlines() == [
+        session.summary() + ".",
+        "Ostatnie pytania:",
+        f"- {question_stem(question(3))}",
+        f"- {question_stem(question(4))}",
+    ]
+    # Summarized questions are still rejected as repeats
+    assert session.asked(question(0))
+
+
+def test_history_stays_bounded():
+    session = QuizSession(history_window=3, summary_topics=4)
+    for n in range(100):
+        session.record(f"Temat {n}", question(n))
+
+    assert len(session.recent) == 3
+    assert list(session.summary_topics) == [f"Temat {n}" for n in range(93, 97)]
+    assert len(session.seen) == 100
+
+
+def test_without_a_window_every_question_is_summarized():
+    session = QuizSession(history_window=0)
+    assert session.history_messages() == []
+
+    session.record("Rzeki", question(1))
+    session.record("Góry", question(2))
+
+    assert list(session.recent) == []
+    assert session.history_messages() == [
+        {"role": "assistant", "content": session.summary() + "."}
+    ]
+    assert session.summary().endswith("Rzeki, Góry")
@@ -0,0 +1,188 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from RAG.rate_limit import (
+    DEFAULT_COMPLETION_TOKENS,
+    AdaptiveLimiter,
+    Priority,
+    current_priority,
+    estimate_payload_tokens,
+    request_priority,
+    retry_after_seconds,
+)
+
+
+def test_concurrency_limit_blocks_until_release():
+    limiter = AdaptiveLimiter(max_concurrency=1)
+    limiter.acquire()
+    admitted = threading.Event()
+
+    def second():
+        limiter.acquire()
+        admitted.set()
+
+    thread = threading.Thread(target=second, daemon=True)
+    thread.start()
+    assert not admitted.wait(0.1)
+    limiter.release()
+    assert admitted.wait(1)
+    thread.join(1)
+    assert limiter.stats["in_flight"] == 1
+
+
+def test_waiters_are_admitted_in_priority_order():
+    limiter = AdaptiveLimiter(max_concurrency=1)
+    limiter.acquire()
+    order = []
+
+    def waiter(priority):
+        limiter.acquire(priority=priority)
+        order.append(priority)
+        limiter.release()
+
+    threads = []
+    for priority in (Priority.BULK, Priority.BATCH, Priority.INTERACTIVE):
+        threads.append(threading.Thread(target=waiter, args=(priority,), daemon=True))
+        threads[-1].start()
+        # Let each thread queue before starting the next
+        while limiter.stats["waiting"] < len(threads):
+            time.sleep(0.001)
+    limiter.release()
+    for thread in threads:
+        thread.join(1)
+
+    assert order == [Priority.INTERACTIVE, Priority.BATCH, Priority.BULK]
+
+
+def test_bulk_requests_leave_headroom():
+    limiter = AdaptiveLimiter(max_concurrency=4, bulk_share=0.5)
+    limiter.acquire(priority=Priority.BULK)
+    limiter.acquire(priority=Priority.BULK)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(
+            asyncio.wait_for(limiter.acquire_async(priority=Priority.BULK), 0.05)
+        )
+    limiter.acquire(priority=Priority.INTERACTIVE)
+    assert limiter.stats["in_flight"] == 3
+
+
+def test_throttling_halves_the_limit_and_success_raises_it():
+    limiter = AdaptiveLimiter(max_concurrency=8)
+    for _ in range(8):
+        limiter.acquire()
+    limiter.on_response(429, {"retry-after-ms": "10"})
+    assert limiter.limit == 4
+    # One decrease per throttling episode
+    limiter.on_response(429, {"retry-after-ms": "10"})
+    assert limiter.limit == 4
+    assert limiter.stats["throttled"] == 2
+
+    limiter.on_response(200, {})
+    assert limiter.limit == pytest.approx(4.25)
+
+
+def test_throttling_pauses_admissions():
+    limiter = AdaptiveLimiter()
+    limiter.on_response(429, {"retry-after-ms": "100"})
+    started = time.monotonic()
+    limiter.acquire()
+
+    assert time.monotonic() - started >= 0.09
+
+
+def test_token_bucket_paces_requests():
+    # 6000 tokens per minute: a 1000-token burst, refilled at 100 tokens/s
+    limiter = AdaptiveLimiter(tokens_per_minute=6000)
+    started = time.monotonic()
+    limiter.acquire(tokens=1000)
+    limiter.release()
+    limiter.acquire(tokens=10)
+
+    assert time.monotonic() - started >= 0.09
+
+
+def test_remaining_tokens_header_syncs_the_bucket():
+    limiter = AdaptiveLimiter(tokens_per_minute=6000)
+    limiter.on_response(200, {"x-ratelimit-remaining-tokens": "5"})
+
+    assert limiter.stats["tokens_available"] == pytest.approx(5, abs=1)
+
+
+def test_cancelled_async_waiter_leaves_the_queue():
+    limiter = AdaptiveLimiter(max_concurrency=1)
+
+    async def main():
+        await limiter.acquire_async()
+        waiter = asyncio.ensure_future(limiter.acquire_async())
+        await asyncio.sleep(0.01)
+        assert limiter.stats["waiting"] == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert limiter.stats["waiting"] == 0
+        limiter.release()
+        # The slot was not taken by the cancelled waiter
+        await asyncio.wait_for(limiter.acquire_async(), 1)
+
+    asyncio.run(main())
+    assert limiter.stats["in_flight"] == 1
+    assert limiter.stats["admitted"] == 2
+
+
+def test_async_waiter_is_woken_by_a_thread():
+    limiter = AdaptiveLimiter(max_concurrency=1)
+    limiter.acquire()
+
+    async def main():
+        threading.Timer(0.05, limiter.release).start()
+        await asyncio.wait_for(limiter.acquire_async(), 1)
+
+    asyncio.run(main())
+    assert limiter.stats["in_flight"] == 1
+
+
+def test_priority_follows_the_context():
+    assert current_priority() == Priority.INTERACTIVE
+    with request_priority(Priority.BULK):
+        assert current_priority() == Priority.BULK
+    assert current_priority() == Priority.INTERACTIVE
+
+
+def test_retry_after_headers():
+    assert retry_after_seconds({"retry-after-ms": "250"}) == 0.25
+    assert retry_after_seconds({"retry-after": "2"}) == 2
+    assert retry_after_seconds({"retry-after": "soon"}) is None
+
+
+def test_chat_requests_reserve_their_completion():
+    small = estimate_payload_tokens(
+        {"messages": [{"role": "user", "content": "Hi"}], "max_tokens": 10}
+    )
+    large = estimate_payload_tokens(
+        {"messages": [{"role": "user", "content": "Hi"}], "max_tokens": 1000}
+    )
+
+    assert large - small == 990
+    assert estimate_payload_tokens({"input": [[1, 2, 3]]}) == 3
+
+
+def test_missing_or_null_completion_limits_use_the_default():
+    messages = [{"role": "user", "content": "Hi"}]
+    default = estimate_payload_tokens({"messages": messages})
+
+    assert estimate_payload_tokens({"messages": messages, "max_tokens": 5}) == (
+        default - DEFAULT_COMPLETION_TOKENS + 5
+    )
+    for limits in [
+        {"max_tokens": None},
+        {"max_completion_tokens": None},
+        {"max_tokens": None, "max_completion_tokens": None},
+    ]:
+        assert estimate_payload_tokens({"messages": messages, **limits}) == default
+    assert estimate_payload_tokens(
+        {"messages": messages, "max_tokens": None, "max_completion_tokens": 7}
+    ) == (default - DEFAULT_COMPLETION_TOKENS + 7)
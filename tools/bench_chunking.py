@@ -0,0 +1,134 @@
+"""
+Benchmark of the offset-based TextChunker against RecursiveCharacterTextSplitter.
+
+Splits a corpus built by repeating the text of the asset PDFs (or any text
+files given with --text) and reports throughput and peak traced memory for
+each splitter. The baseline includes what ingestion used to do per chunk:
+a Document per chunk and a json.dumps of its metadata. Both splitters run
+with the same chunk size and overlap in characters; the chunker is also
+timed in token mode.
+
+Usage:
+    python tools/bench_chunking.py --megabytes 50
+"""
+
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Iterable, List
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from pypdf import PdfReader
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from langchain.schema import Document
+
+from RAG.chunking import TextChunker
+
+ASSETS = Path(__file__).parent.parent / "assets"
+DEFAULT_PDFS = [ASSETS / "London Brochure.pdf", ASSETS / "niduc.pdf"]
+
+
+def load_pages(pdfs: List[Path], texts: List[Path], megabytes: float) -> List[Document]:
+    base = [
+        Document(page_content=page.extract_text() or "", metadata={"source": pdf.name})
+        for pdf in pdfs
+        for page in PdfReader(str(pdf)).pages
+    ]
+    base += [
+        Document(page_content=path.read_text(), metadata={"source": path.name})
+        for path in texts
+    ]
+    base = [page for page in base if page.page_content.strip()]
+    target = megabytes * 1024 * 1024
+    pages, size = [], 0
+    while size < target:
+        for page in base:
+            # Copy so repeated pages are distinct strings, as in a real corpus
+            text = page.page_content + f"\n{len(pages)}"
+            pages.append(
+                Document(
+                    page_content=text,
+                    metadata={**page.metadata, "page": len(pages) + 1},
+                )
+            )
+            size += len(text)
+    return pages
+
+
+def baseline(pages: List[Document], size: int, overlap: int) -> Iterable[Any]:
+    splitter = RecursiveCharacterTextSplitter(chunk_size=size, chunk_overlap=overlap)
+    for i, doc in enumerate(splitter.split_documents(pages)):
+        yield doc, json.dumps({"chunk": i + 1, "page": doc.metadata.get("page", "n/a")})
+
+
+def chunker(pages: List[Document], size: int, overlap: int, unit: str):
+    return TextChunker(size, overlap, unit).split_documents(pages)
+
+
+def run(label: str, split: Callable[[], Iterable], megabytes: float) -> None:
+    gc.collect()
+    started = time.perf_counter()
+    count = 0
+    for item in split():
+        # Read the text once, as embedding does
+        (item[0] if isinstance(item, tuple) else item).page_content
+        count += 1
+    elapsed = time.perf_counter() - started
+
+    gc.collect()
+    tracemalloc.start()
+    # Hold every chunk at once: the peak a consumer materialising the split pays
+    chunks = list(split())
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del chunks
+    print(
+        f"{label:<36} {count:>8} chunks {elapsed:>7.2f} s "
+        f"{megabytes / elapsed:>7.2f} MB/s {count / elapsed:>9.0f} chunks/s "
+        f"peak {peak / 1024 / 1024:>7.1f} MB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pdf", type=Path, nargs="*", default=DEFAULT_PDFS)
+    parser.add_argument("--text", type=Path, nargs="*", default=[])
+    parser.add_argument("--megabytes", type=float, default=20)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=100)
+    parser.add_argument("--token-chunk-size", type=int, default=256)
+    parser.add_argument("--token-chunk-overlap", type=int, default=32)
+    args = parser.parse_args()
+
+    pages = load_pages(args.pdf, args.text, args.megabytes)
+    megabytes = sum(len(p.page_content) for p in pages) / 1024 / 1024
+    print(f"Corpus: {len(pages)} pages, {megabytes:.1f} MB of text")
+
+    size, overlap = args.chunk_size, args.chunk_overlap
+    run(
+        "RecursiveCharacterTextSplitter",
+        lambda: baseline(pages, size, overlap),
+        megabytes,
+    )
+    run(
+        "TextChunker (chars)",
+        lambda: chunker(pages, size, overlap, "chars"),
+        megabytes,
+    )
+    run(
+        "TextChunker (tokens)",
+        lambda: chunker(
+            pages, args.token_chunk_size, args.token_chunk_overlap, "tokens"
+        ),
+        megabytes,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Benchmark of request latency with per-call clients against the shared pool.
+
+Starts a fake Azure OpenAI server (HTTPS with a throwaway self-signed
+certificate unless --no-tls) and sends chat completions through:
+
+- a new AzureOpenAI client per request, as the scripts did when each call
+  site built its own client;
+- the shared pooled client of RAG.clients;
+- the shared client with a per-deployment concurrency limit (with
+  --deployment-limit);
+- requests.post without a session, as the frontend did per click, and a
+  keep-alive requests.Session.
+
+Reports latency percentiles, throughput and the number of connections the
+server accepted.
+
+Usage:
+    python tools/bench_clients.py --requests 500 --concurrency 1 16
+    python tools/bench_clients.py --latency-ms 50 --deployment-limit 4
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, List
+
+import httpx
+import requests
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from openai import AzureOpenAI
+
+from RAG.clients import DEFAULT_API_VERSION, DeploymentLimits, create_http_client
+from RAG.stubs import FakeOpenAIServer
+
+DEPLOYMENT = "gpt-4o"
+MESSAGES = [{"role": "user", "content": "Context: London has many hotels.\n\nHi"}]
+
+
+def self_signed_certificate(directory: str) -> tuple:
+    certfile = os.path.join(directory, "cert.pem")
+    keyfile = os.path.join(directory, "key.pem")
+    subprocess.run(
+        [
+            "openssl",
+            "req",
+            "-x509",
+            "-newkey",
+            "rsa:2048",
+            "-nodes",
+            "-days",
+            "1",
+            "-subj",
+            "/CN=127.0.0.1",
+            "-addext",
+            "subjectAltName=IP:127.0.0.1",
+            "-keyout",
+            keyfile,
+            "-out",
+            certfile,
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return certfile, keyfile
+
+
+def run(
+    label: str,
+    call: Callable[[], None],
+    server: FakeOpenAIServer,
+    requests_count: int,
+    concurrency: int,
+) -> None:
+    def timed(_) -> float:
+        started = time.perf_counter()
+        call()
+        return (time.perf_counter() - started) * 1000
+
+    call()  # warm-up: imports, first connection
+    connections = server.connections
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies: List[float] = sorted(executor.map(timed, range(requests_count)))
+    elapsed = time.perf_counter() - started
+    print(
+        f"  {label:<34} p50 {statistics.median(latencies):>7.2f} ms  "
+        f"p95 {latencies[int(0.95 * (len(latencies) - 1))]:>7.2f} ms  "
+        f"{requests_count / elapsed:>7.1f} req/s  "
+        f"{server.connections - connections:>5} connections"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, nargs="*", default=[1, 16])
+    parser.add_argument("--latency-ms", type=float, default=10.0)
+    parser.add_argument("--deployment-limit", type=int, default=0)
+    parser.add_argument("--no-tls", action="store_true", help="Serve plain HTTP")
+    args = parser.parse_args()
+
+    workdir = tempfile.TemporaryDirectory()
+    certfile = keyfile = None
+    if not args.no_tls:
+        certfile, keyfile = self_signed_certificate(workdir.name)
+    verify = certfile or True
+
+    with FakeOpenAIServer(
+        latency_ms=args.latency_ms, certfile=certfile, keyfile=keyfile
+    ) as server:
+        chat_url = (
+            f"{server.url}/openai/deployments/{DEPLOYMENT}/chat/completions"
+            f"?api-version={DEFAULT_API_VERSION}"
+        )
+        payload = {"messages": MESSAGES}
+
+        def openai_client(http_client: httpx.Client) -> AzureOpenAI:
+            return AzureOpenAI(
+                api_version=DEFAULT_API_VERSION,
+                azure_endpoint=server.url,
+                api_key="bench",
+                http_client=http_client,
+            )
+
+        def per_call_client() -> None:
+            with openai_client(httpx.Client(verify=verify)) as client:
+                client.chat.completions.create(model=DEPLOYMENT, messages=MESSAGES)
+
+        shared = openai_client(create_http_client(DeploymentLimits(), verify))
+        limited = openai_client(
+            create_http_client(DeploymentLimits(args.deployment_limit), verify)
+        )
+        session = requests.Session()
+
+        scenarios = [
+            ("AzureOpenAI client per request", per_call_client),
+            (
+                "shared pooled AzureOpenAI client",
+                lambda: shared.chat.completions.create(
+                    model=DEPLOYMENT, messages=MESSAGES
+                ),
+            ),
+        ]
+        if args.deployment_limit:
+            scenarios.append(
+                (
+                    f"shared client, {args.deployment_limit} per deployment",
+                    lambda: limited.chat.completions.create(
+                        model=DEPLOYMENT, messages=MESSAGES
+                    ),
+                )
+            )
+        scenarios += [
+            (
+                "requests.post per call",
+                lambda: requests.post(chat_url, json=payload, verify=verify),
+            ),
+            (
+                "requests.Session",
+                lambda: session.post(chat_url, json=payload, verify=verify),
+            ),
+        ]
+
+        print(
+            f"Fake Azure OpenAI at {server.url}, {args.latency_ms:g} ms latency, "
+            f"{args.requests} requests per run"
+        )
+        for concurrency in args.concurrency:
+            print(f"\nconcurrency {concurrency}:")
+            for label, call in scenarios:
+                run(label, call, server, args.requests, concurrency)
+
+
+if __name__ == "__main__":
+    main()
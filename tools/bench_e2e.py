@@ -0,0 +1,386 @@
+"""
+End-to-end latency and throughput benchmark of the question answering path.
+
+Starts deterministic fake Azure OpenAI and Azure AI Search HTTP servers with
+configurable injected latency, points the real SDK clients at them, indexes
+the asset PDFs and then drives the ask_rag Function handler (--target handler)
+or RAGSystem.ask_question (--target rag) under concurrent load.
+
+Per-stage timings are collected for every request: query embedding, search
+(retrieval time outside rerank and packing, i.e. the search call), rerank,
+context packing, the whole retrieval, completion, source post-processing,
+ask_question and, for the handler, HTTP handling (handler time outside
+ask_question). Each stage is reported as percentiles
+and a log-scale histogram, and the results are saved as JSON; --compare
+prints the change against an earlier run.
+
+Recorded responses can be replayed with --recordings, a JSON file with
+optional "completions" (answer strings) and "search_results" (lists of
+search hits) lists, used round-robin instead of the synthetic responses.
+
+Usage:
+    python tools/bench_e2e.py --requests 200 --concurrency 1 8 32
+    python tools/bench_e2e.py --openai-latency-ms 300 --compare .cache/bench/e2e.json
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT / "src"))
+sys.path.append(str(ROOT / "src" / "azure_func"))
+
+from RAG.stubs import FakeOpenAIServer, FakeSearchServer
+
+DEFAULT_DOCUMENTS = [
+    ROOT / "assets" / "London Brochure.pdf",
+    ROOT / "assets" / "niduc.pdf",
+]
+INDEX_NAME = "bench"
+# Upper bounds (ms) of the histogram buckets: 0.25 ms to ~16 s, doubling.
+BUCKETS = [0.25 * 2**i for i in range(17)]
+
+
+class StageTimer:
+    """
+    Accumulates the time spent in instrumented methods per request.
+
+    Methods are wrapped on their class for the duration of the benchmark;
+    time is attributed to the request of the current context, which
+    asyncio.to_thread carries over to its worker thread.
+    """
+
+    def __init__(self):
+        self._stages: ContextVar[Optional[Dict[str, float]]] = ContextVar(
+            "bench_stages", default=None
+        )
+        self._patched: List[tuple] = []
+
+    def instrument(self, cls: type, name: str, stage: str) -> None:
+        original = getattr(cls, name)
+
+        @functools.wraps(original)
+        def wrapper(*args, **kwargs):
+            stages = self._stages.get()
+            started = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                if stages is not None:
+                    stages[stage] += (time.perf_counter() - started) * 1000
+
+        self._patched.append((cls, name, cls.__dict__.get(name)))
+        setattr(cls, name, wrapper)
+
+    def restore(self) -> None:
+        for cls, name, own in reversed(self._patched):
+            if own is None:
+                delattr(cls, name)
+            else:
+                setattr(cls, name, own)
+        self._patched.clear()
+
+    def measure(self, fn: Callable[[], Any]) -> Dict[str, float]:
+        stages = defaultdict(float)
+        token = self._stages.set(stages)
+        started = time.perf_counter()
+        try:
+            fn()
+        finally:
+            self._stages.reset(token)
+        stages["total"] = (time.perf_counter() - started) * 1000
+        return dict(stages)
+
+
+def summarize(timings: List[float]) -> Dict[str, Any]:
+    ordered = sorted(timings)
+
+    def percentile(p: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(p * len(ordered)) - 1))]
+
+    histogram = {}
+    for value in ordered:
+        bound = next((b for b in BUCKETS if value <= b), math.inf)
+        label = f"<={bound:g}ms" if bound != math.inf else f">{BUCKETS[-1]:g}ms"
+        histogram[label] = histogram.get(label, 0) + 1
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.mean(ordered),
+        "p50_ms": percentile(0.50),
+        "p90_ms": percentile(0.90),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": ordered[-1],
+        "histogram": histogram,
+    }
+
+
+def print_level(level: Dict[str, Any], show_histogram: bool) -> None:
+    print(
+        f"\nconcurrency {level['concurrency']}: {level['requests']} requests, "
+        f"{level['errors']} errors, {level['throughput_rps']:.1f} req/s"
+    )
+    print(f"  {'stage':<16} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for stage, summary in level["stages"].items():
+        print(
+            f"  {stage:<16} {summary['mean_ms']:>8.2f} {summary['p50_ms']:>8.2f} "
+            f"{summary['p95_ms']:>8.2f} {summary['p99_ms']:>8.2f} "
+            f"{summary['max_ms']:>8.2f}"
+        )
+    if show_histogram:
+        histogram = level["stages"]["total"]["histogram"]
+        widest = max(histogram.values())
+        for label, count in histogram.items():
+            bar = "#" * max(1, round(40 * count / widest))
+            print(f"  {label:>12} {count:>6} {bar}")
+
+
+def compare(results: Dict[str, Any], previous: Dict[str, Any]) -> None:
+    print(f"\nChange against {previous['created_at']} (p50 / p95):")
+    before = {level["concurrency"]: level for level in previous["levels"]}
+    for level in results["levels"]:
+        old = before.get(level["concurrency"])
+        if old is None:
+            continue
+        print(f"  concurrency {level['concurrency']}:")
+        for stage, summary in level["stages"].items():
+            if stage not in old["stages"]:
+                continue
+            changes = []
+            for key in ("p50_ms", "p95_ms"):
+                was = old["stages"][stage][key]
+                change = (summary[key] - was) / was * 100 if was else 0.0
+                changes.append(f"{was:8.2f} -> {summary[key]:8.2f} ({change:+6.1f}%)")
+            print(f"    {stage:<16} {'   '.join(changes)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--target", choices=["handler", "rag"], default="handler")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="*", default=[1, 8, 32])
+    parser.add_argument("--openai-latency-ms", type=float, default=50.0)
+    parser.add_argument("--search-latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument(
+        "--search-backend",
+        choices=["azure", "local"],
+        default="azure",
+        help="azure uses the fake Search server, local the in-process store",
+    )
+    parser.add_argument("--recordings", type=Path)
+    parser.add_argument(
+        "--documents", nargs="*", default=[str(p) for p in DEFAULT_DOCUMENTS]
+    )
+    parser.add_argument(
+        "--dataset", default=str(ROOT / "data" / "travel_evaluation_data.csv")
+    )
+    parser.add_argument(
+        "--answer-cache",
+        action="store_true",
+        help="Keep the semantic answer cache enabled (disabled by default)",
+    )
+    parser.add_argument("--histogram", action="store_true")
+    parser.add_argument("--output", default=".cache/bench/e2e.json")
+    parser.add_argument("--compare", type=Path, help="Earlier results to compare with")
+    args = parser.parse_args()
+
+    recordings = json.loads(args.recordings.read_text()) if args.recordings else None
+    openai_server = FakeOpenAIServer(
+        dimensions=args.dimensions,
+        latency_ms=args.openai_latency_ms,
+        jitter_ms=args.jitter_ms,
+        recordings=recordings,
+    ).start()
+    search_server = FakeSearchServer(
+        index_name=INDEX_NAME,
+        dimensions=args.dimensions,
+        latency_ms=args.search_latency_ms,
+        jitter_ms=args.jitter_ms,
+        recordings=recordings,
+    ).start()
+    workdir = tempfile.TemporaryDirectory()
+    os.environ.update(
+        {
+            "OPEN_AI_ENDPOINT": openai_server.url,
+            "API_OPEN_AI_KEY": "fake",
+            "EMBEDDING_MODEL_NAME": "fake-embedding",
+            "SEARCH_AI_ENDPOINT": search_server.url,
+            "SEARCH_AI_KEY": "fake",
+            "SEARCH_AI_INDEX_NAME": INDEX_NAME,
+            "SEARCH_BACKEND": args.search_backend,
+            "LOCAL_INDEX_PATH": os.path.join(workdir.name, "index"),
+            "EMBEDDING_CACHE_PATH": os.path.join(workdir.name, "embeddings.sqlite"),
+            "INGEST_MANIFEST_PATH": os.path.join(workdir.name, "manifest.sqlite"),
+            "INGEST_JOBS_PATH": os.path.join(workdir.name, "jobs.sqlite"),
+            "ANSWER_CACHE_ENABLED": "1" if args.answer_cache else "0",
+        }
+    )
+
+    # Imported after the environment points at the fakes.
+    import function_app
+    from azurefunctions.extensions.http.fastapi import Request
+    from langchain_openai import AzureChatOpenAI
+
+    from RAG.ai_search_langchain import (
+        NO_ANSWER_MESSAGE,
+        ContextPackingRetriever,
+        RAGSystem,
+    )
+    from RAG.context_packer import ContextPacker
+    from RAG.embedding_cache import CachedEmbeddings
+    from RAG.evaluation import load_dataset
+    from RAG.rerank import Reranker
+    from RAG.tokens import tokenizer_available
+
+    rag_system: RAGSystem = function_app.rag_system
+    if not tokenizer_available():
+        # LangChain tokenizes embedding inputs with tiktoken, which cannot
+        # load its encoding offline; send the texts as they are instead.
+        rag_system.embeddings.embeddings.check_embedding_ctx_length = False
+
+    result = rag_system.ingest_many(args.documents)
+    print(
+        f"Indexed {result['chunks_indexed']} chunks from "
+        f"{len(result['files_indexed'])} files"
+    )
+
+    timer = StageTimer()
+    timer.instrument(CachedEmbeddings, "embed_query", "embedding")
+    timer.instrument(CachedEmbeddings, "embed_documents", "embedding")
+    timer.instrument(ContextPackingRetriever, "_get_relevant_documents", "retrieval")
+    timer.instrument(Reranker, "rerank", "rerank")
+    timer.instrument(ContextPacker, "pack", "context_pack")
+    timer.instrument(AzureChatOpenAI, "_generate", "completion")
+    timer.instrument(RAGSystem, "_format_sources", "sources")
+    timer.instrument(RAGSystem, "ask_question", "ask_question")
+
+    questions = [case.question for case in load_dataset(args.dataset)]
+
+    def run_request(i: int) -> Dict[str, float]:
+        # Unique queries so the embedding cache does not hide the embedding call
+        query = f"{questions[i % len(questions)]} ({i})"
+        if args.target == "rag":
+            answers = []
+            stages = timer.measure(
+                lambda: answers.append(rag_system.ask_question(query)["answer"])
+            )
+            # ask_question reports a failed chain with its no-answer message
+            if answers[0] == NO_ANSWER_MESSAGE:
+                stages["error"] = 1.0
+            return stages
+        body = json.dumps({"query": query}).encode("utf-8")
+
+        async def receive():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        request = Request(
+            {
+                "type": "http",
+                "method": "POST",
+                "path": "/api/ask_rag",
+                "query_string": b"",
+                "headers": [(b"content-type", b"application/json")],
+            },
+            receive,
+        )
+        responses = []
+        stages = timer.measure(
+            lambda: responses.append(asyncio.run(function_app.ask_rag(request)))
+        )
+        if (
+            responses[0].status_code != 200
+            or json.loads(responses[0].body)["answer"] == NO_ANSWER_MESSAGE
+        ):
+            stages["error"] = 1.0
+        return stages
+
+    levels = []
+    try:
+        run_request(0)
+        for concurrency in args.concurrency:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                samples = list(executor.map(run_request, range(args.requests)))
+            elapsed = time.perf_counter() - started
+
+            by_stage: Dict[str, List[float]] = defaultdict(list)
+            for stages in samples:
+                stages["search"] = (
+                    stages.get("retrieval", 0.0)
+                    - stages.get("rerank", 0.0)
+                    - stages.get("context_pack", 0.0)
+                )
+                if args.target == "handler":
+                    stages["http"] = stages["total"] - stages.get("ask_question", 0.0)
+                for stage, value in stages.items():
+                    if stage != "error":
+                        by_stage[stage].append(value)
+            order = [
+                "embedding",
+                "search",
+                "retrieval",
+                "rerank",
+                "context_pack",
+                "completion",
+                "sources",
+                "ask_question",
+                "http",
+                "total",
+            ]
+            level = {
+                "concurrency": concurrency,
+                "requests": args.requests,
+                "errors": sum(1 for s in samples if "error" in s),
+                "throughput_rps": args.requests / elapsed,
+                "stages": {
+                    stage: summarize(by_stage[stage])
+                    for stage in order
+                    if by_stage[stage]
+                },
+            }
+            levels.append(level)
+            print_level(level, args.histogram)
+    finally:
+        timer.restore()
+        openai_server.stop()
+        search_server.stop()
+
+    results = {
+        "created_at": datetime.now().isoformat(),
+        "config": {
+            key: str(value) if isinstance(value, Path) else value
+            for key, value in vars(args).items()
+            if key not in ("output", "compare")
+        },
+        "fake_requests": {
+            "openai": dict(openai_server.requests),
+            "search": dict(search_server.requests),
+        },
+        "levels": levels,
+    }
+    if args.compare:
+        compare(results, json.loads(args.compare.read_text()))
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
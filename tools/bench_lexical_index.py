@@ -0,0 +1,84 @@
+"""
+Micro-benchmark of BM25 candidate generation in the local lexical index.
+
+Builds a LexicalIndex over a synthetic corpus with a Zipf-like vocabulary
+and reports query latency for queries that contain a rare term and for
+queries made only of very common terms (the worst case for pruning).
+
+Usage:
+    python tools/bench_lexical_index.py --documents 300000
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from RAG.lexical_index import LexicalIndex
+
+
+def report(label: str, timings: List[float]) -> None:
+    ordered = sorted(timings)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    print(
+        f"{label:<28} mean {statistics.mean(timings):7.3f} ms   "
+        f"p50 {statistics.median(timings):7.3f} ms   p95 {p95:7.3f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--documents", type=int, default=300000)
+    parser.add_argument("--words-per-document", type=int, default=60)
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    frequencies = 1.0 / np.arange(1, args.vocabulary + 1)
+    frequencies /= frequencies.sum()
+    words = np.array([f"term{i}" for i in range(args.vocabulary)])
+
+    index = LexicalIndex()
+    started = time.perf_counter()
+    for start in range(0, args.documents, 10000):
+        count = min(10000, args.documents - start)
+        sampled = rng.choice(
+            args.vocabulary, (count, args.words_per_document), p=frequencies
+        )
+        for offset, row in enumerate(sampled):
+            index.add(str(start + offset), {"content": " ".join(words[row])})
+    elapsed = time.perf_counter() - started
+    print(f"Indexed {args.documents} documents in {elapsed:.1f} s")
+
+    # Skip the 100 most frequent words, as stopword removal would in real text.
+    typical = frequencies.copy()
+    typical[:100] = 0
+    typical /= typical.sum()
+    for label, distribution in (
+        ("typical queries", typical),
+        ("common-term queries", frequencies),
+    ):
+        queries = [
+            " ".join(words[rng.choice(args.vocabulary, 3, p=distribution)])
+            for _ in range(args.queries)
+        ]
+        for query in queries[:10]:
+            index.search(query, args.top)
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            index.search(query, args.top)
+            timings.append((time.perf_counter() - started) * 1000)
+        report(label, timings)
+
+
+if __name__ == "__main__":
+    main()
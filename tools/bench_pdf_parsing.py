@@ -0,0 +1,105 @@
+"""
+Benchmark of page-level parallel PDF parsing and vectorised CSV rows.
+
+Parses each PDF with the streaming loader at several worker counts and
+reports pages/sec; worker count 1 is the previous single-process path.
+The process pool is warmed up before timing, as it is reused across files
+by the Function app. Small PDFs can be repeated with --repeat to get
+measurable timings.
+
+Also compares building CSV row documents with iterrows()/to_string()
+against the vectorised iter_csv_rows.
+
+Usage:
+    python tools/bench_pdf_parsing.py --workers 1 2 4 --repeat 5
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+import pandas as pd
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from langchain.schema import Document
+
+from RAG.streaming_loader import iter_csv_rows, iter_pdf_pages_parallel
+
+ASSETS = Path(__file__).parent.parent / "assets"
+DEFAULT_PDFS = [ASSETS / "London Brochure.pdf", ASSETS / "niduc.pdf"]
+DEFAULT_CSV = ASSETS / "travel_evaluation_data (1).csv"
+
+
+def parse_pdf(path: Path, workers: int, pages_per_task: int) -> int:
+    pages = 0
+    for _ in iter_pdf_pages_parallel(
+        str(path), path.name, max_workers=workers, pages_per_task=pages_per_task
+    ):
+        pages += 1
+    return pages
+
+
+def bench_pdfs(paths: List[Path], workers: List[int], pages_per_task: int, repeat: int):
+    print(f"{'file':<24} {'workers':>7} {'pages':>6} {'seconds':>8} {'pages/s':>9}")
+    for path in paths:
+        for count in workers:
+            # Warm up the pool (spawned workers import pypdf once)
+            parse_pdf(path, count, pages_per_task)
+            started = time.perf_counter()
+            pages = sum(parse_pdf(path, count, pages_per_task) for _ in range(repeat))
+            elapsed = time.perf_counter() - started
+            print(
+                f"{path.name[:24]:<24} {count:>7} {pages:>6} "
+                f"{elapsed:>8.3f} {pages / elapsed:>9.1f}"
+            )
+
+
+def iterrows_documents(data: bytes) -> List[Document]:
+    documents = []
+    for frame in pd.read_csv(io.BytesIO(data), chunksize=1000):
+        for i, row in frame.iterrows():
+            documents.append(
+                Document(page_content=row.to_string(), metadata={"row": i})
+            )
+    return documents
+
+
+def bench_csv(path: Path, rows: int):
+    frame = pd.read_csv(path)
+    frame = pd.concat([frame] * (rows // len(frame) + 1)).head(rows)
+    data = frame.to_csv(index=False).encode("utf-8")
+    for label, build in (
+        ("iterrows + to_string", iterrows_documents),
+        ("vectorised", lambda d: list(iter_csv_rows(io.BytesIO(d), path.name))),
+    ):
+        started = time.perf_counter()
+        count = len(build(data))
+        elapsed = time.perf_counter() - started
+        print(
+            f"CSV {label:<22} {count} rows in {elapsed:.3f} s ({count / elapsed:.0f} rows/s)"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pdf", type=Path, nargs="*", default=DEFAULT_PDFS)
+    parser.add_argument(
+        "--workers", type=int, nargs="*", default=sorted({1, 2, os.cpu_count() or 1})
+    )
+    parser.add_argument("--pages-per-task", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--csv", type=Path, default=DEFAULT_CSV)
+    parser.add_argument("--csv-rows", type=int, default=50000)
+    args = parser.parse_args()
+
+    bench_pdfs(args.pdf, args.workers, args.pages_per_task, args.repeat)
+    bench_csv(args.csv, args.csv_rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Micro-benchmark of the per-request overhead of RAGSystem's QA chain.
+
+Compares rebuilding the PromptTemplate and RetrievalQA chain on every
+question (the previous behaviour of ask_question) with reusing the chain
+compiled once, using a fake LLM and retriever so only LangChain overhead
+is measured. Also reports the cost of constructing RAGSystem itself.
+
+Usage:
+    python tools/bench_qa_chain.py --iterations 500
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.language_models.fake import FakeListLLM
+from langchain_core.retrievers import BaseRetriever
+
+from RAG.ai_search_langchain import RAGSystem
+
+
+class StaticRetriever(BaseRetriever):
+    documents: List[Document]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self.documents
+
+
+def measure(fn, iterations: int) -> List[float]:
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def report(label: str, timings: List[float]) -> None:
+    ordered = sorted(timings)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    print(
+        f"{label:<28} mean {statistics.mean(timings):7.3f} ms   "
+        f"p50 {statistics.median(timings):7.3f} ms   p95 {p95:7.3f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    rag_system = RAGSystem()
+    print(f"RAGSystem() construction: {(time.perf_counter() - started) * 1000:.2f} ms")
+
+    rag_system._llm = FakeListLLM(responses=["Fake answer."])
+    rag_system._retriever = StaticRetriever(
+        documents=[
+            Document(
+                page_content=f"Document {i} content " * 50,
+                metadata={"title": "bench.pdf", "page": i},
+            )
+            for i in range(5)
+        ]
+    )
+    query = {"query": "What is the best time to visit London?"}
+
+    # Warm up imports and lazy initialisation before measuring.
+    rag_system._create_qa_chain().invoke(query)
+    rag_system.qa_chain.invoke(query)
+
+    rebuild = measure(
+        lambda: rag_system._create_qa_chain().invoke(query), args.iterations
+    )
+    reuse = measure(lambda: rag_system.qa_chain.invoke(query), args.iterations)
+    build_only = measure(rag_system._create_qa_chain, args.iterations)
+
+    report("rebuild chain per request", rebuild)
+    report("reuse compiled chain", reuse)
+    report("chain construction only", build_only)
+    saved = statistics.mean(rebuild) - statistics.mean(reuse)
+    print(f"Per-request overhead saved: {saved:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
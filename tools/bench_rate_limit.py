@@ -0,0 +1,142 @@
+"""
+Benchmark of interactive latency under a token quota while bulk ingestion runs.
+
+Starts a fake Azure OpenAI enforcing a tokens-per-minute quota (429 with
+retry-after-ms once exhausted) and, for --duration seconds, floods it with
+embedding batches from --bulk-workers threads at Priority.BULK while one
+thread asks a chat question every --interactive-interval seconds. Runs:
+
+- a plain httpx client, without client-side limiting;
+- the RAG.clients transport with adaptive concurrency only (AIMD on 429);
+- the RAG.clients transport with the quota configured (OPENAI_TPM), so the
+  token bucket paces requests before the service has to reject them.
+
+Reports interactive latency percentiles, failed requests, 429 responses
+and the embedding tokens ingested per second.
+
+Usage:
+    python tools/bench_rate_limit.py --tokens-per-minute 60000 --duration 10
+"""
+
+import argparse
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from openai import AzureOpenAI, OpenAIError
+
+from RAG.clients import DEFAULT_API_VERSION, DeploymentLimits, create_http_client
+from RAG.rate_limit import Priority, estimate_payload_tokens, request_priority
+from RAG.stubs import FakeOpenAIServer
+
+# Chat and embeddings share one deployment, so they compete for one quota
+DEPLOYMENT = "gpt-4o"
+QUESTION = [{"role": "user", "content": "Context: London has many hotels.\n\nHi"}]
+MAX_TOKENS = 200
+
+
+def run(
+    label: str,
+    http_client: httpx.Client,
+    args: argparse.Namespace,
+    limits: DeploymentLimits = None,
+) -> None:
+    with FakeOpenAIServer(
+        latency_ms=args.latency_ms, tokens_per_minute=args.tokens_per_minute
+    ) as server:
+        client = AzureOpenAI(
+            api_version=DEFAULT_API_VERSION,
+            azure_endpoint=server.url,
+            api_key="bench",
+            http_client=http_client,
+        )
+        batch = [f"chunk {i} about hotels in London " * 8 for i in range(16)]
+        batch_tokens = estimate_payload_tokens({"input": batch})
+        stop = time.monotonic() + args.duration
+        counts: Dict[str, int] = {"bulk_tokens": 0, "bulk_failed": 0, "failed": 0}
+        latencies: List[float] = []
+        lock = threading.Lock()
+
+        def bulk() -> None:
+            with request_priority(Priority.BULK):
+                while time.monotonic() < stop:
+                    try:
+                        client.embeddings.create(model=DEPLOYMENT, input=batch)
+                    except OpenAIError:
+                        with lock:
+                            counts["bulk_failed"] += 1
+                        continue
+                    with lock:
+                        counts["bulk_tokens"] += batch_tokens
+
+        def interactive() -> None:
+            while time.monotonic() < stop:
+                started = time.perf_counter()
+                try:
+                    client.chat.completions.create(
+                        model=DEPLOYMENT, messages=QUESTION, max_tokens=MAX_TOKENS
+                    )
+                    latencies.append((time.perf_counter() - started) * 1000)
+                except OpenAIError:
+                    counts["failed"] += 1
+                time.sleep(args.interactive_interval)
+
+        threads = [
+            threading.Thread(target=bulk, daemon=True) for _ in range(args.bulk_workers)
+        ]
+        threads.append(threading.Thread(target=interactive, daemon=True))
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        latencies.sort()
+        p50 = statistics.median(latencies) if latencies else float("nan")
+        p95 = latencies[int(0.95 * (len(latencies) - 1))] if latencies else float("nan")
+        print(
+            f"  {label:<30} interactive p50 {p50:>8.1f} ms  p95 {p95:>8.1f} ms  "
+            f"{len(latencies):>3} ok {counts['failed']:>3} failed  "
+            f"{server.requests['throttled']:>4} x 429  "
+            f"bulk {counts['bulk_tokens'] / elapsed:>6.0f} tokens/s "
+            f"({counts['bulk_failed']} failed)"
+        )
+        if limits is not None:
+            stats = limits.stats.get(DEPLOYMENT, {})
+            print(
+                f"  {'':<30} final limit {stats.get('limit', 0):.1f}, "
+                f"{stats.get('waited_seconds', 0):.1f}s spent waiting for admission"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tokens-per-minute", type=int, default=60000)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--bulk-workers", type=int, default=8)
+    parser.add_argument("--interactive-interval", type=float, default=0.5)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    print(
+        f"Fake Azure OpenAI with a {args.tokens_per_minute} tokens/minute quota "
+        f"({args.tokens_per_minute / 60:.0f} tokens/s), {args.bulk_workers} bulk "
+        f"workers, {args.duration:g}s per run"
+    )
+    run("no client-side limiting", httpx.Client(), args)
+    adaptive = DeploymentLimits()
+    run("adaptive concurrency", create_http_client(adaptive), args, adaptive)
+    paced = DeploymentLimits(default_tokens_per_minute=args.tokens_per_minute)
+    run("adaptive + token bucket", create_http_client(paced), args, paced)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Offline evaluation of RAG answer quality and speed over the evaluation CSV.
+
+Pushes data/travel_evaluation_data.csv through RAGSystem.ask_question
+(--target langchain) or the ai_search pipeline of answer_question_with_sources
+(--target direct) in parallel, scores answers with token-F1, embedding
+similarity and retrieval recall, and records p50/p95 latency, tokens and
+cost per question in a JSON report.
+
+With --stub, Azure OpenAI is replaced by deterministic local stubs (a fake
+Azure OpenAI server for the direct target) and Azure AI Search by a
+temporary LocalVectorStore filled with --documents, so the run needs no
+network access. With --baseline, the run fails (exit code 1)
+when quality drops or latency/cost grow beyond the given tolerances.
+
+Usage:
+    python tools/run_eval.py --stub --output .cache/eval/baseline.json
+    python tools/run_eval.py --stub --baseline .cache/eval/baseline.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+ROOT = Path(__file__).parent.parent
+DEFAULT_DOCUMENTS = [
+    ROOT / "assets" / "London Brochure.pdf",
+    ROOT / "assets" / "niduc.pdf",
+]
+
+
+def configure_stub_environment(workdir: str, openai_url: str) -> None:
+    """
+    Point every store at workdir, the search backend at the local index and
+    Azure OpenAI at openai_url.
+    """
+    os.environ.update(
+        {
+            "SEARCH_BACKEND": "local",
+            "LOCAL_INDEX_PATH": os.path.join(workdir, "index"),
+            "INGEST_MANIFEST_PATH": os.path.join(workdir, "manifest.sqlite"),
+            "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embeddings.sqlite"),
+            "EMBEDDING_MODEL_NAME": "stub-embedding",
+            "OPEN_AI_ENDPOINT": openai_url,
+            "API_OPEN_AI_KEY": "stub",
+        }
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--dataset", default=str(ROOT / "data" / "travel_evaluation_data.csv")
+    )
+    parser.add_argument(
+        "--target", choices=["langchain", "direct"], default="langchain"
+    )
+    parser.add_argument("--stub", action="store_true", help="Use local stubs")
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0)
+    parser.add_argument(
+        "--documents", nargs="*", default=[str(p) for p in DEFAULT_DOCUMENTS]
+    )
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--output", default=".cache/eval/report.json")
+    parser.add_argument("--baseline", help="Report to compare against")
+    parser.add_argument("--max-quality-drop", type=float, default=0.02)
+    parser.add_argument("--max-slowdown", type=float, default=0.2)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    workdir = tempfile.TemporaryDirectory()
+    # Every question must go through retrieval and generation
+    os.environ["ANSWER_CACHE_ENABLED"] = "0"
+    from RAG.stubs import FakeOpenAIServer, StubEmbeddings, StubLLM
+
+    if args.stub:
+        fake_openai = FakeOpenAIServer(latency_ms=args.stub_latency_ms).start()
+        configure_stub_environment(workdir.name, fake_openai.url)
+
+    # Imported after the environment is configured: modules read it on import.
+    from RAG.ai_search_langchain import RAGSystem
+    from RAG.evaluation import (
+        compare_reports,
+        direct_target,
+        langchain_target,
+        load_dataset,
+        run_evaluation,
+    )
+
+    rag_system = RAGSystem()
+    if args.stub:
+        rag_system._embeddings = StubEmbeddings()
+        rag_system._llm = StubLLM(latency_seconds=args.stub_latency_ms / 1000)
+        result = rag_system.ingest_many(args.documents)
+        print(
+            f"Indexed {result['chunks_indexed']} chunks from "
+            f"{len(result['files_indexed'])} files"
+        )
+
+    if args.target == "langchain":
+        target = langchain_target(rag_system)
+    else:
+        target = direct_target(args.top_k)
+
+    cases = load_dataset(args.dataset)
+    report = run_evaluation(
+        cases,
+        target,
+        embed=rag_system.embeddings.embed_documents,
+        target_name=args.target,
+        dataset=args.dataset,
+        concurrency=args.concurrency,
+        config={
+            "stub": args.stub,
+            "top_k": args.top_k,
+            "concurrency": args.concurrency,
+            "documents": args.documents if args.stub else None,
+        },
+    )
+    report.save(args.output)
+    print(json.dumps(report.summary, indent=2))
+    print(f"Report written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_reports(
+            report.to_dict(), baseline, args.max_quality_drop, args.max_slowdown
+        )
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()